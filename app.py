@@ -7,7 +7,9 @@ import time
 import os
 import sounddevice as sd
 from audio_recorder import AudioRecorder
-from transcriber import Transcriber
+
+# Seconds of audio per block sent to the transcriber in streaming mode
+STREAM_INTERVAL = 0.5
 
 class TranscriptionApp:
     def __init__(self, root):
@@ -16,36 +18,111 @@ class TranscriptionApp:
         self.root.geometry("800x600")
         self.root.minsize(600, 400)
 
-        # Set up the audio recorder
-        self.recorder = AudioRecorder(callback=self.on_audio_chunk, chunk_duration=5)
-
         # UI variables
         self.recording = False
+        self.streaming = tk.BooleanVar(value=False)
+        self.streaming_mode = False  # Copy of the checkbox readable from recorder threads
+        self.partial_text = tk.StringVar(value="")
         self.selected_device = tk.StringVar()
         self.selected_language = tk.StringVar(value="fi")
         self.use_diarization = tk.BooleanVar(value=True)
-        self.status_text = tk.StringVar(value="Valmis aloittamaan")
+        self.status_text = tk.StringVar(value="Ladataan mallia...")
         self.transcription_text = ""
         self.ui_update_queue = queue.Queue()
+        self.language_code = "fi"
 
-        # Set up the transcriber
-        self.transcriber = Transcriber(
-            callback=self.on_transcription,
-            use_diarization=self.use_diarization.get()
-        )
+        # The transcriber is created in the background; chunks recorded
+        # before it is ready wait in pending_chunks
+        self.transcriber = None
+        self.pending_chunks = []
+        self.transcriber_lock = threading.Lock()
 
-        # Start the transcription processing
-        self.transcriber.start_processing()
+        # Set up the audio recorder
+        self.recorder = self._create_recorder()
 
         # Create the UI
         self.create_ui()
 
+        # Load the model without blocking the window
+        self._start_transcriber_loading()
+
         # Testaa tekstialueen päivitystä heti alussa
         self.root.after(2000, self._test_text_update)
 
         # Start the UI update thread
         self.update_ui()
 
+    def _create_recorder(self):
+        """Create an audio recorder for the selected transcription mode."""
+        if self.streaming.get():
+            # Streaming mode sends short blocks that the transcriber re-decodes
+            return AudioRecorder(
+                callback=self.on_audio_chunk,
+                chunk_duration=STREAM_INTERVAL,
+                in_memory=True,
+                save_chunks=False
+            )
+
+        return AudioRecorder(
+            callback=self.on_audio_chunk,
+            chunk_duration=5,
+            chunking="vad",
+            in_memory=True,
+            save_chunks=False
+        )
+
+    def _start_transcriber_loading(self):
+        """Import the transcriber and load the model on a background thread."""
+        # Tk variables may only be read on the main thread
+        options = {
+            "callback": self.on_transcription,
+            "language": self.language_code,
+            "use_diarization": self.use_diarization.get(),
+            "streaming": self.streaming.get(),
+            "stream_interval": STREAM_INTERVAL,
+            # Backlogged 5 s chunks share 30 s windows instead of being padded one by one
+            "pack_windows": True,
+            # Room noise and music are dropped before they reach the model
+            "speech_gating": True,
+            "no_speech_threshold": 0.6
+        }
+
+        def load():
+            try:
+                start = time.perf_counter()
+                # Heavy imports (torch, transformers) happen here instead of at startup
+                from transcriber import Transcriber
+                transcriber = Transcriber(**options)
+                print(f"Transkriptio valmis käyttöön {time.perf_counter() - start:.1f} sekunnissa")
+                self.ui_update_queue.put(("transcriber_ready", transcriber))
+            except Exception as e:
+                print(f"Virhe mallin lataamisessa: {e}")
+                self.ui_update_queue.put(("status", f"Mallin lataaminen epäonnistui: {e}"))
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def _on_transcriber_ready(self, transcriber):
+        """Start using a transcriber that finished loading in the background."""
+        # Apply settings that were changed while the model was loading
+        transcriber.set_language(self.language_code)
+        transcriber.use_diarization = self.use_diarization.get()
+        if transcriber.use_diarization and transcriber.diarization is None:
+            transcriber._init_diarization()
+        if transcriber.streaming != self.streaming.get():
+            transcriber.set_streaming(self.streaming.get())
+        transcriber.start_processing()
+
+        # Hand over the chunks recorded during loading, in order
+        with self.transcriber_lock:
+            self.transcriber = transcriber
+            pending = self.pending_chunks
+            self.pending_chunks = []
+            for audio_chunk, streaming, start_time in pending:
+                self._add_chunk(audio_chunk, streaming, start_time)
+
+        print(f"Malli ladattu, jonossa olleita paloja: {len(pending)}")
+        self.status_text.set("Nauhoitetaan..." if self.recording else "Valmis aloittamaan")
+
     def _test_text_update(self):
         """Test text area update."""
         print("Testataan tekstialueen päivitystä...")
@@ -166,12 +243,33 @@ class TranscriptionApp:
         )
         diarization_info.pack(side=tk.LEFT, padx=5)
 
+        # Streaming transcription checkbox
+        streaming_frame = ttk.Frame(control_frame)
+        streaming_frame.pack(fill=tk.X, pady=5)
+
+        streaming_check = ttk.Checkbutton(
+            streaming_frame,
+            text="Käytä suoratoistoa",
+            variable=self.streaming,
+            command=self.toggle_streaming
+        )
+        streaming_check.pack(side=tk.LEFT, padx=5)
+
+        streaming_info = ttk.Label(
+            streaming_frame,
+            text="(Teksti näkyy noin sekunnin viiveellä, ei puhujan tunnistusta)",
+            foreground='gray'
+        )
+        streaming_info.pack(side=tk.LEFT, padx=5)
+
         # Map display language to language code
         def on_language_change(_=None):
             selected = self.selected_language.get()
             for name, code in languages:
                 if name == selected:
-                    self.transcriber.set_language(code)
+                    self.language_code = code
+                    if self.transcriber is not None:
+                        self.transcriber.set_language(code)
                     print(f"Kieli vaihdettu: {name} ({code})")
                     break
 
@@ -203,6 +301,11 @@ class TranscriptionApp:
         ttk.Label(status_frame, text="Tila:").pack(side=tk.LEFT, padx=5)
         ttk.Label(status_frame, textvariable=self.status_text).pack(side=tk.LEFT, padx=5)
 
+        # Input level meter, polled from the recorder in update_ui
+        self.level_meter = ttk.Progressbar(status_frame, length=120, maximum=1.0, mode='determinate')
+        self.level_meter.pack(side=tk.RIGHT, padx=5)
+        ttk.Label(status_frame, text="Äänitaso:").pack(side=tk.RIGHT, padx=5)
+
         # Transcription area (bottom)
         transcription_frame = ttk.LabelFrame(main_frame, text="Transkriptio", padding=10)
         transcription_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -219,6 +322,15 @@ class TranscriptionApp:
         )
         self.transcription_area.pack(fill=tk.BOTH, expand=True)
 
+        # Unstable streaming hypothesis, replaced on every partial result
+        partial_label = ttk.Label(
+            transcription_frame,
+            textvariable=self.partial_text,
+            foreground='gray',
+            wraplength=700
+        )
+        partial_label.pack(fill=tk.X, pady=5)
+
         # Add a label to indicate that the text is editable
         edit_label = ttk.Label(
             transcription_frame,
@@ -251,6 +363,10 @@ class TranscriptionApp:
                     device_id = sd.default.device[0]
                     print(f"Oletuslaite: {device_id}")
 
+                # Speaker labels restart for every recording
+                if self.transcriber is not None:
+                    self.transcriber.reset_diarization()
+
                 # Start the recorder
                 print(f"Aloitetaan nauhoitus laitteella: {device_id}")
                 self.recorder.start_recording(device_id)
@@ -258,7 +374,8 @@ class TranscriptionApp:
                 # Update UI
                 self.recording = True
                 self.record_button.config(text="Lopeta nauhoitus")
-                self.status_text.set("Nauhoitetaan...")
+                self.status_text.set("Nauhoitetaan..." if self.transcriber is not None
+                                     else "Nauhoitetaan, malli latautuu vielä...")
                 print("Käyttöliittymä päivitetty: nauhoitetaan")
 
                 # Testaa transkriptiota suoraan
@@ -286,19 +403,56 @@ class TranscriptionApp:
                 print(f"Virhe nauhoituksen lopettamisessa: {e}")
                 messagebox.showerror("Virhe", f"Nauhoituksen lopettaminen epäonnistui: {e}")
 
-    def on_audio_chunk(self, audio_file):
+    def on_audio_chunk(self, audio_chunk, start_time=None):
         """Callback when an audio chunk is recorded."""
-        # Add the audio file to the transcription queue
-        print(f"Äänipalanen vastaanotettu: {audio_file}")
-        self.transcriber.add_audio_file(audio_file)
+        streaming = self.streaming_mode
+
+        with self.transcriber_lock:
+            if self.transcriber is None:
+                # Keep the chunk until the model has finished loading
+                self.pending_chunks.append((audio_chunk, streaming, start_time))
+                status_text = f"Ladataan mallia... (Jonossa: {len(self.pending_chunks)})"
+                self.ui_update_queue.put(("status", status_text))
+                return
+
+            self._add_chunk(audio_chunk, streaming, start_time)
+
+        if streaming:
+            return
 
         # Update status
         status_text = f"Transkriptoidaan... (Jonossa: {self.transcriber.get_queue_size()})"
         print(status_text)
         self.ui_update_queue.put(("status", status_text))
 
-    def on_transcription(self, transcription, _):
-        """Callback when transcription is complete."""
+    def _add_chunk(self, audio_chunk, streaming, start_time=None):
+        """Pass a recorded chunk to the transcriber."""
+        if streaming:
+            # Append the block to the streaming window
+            self.transcriber.add_audio_block(audio_chunk, self.recorder.sample_rate)
+            return
+
+        # Add the in-memory audio chunk to the transcription queue
+        print(f"Äänipalanen vastaanotettu: {len(audio_chunk)} näytettä")
+        self.transcriber.add_audio_file(audio_chunk, self.recorder.sample_rate, start_time)
+
+    def on_transcription(self, transcription, source=None, kind=None):
+        """
+        Callback when transcription is complete.
+
+        Args:
+            transcription: The transcribed text
+            source: The queued audio chunk or file path the text belongs to
+            kind: "partial" or "final" for streaming text, None for queued chunks
+        """
+        # Streaming mode reports unstable and committed text separately
+        if kind == "partial":
+            self.ui_update_queue.put(("partial", transcription))
+            return
+        if kind == "final":
+            self.ui_update_queue.put(("stream", transcription))
+            return
+
         # Add the transcription to the text
         if transcription.strip():
             print(f"Uusi transkriptio vastaanotettu: {transcription[:100]}...")
@@ -346,12 +500,17 @@ class TranscriptionApp:
             while not self.ui_update_queue.empty():
                 update_type, data = self.ui_update_queue.get_nowait()
 
-                if update_type == "status":
+                if update_type == "transcriber_ready":
+                    self._on_transcriber_ready(data)
+                elif update_type == "status":
                     self.status_text.set(data)
                     print(f"Tila päivitetty: {data}")  # Debug tulostus
-                elif update_type == "transcription":
-                    # Add the transcription to the text area
-                    self.transcription_text += data + "\n\n"
+                elif update_type == "partial":
+                    self.partial_text.set(data)
+                elif update_type in ("transcription", "stream"):
+                    # Add the transcription to the text area; streamed text continues the paragraph
+                    separator = " " if update_type == "stream" else "\n\n"
+                    self.transcription_text += data + separator
 
                     print(f"Päivitetään tekstialuetta: {data[:100]}...")  # Lisätty tulostus
 
@@ -379,6 +538,10 @@ class TranscriptionApp:
         except Exception as e:
             print(f"Virhe käyttöliittymän päivityksessä: {e}")
 
+        # Update the level meter from the recorder's latest published level
+        peak, _ = self.recorder.level if self.recording else (0.0, 0.0)
+        self.level_meter['value'] = min(peak, 1.0)
+
         # Schedule the next update
         self.root.after(100, self.update_ui)
 
@@ -428,6 +591,10 @@ class TranscriptionApp:
         use_diarization = self.use_diarization.get()
         print(f"Puhujan tunnistus {'käytössä' if use_diarization else 'pois käytöstä'}")
 
+        # The setting is applied when the model has finished loading
+        if self.transcriber is None:
+            return
+
         # Update the transcriber
         self.transcriber.use_diarization = use_diarization
 
@@ -435,12 +602,32 @@ class TranscriptionApp:
         if use_diarization and self.transcriber.diarization is None:
             self.transcriber._init_diarization()
 
+    def toggle_streaming(self):
+        """Toggle streaming transcription on/off."""
+        if self.recording:
+            # The recorder cannot change its chunking while it is running
+            self.streaming.set(not self.streaming.get())
+            messagebox.showinfo("Tietoa", "Lopeta nauhoitus ennen tilan vaihtamista.")
+            return
+
+        streaming = self.streaming.get()
+        self.streaming_mode = streaming
+        print(f"Suoratoisto {'käytössä' if streaming else 'pois käytöstä'}")
+
+        self.recorder.cleanup()
+        self.recorder = self._create_recorder()
+        if self.transcriber is not None:
+            self.transcriber.set_streaming(streaming)
+        self.partial_text.set("")
+
     def on_closing(self):
         """Handle window closing."""
         if self.recording:
             self.recorder.stop_recording()
 
-        self.transcriber.stop_processing()
+        if self.transcriber is not None:
+            self.transcriber.stop_processing()
+            self.transcriber.release_model()
         self.recorder.cleanup()
 
         self.root.destroy()
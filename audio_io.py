@@ -0,0 +1,349 @@
+import math
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+
+
+class AudioReader:
+    def __init__(self, audio_file):
+        """
+        Open an audio file for reading parts of it on demand.
+
+        Only the samples of each requested range are decoded, so memory use
+        does not grow with the length of the file.
+
+        Args:
+            audio_file: Path to the audio file
+        """
+        self.audio_file = audio_file
+        self.file = sf.SoundFile(audio_file)
+        self.sample_rate = self.file.samplerate
+        self.channels = self.file.channels
+        self.frames = self.file.frames
+
+    @property
+    def duration(self):
+        """Length of the file in seconds."""
+        return self.frames / self.sample_rate
+
+    def __len__(self):
+        return self.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the underlying file."""
+        self.file.close()
+
+    def _to_mono(self, data):
+        """Average the channels of a float32 block into a one-dimensional array."""
+        if data.ndim > 1:
+            data = data.mean(axis=1, dtype=np.float32)
+        return data
+
+    def read(self, start, end):
+        """
+        Read a range of samples as mono float32.
+
+        Args:
+            start: First sample to read
+            end: Sample after the last one to read; clipped to the file length
+
+        Returns:
+            One-dimensional float32 array
+        """
+        start = max(0, int(start))
+        end = min(int(end), self.frames)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+
+        self.file.seek(start)
+        return self._to_mono(self.file.read(end - start, dtype='float32'))
+
+    def read_seconds(self, start, end):
+        """
+        Read a time range as mono float32.
+
+        Args:
+            start: Start time in seconds
+            end: End time in seconds
+
+        Returns:
+            One-dimensional float32 array
+        """
+        return self.read(int(start * self.sample_rate), int(end * self.sample_rate))
+
+    def blocks(self, block_size):
+        """
+        Read the whole file sequentially in blocks.
+
+        Args:
+            block_size: Block length in samples; the last block may be shorter
+
+        Yields:
+            One-dimensional float32 arrays
+        """
+        self.file.seek(0)
+        for block in self.file.blocks(blocksize=block_size, dtype='float32'):
+            yield self._to_mono(block)
+
+
+class StreamingResampler:
+    # Output samples computed per pass; the gathered input windows take
+    # outputs x num_taps floats, about 3.7 MB for 44.1 kHz input
+    max_outputs_per_pass = 16384
+
+    def __init__(self, input_rate, output_rate):
+        """
+        Initialize a polyphase resampler that works on consecutive blocks.
+
+        The filter and the output alignment are the same as in
+        scipy.signal.resample_poly, and the input history needed by the
+        filter is carried over between blocks, so resampling a stream block
+        by block gives the same samples as resampling it in one piece.
+
+        Args:
+            input_rate: Sample rate of the input in Hz
+            output_rate: Sample rate of the output in Hz
+        """
+        from scipy.signal import firwin
+
+        divisor = math.gcd(int(input_rate), int(output_rate))
+        self.up = int(output_rate) // divisor
+        self.down = int(input_rate) // divisor
+
+        self.num_taps = 0
+        if self.up != self.down:
+            # Same anti-aliasing filter and delay compensation as resample_poly
+            max_rate = max(self.up, self.down)
+            half_len = 10 * max_rate
+            h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+            self.pre_pad = self.down - half_len % self.down
+            self.pre_remove = (half_len + self.pre_pad) // self.down
+
+            # Polyphase matrix: row p holds the taps h[p], h[p + up], ...
+            self.num_taps = -(-len(h) // self.up)
+            h = np.concatenate((h, np.zeros(self.num_taps * self.up - len(h))))
+            self.phases = h.reshape(self.num_taps, self.up).T.astype(np.float32)
+
+        self.reset()
+
+    def reset(self):
+        """Forget the filter state and start a new stream."""
+        # The history starts with zeros that stand for the samples before the stream
+        self.history = np.zeros(self.num_taps, dtype=np.float32)
+        self.history_start = -self.num_taps
+        self.input_length = 0
+        self.output_length = 0
+
+    def output_length_for(self, input_length):
+        """Return the number of output samples for an input of the given length."""
+        return -(-input_length * self.up // self.down)
+
+    def _input_index(self, outputs):
+        """Return the newest input sample each output sample depends on, and its filter phase."""
+        position = (outputs + self.pre_remove) * self.down - self.pre_pad
+        return position // self.up, position % self.up
+
+    def _produce(self, stop):
+        """Compute the output samples up to stop from the history."""
+        outputs = np.arange(self.output_length, stop)
+        if len(outputs) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        output = np.empty(len(outputs), dtype=np.float32)
+        windows = np.lib.stride_tricks.sliding_window_view(self.history, self.num_taps)
+        for first in range(0, len(outputs), self.max_outputs_per_pass):
+            part = slice(first, first + self.max_outputs_per_pass)
+            newest, phase = self._input_index(outputs[part])
+            # Window i covers history[i:i + num_taps]; the newest sample is its last element
+            samples = windows[newest - self.history_start - self.num_taps + 1, ::-1]
+            output[part] = np.einsum('ij,ij->i', samples, self.phases[phase])
+
+        self.output_length = stop
+        oldest = self._input_index(np.array([stop]))[0][0] - self.num_taps + 1
+        drop = max(0, min(oldest - self.history_start, len(self.history) - self.num_taps))
+        self.history = self.history[drop:]
+        self.history_start += drop
+        return output
+
+    def process(self, block):
+        """
+        Resample the next block of a mono stream.
+
+        Args:
+            block: One-dimensional float32 array
+
+        Returns:
+            The output samples that can be computed so far
+        """
+        block = np.asarray(block, dtype=np.float32)
+        self.input_length += len(block)
+        if self.up == self.down:
+            self.output_length += len(block)
+            return block
+
+        self.history = np.concatenate((self.history, block))
+
+        # Output n is ready once its newest input sample has arrived
+        end = self.history_start + len(self.history)
+        stop = (end * self.up - 1 + self.pre_pad) // self.down - self.pre_remove + 1
+        stop = min(max(stop, self.output_length), self.output_length_for(self.input_length))
+        return self._produce(stop)
+
+    def flush(self):
+        """
+        Finish the stream, treating the samples after it as zeros.
+
+        Returns:
+            The remaining output samples
+        """
+        total = self.output_length_for(self.input_length)
+        if self.output_length >= total:
+            return np.zeros(0, dtype=np.float32)
+
+        newest = self._input_index(np.array([total - 1]))[0][0]
+        end = self.history_start + len(self.history)
+        if newest >= end:
+            self.history = np.concatenate((self.history, np.zeros(newest + 1 - end, dtype=np.float32)))
+        return self._produce(total)
+
+
+class PreparedAudio:
+    def __init__(self, audio_file, sample_rate=16000, block_duration=5.0, output_file=None):
+        """
+        Downmix and resample an audio file once into a float32 file on disk.
+
+        The file is converted block by block and the result is memory-mapped,
+        so diarization and transcription can read any range of the 16 kHz
+        mono stream without converting it again. It has the same reading
+        methods as AudioReader.
+
+        Args:
+            audio_file: Path to the audio file
+            sample_rate: Sample rate of the prepared stream
+            block_duration: Length of the conversion blocks in seconds
+            output_file: Path of the raw float32 output; a temporary file
+                that close() removes if None
+        """
+        self.audio_file = audio_file
+        self.sample_rate = sample_rate
+        self.channels = 1
+        self.temporary = output_file is None
+        if self.temporary:
+            fd, output_file = tempfile.mkstemp(suffix='.f32', prefix='audio-')
+            os.close(fd)
+        self.output_file = output_file
+        self.samples = None
+
+        try:
+            self._convert(audio_file, block_duration)
+            self.samples = np.memmap(output_file, dtype=np.float32, mode='r', shape=(max(self.frames, 1),))[:self.frames]
+        except BaseException:
+            # Do not leave a half-written temporary file behind
+            self.close()
+            raise
+
+    def _convert(self, audio_file, block_duration):
+        """Resample and downmix the audio file into the output file."""
+        with AudioReader(audio_file) as reader:
+            resampler = StreamingResampler(reader.sample_rate, self.sample_rate)
+            self.frames = resampler.output_length_for(reader.frames)
+            samples = np.memmap(self.output_file, dtype=np.float32, mode='w+', shape=(max(self.frames, 1),))
+
+            position = 0
+            block_size = max(1, int(block_duration * reader.sample_rate))
+            for block in reader.blocks(block_size):
+                output = resampler.process(block)
+                samples[position:position + len(output)] = output
+                position += len(output)
+            output = resampler.flush()
+            samples[position:position + len(output)] = output
+            samples.flush()
+            del samples
+
+    @property
+    def duration(self):
+        """Length of the stream in seconds."""
+        return self.frames / self.sample_rate
+
+    def __len__(self):
+        return self.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the memory map and remove the temporary file."""
+        self.samples = None
+        if self.temporary and os.path.exists(self.output_file):
+            os.remove(self.output_file)
+
+    def read(self, start, end):
+        """
+        Read a range of samples as mono float32.
+
+        Args:
+            start: First sample to read
+            end: Sample after the last one to read; clipped to the stream length
+
+        Returns:
+            One-dimensional float32 array
+        """
+        start = max(0, int(start))
+        end = min(int(end), self.frames)
+        return np.array(self.samples[start:max(start, end)])
+
+    def read_seconds(self, start, end):
+        """
+        Read a time range as mono float32.
+
+        Args:
+            start: Start time in seconds
+            end: End time in seconds
+
+        Returns:
+            One-dimensional float32 array
+        """
+        return self.read(int(start * self.sample_rate), int(end * self.sample_rate))
+
+    def blocks(self, block_size):
+        """
+        Read the whole stream sequentially in blocks.
+
+        Args:
+            block_size: Block length in samples; the last block may be shorter
+
+        Yields:
+            One-dimensional float32 arrays
+        """
+        for start in range(0, self.frames, block_size):
+            yield self.read(start, start + block_size)
+
+
+def open_audio(audio_file, sample_rate=16000):
+    """
+    Open an audio file as a mono stream at the given sample rate.
+
+    Files already at the target rate are read directly with AudioReader,
+    which also downmixes them; other files are converted once with
+    PreparedAudio.
+
+    Args:
+        audio_file: Path to the audio file
+        sample_rate: Sample rate the caller needs
+
+    Returns:
+        AudioReader or PreparedAudio; close it when done
+    """
+    if sf.info(audio_file).samplerate == sample_rate:
+        return AudioReader(audio_file)
+    return PreparedAudio(audio_file, sample_rate)
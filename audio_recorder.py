@@ -1,26 +1,40 @@
 import sounddevice as sd
 import numpy as np
 import threading
-import queue
 import tempfile
 import os
 import wave
 import time
 from scipy.io import wavfile
+from ring_buffer import RingBuffer
+from vad import VadChunker
 
 class AudioRecorder:
-    def __init__(self, callback=None, chunk_duration=3):
+    def __init__(self, callback=None, chunk_duration=3, in_memory=False, save_chunks=True,
+                 buffer_duration=30, chunking="fixed", vad_options=None):
         """
         Initialize the audio recorder.
 
         Args:
-            callback: Function to call when a chunk of audio is recorded
+            callback: Function called as callback(chunk, start_time=seconds) when
+                a chunk of audio is recorded; start_time is the position of the
+                chunk from the start of the recording, so gaps between chunks
+                (silence left out by VAD chunking) can be told apart
             chunk_duration: Duration of each audio chunk in seconds
+            in_memory: Pass each chunk to the callback as a float32 NumPy array
+                instead of the path of a WAV file
+            save_chunks: Also write each chunk to a WAV file in the temporary
+                directory (always done when in_memory is False)
+            buffer_duration: Length of the capture ring buffer in seconds
+            chunking: "fixed" to cut every chunk_duration seconds, or "vad" to
+                cut at speech pauses, using chunk_duration as the maximum length
+            vad_options: Extra keyword arguments for VadChunker
         """
         self.callback = callback
         self.chunk_duration = chunk_duration
+        self.in_memory = in_memory
+        self.save_chunks = save_chunks or not in_memory
         self.recording = False
-        self.audio_queue = queue.Queue()
         self.devices = self._get_devices()
         self.sample_rate = 16000  # Sample rate for Whisper
         self.channels = 1  # Mono audio
@@ -30,6 +44,31 @@ class AudioRecorder:
         self.stream = None
         self.thread = None
         self.chunk_count = 0
+        self.poll_interval = 0.02  # Seconds between ring buffer checks
+
+        # Level meter, computed outside the audio callback and published atomically
+        self.meter_samples = int(0.05 * self.sample_rate)  # Window of 50 ms
+        self.meter_decimation = 4  # Use every 4th sample for the meter
+        self._meter_position = 0
+        self._level = (0.0, 0.0)
+
+        # Stream status counters updated by the audio callback
+        self.input_overflows = 0
+        self.input_underflows = 0
+
+        # Voice activity chunker, used when chunking at speech pauses
+        self.chunking = chunking
+        self.vad_chunker = None
+        if chunking == "vad":
+            vad_options = dict(vad_options or {})
+            vad_options.setdefault("max_chunk_duration", chunk_duration)
+            self.vad_chunker = VadChunker(self.sample_rate, **vad_options)
+        elif chunking != "fixed":
+            raise ValueError(f"Tuntematon paloittelutapa: {chunking}")
+
+        # Preallocated capture buffer written directly by the audio callback
+        buffer_samples = int(max(buffer_duration, 2 * chunk_duration) * self.sample_rate)
+        self.ring_buffer = RingBuffer(buffer_samples, channels=self.channels, dtype=self.dtype)
 
     def _get_devices(self):
         """Get available audio devices."""
@@ -80,68 +119,164 @@ class AudioRecorder:
         """Return a list of available input devices."""
         return self.devices
 
+    @property
+    def level(self):
+        """Latest (peak, rms) level of the input signal."""
+        return self._level
+
+    def get_status_counts(self):
+        """Return the number of input overflows and underflows seen so far."""
+        return {
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows
+        }
+
     def _audio_callback(self, indata, frames, time, status):
-        """Callback function for the audio stream."""
+        """
+        Callback function for the audio stream.
+
+        Runs in the real-time audio thread, so it only counts stream errors
+        and copies the block; no I/O or level computation happens here.
+        """
         if status:
-            print(f"Status: {status}")
+            if status.input_overflow:
+                self.input_overflows += 1
+            if status.input_underflow:
+                self.input_underflows += 1
+
+        # Copy the block into the preallocated ring buffer
+        self.ring_buffer.write(indata)
+
+    def _update_level_meter(self):
+        """Compute decimated peak and RMS levels of the newest audio."""
+        end = self.ring_buffer.write_position
+        if end - self._meter_position < self.meter_samples:
+            return
+
+        start = max(end - self.meter_samples, self.ring_buffer.oldest_position)
+        peak = 0.0
+        energy = 0.0
+        count = 0
+        for view in self.ring_buffer.views(start, end):
+            samples = view[::self.meter_decimation].ravel()
+            if len(samples) == 0:
+                continue
+            peak = max(peak, float(np.max(np.abs(samples))))
+            energy += float(np.dot(samples, samples))
+            count += len(samples)
 
-        # Check if audio data contains sound
-        audio_level = np.max(np.abs(indata))
-        print(f"Äänitaso: {audio_level:.6f}")
+        rms = float(np.sqrt(energy / count)) if count else 0.0
 
-        # Add the audio data to the queue
-        self.audio_queue.put(indata.copy())
+        # Replace the tuple in one assignment so readers never see a torn value
+        self._level = (peak, rms)
+        self._meter_position = end
 
     def _process_audio(self):
-        """Process audio chunks from the queue."""
-        chunk_data = []
-        chunk_samples = 0
+        """Cut chunks out of the ring buffer."""
+        if self.vad_chunker is not None:
+            self._process_audio_vad()
+        else:
+            self._process_audio_fixed()
+
+    def _process_audio_fixed(self):
+        """Cut fixed-length chunks out of the ring buffer."""
         target_samples = int(self.chunk_duration * self.sample_rate)
+        chunk_start = self.ring_buffer.oldest_position
 
         print(f"Äänen käsittely aloitettu. Tavoite näytteenottotaajuus: {self.sample_rate} Hz, tavoite näytteiden määrä: {target_samples}")
 
         while self.recording:
             try:
-                # Get audio data from the queue with a timeout
-                data = self.audio_queue.get(timeout=0.1)
-                chunk_data.append(data)
-                chunk_samples += len(data)
-
-                # Print debug info occasionally
-                if self.chunk_count % 10 == 0:
-                    print(f"Ääntä vastaanotettu: {chunk_samples}/{target_samples} näytettä")
-
-                # If we have enough samples for a chunk, process it
-                if chunk_samples >= target_samples:
-                    # Concatenate all the data
-                    audio_chunk = np.concatenate(chunk_data)
-
-                    # Save the chunk to a temporary WAV file
-                    chunk_filename = os.path.join(self.temp_dir, f"chunk_{self.chunk_count}.wav")
-                    self._save_wav(chunk_filename, audio_chunk)
-
-                    print(f"Äänipalanen {self.chunk_count} tallennettu tiedostoon: {chunk_filename}")
-
-                    # Call the callback function if provided
-                    if self.callback:
-                        print(f"Kutsutaan takaisinkutsufunktiota äänipalaselle {self.chunk_count}")
-                        self.callback(chunk_filename)
-                    else:
-                        print("Takaisinkutsufunktiota ei ole määritetty")
-
-                    # Reset for the next chunk
-                    chunk_data = []
-                    chunk_samples = 0
-                    self.chunk_count += 1
-
-            except queue.Empty:
-                continue
+                self._update_level_meter()
+
+                # Wait until the callback has written a full chunk
+                if self.ring_buffer.write_position - chunk_start < target_samples:
+                    time.sleep(self.poll_interval)
+                    continue
+
+                # Skip audio that was overwritten if we fell too far behind
+                if chunk_start < self.ring_buffer.oldest_position:
+                    print("Äänen käsittely jäi jälkeen, osa äänestä ohitettiin")
+                    chunk_start = self.ring_buffer.oldest_position
+                    continue
+
+                # Copy the chunk out once, since consumers keep it after the ring wraps
+                audio_chunk = self.ring_buffer.read(chunk_start, chunk_start + target_samples).ravel()
+                self._emit_chunk(audio_chunk, chunk_start)
+                chunk_start += target_samples
+
             except Exception as e:
                 print(f"Virhe äänen käsittelyssä: {e}")
                 break
 
         print("Äänen käsittely lopetettu.")
 
+    def _process_audio_vad(self):
+        """Cut chunks out of the ring buffer at pauses in speech."""
+        chunker = self.vad_chunker
+        chunker.reset()
+        frame_samples = chunker.frame_samples
+        frame = np.empty((frame_samples, self.channels), dtype=self.dtype)
+        position = self.ring_buffer.oldest_position
+
+        print(f"Äänen käsittely aloitettu puheentunnistuksella, kehys: {frame_samples} näytettä")
+
+        while self.recording:
+            try:
+                self._update_level_meter()
+
+                if self.ring_buffer.write_position - position < frame_samples:
+                    time.sleep(self.poll_interval)
+                    continue
+
+                # Skip audio that was overwritten if we fell too far behind
+                if position < self.ring_buffer.oldest_position:
+                    print("Äänen käsittely jäi jälkeen, osa äänestä ohitettiin")
+                    position = self.ring_buffer.oldest_position
+                    chunker.reset()
+                    continue
+
+                # Feed every complete frame to the chunker without allocating
+                while self.ring_buffer.write_position - position >= frame_samples:
+                    self.ring_buffer.read(position, position + frame_samples, out=frame)
+                    for start, end in chunker.process_frame(frame, position):
+                        self._emit_range(start, end)
+                    position += frame_samples
+
+            except Exception as e:
+                print(f"Virhe äänen käsittelyssä: {e}")
+                break
+
+        # Emit the utterance that was still open when recording stopped
+        for start, end in chunker.flush(position):
+            self._emit_range(start, end)
+
+        print("Äänen käsittely lopetettu.")
+
+    def _emit_range(self, start, end):
+        """Copy a chunk out of the ring buffer and emit it."""
+        start = max(start, self.ring_buffer.oldest_position)
+        if end > start:
+            self._emit_chunk(self.ring_buffer.read(start, end).ravel(), start)
+
+    def _emit_chunk(self, audio_chunk, start):
+        """Persist a finished chunk if requested and pass it to the callback."""
+        # Save the chunk to a temporary WAV file if persistence is enabled
+        chunk_filename = None
+        if self.save_chunks:
+            chunk_filename = os.path.join(self.temp_dir, f"chunk_{self.chunk_count}.wav")
+            self._save_wav(chunk_filename, audio_chunk)
+            print(f"Äänipalanen {self.chunk_count} tallennettu tiedostoon: {chunk_filename}")
+
+        # Call the callback function if provided
+        if self.callback:
+            print(f"Kutsutaan takaisinkutsufunktiota äänipalaselle {self.chunk_count}")
+            self.callback(audio_chunk if self.in_memory else chunk_filename, start_time=start / self.sample_rate)
+        else:
+            print("Takaisinkutsufunktiota ei ole määritetty")
+
+        self.chunk_count += 1
+
     def _save_wav(self, filename, audio_data):
         """Save audio data to a WAV file."""
         # Convert from float32 [-1.0, 1.0] to int16 [-32768, 32767]
@@ -187,6 +322,9 @@ class AudioRecorder:
                 dtype=self.dtype
             )
 
+            self.ring_buffer.reset()
+            self._meter_position = 0
+            self._level = (0.0, 0.0)
             self.recording = True
             self.stream.start()
             print("Äänivirta käynnistetty onnistuneesti")
@@ -221,6 +359,8 @@ class AudioRecorder:
             self.thread = None
 
         print("Recording stopped")
+        if self.input_overflows or self.input_underflows:
+            print(f"Ylivuotoja: {self.input_overflows}, alivuotoja: {self.input_underflows}")
 
         # Return the path to the temporary directory with all chunks
         return self.temp_dir
@@ -0,0 +1,513 @@
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+import torch
+from transformers import AutoProcessor
+from transformers.modeling_outputs import BaseModelOutput
+from model_registry import registry, QUANTIZED_DTYPE
+from encoder_context import FULL_AUDIO_CTX, select_audio_ctx, audio_ctx_samples, encode_truncated
+
+# Names accepted by create_backend() and the --backend option of the scripts
+BACKENDS = ("transformers", "ctranslate2")
+
+# Directory where converted CTranslate2 models are cached so the conversion is paid once
+CTRANSLATE2_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "realtime-transcription", "ctranslate2")
+
+
+class InferenceBackend(ABC):
+    """
+    Interface of the inference engines used by Transcriber and the scripts.
+
+    A backend loads one Whisper model and turns lists of mono 16 kHz audio
+    into text. Subclasses implement load(), release(), transcribe_batch()
+    and detect_language().
+    """
+
+    name = None
+
+    def __init__(self, model_id, no_speech_threshold=None, max_new_tokens=256, stats=None):
+        """
+        Initialize the backend.
+
+        Args:
+            model_id: The Whisper model ID to use
+            no_speech_threshold: Skip inputs whose no-speech probability
+                exceeds this, or None
+            max_new_tokens: Longest transcription in tokens per input
+            stats: Dictionary where skip counters are added, e.g.
+                Transcriber.stats
+        """
+        self.model_id = model_id
+        self.no_speech_threshold = no_speech_threshold
+        self.max_new_tokens = max_new_tokens
+        self.stats = stats if stats is not None else {}
+        self.processor = None
+
+    @abstractmethod
+    def load(self):
+        """Load the model and processor."""
+
+    @abstractmethod
+    def release(self):
+        """Release the model."""
+
+    @abstractmethod
+    def transcribe_batch(self, audio_inputs, sample_rate, language, return_offsets=False):
+        """
+        Transcribe several inputs with as few model calls as possible.
+
+        Args:
+            audio_inputs: List of mono audio arrays
+            sample_rate: Sample rate of the audio
+            language: Language code for the transcription
+            return_offsets: Decode with timestamp tokens and return the
+                timestamped segments of each input instead of plain text
+
+        Returns:
+            List of transcriptions, or lists of {"text", "timestamp"} offset
+            dictionaries with return_offsets; inputs skipped by the
+            no-speech check give None
+        """
+
+    @abstractmethod
+    def detect_language(self, audio_input, sample_rate):
+        """
+        Detect the spoken language of the first 30 s of audio.
+
+        Returns:
+            Language code, e.g. "fi"
+        """
+
+    def _count(self, key, amount=1):
+        """Add to a counter in the shared statistics."""
+        self.stats[key] = self.stats.get(key, 0) + amount
+
+    def _count_skipped(self, audio_inputs, keep, sample_rate):
+        """Count the inputs dropped by the no-speech check."""
+        for k in set(range(len(audio_inputs))) - set(keep):
+            self._count("no_speech_segments")
+            self._count("skipped_seconds", len(audio_inputs[k]) / sample_rate)
+
+    def _context_samples(self, audio_ctx):
+        """Return the number of audio samples covered by audio_ctx encoder positions."""
+        return audio_ctx_samples(audio_ctx, self.processor.feature_extractor.hop_length)
+
+    def _decode_offsets(self, ids):
+        """Decode timestamped token ids into offset dictionaries."""
+        decoded = self.processor.tokenizer.decode(ids, skip_special_tokens=True, output_offsets=True)
+        offsets = decoded["offsets"]
+        if not offsets and decoded["text"].strip():
+            # No timestamp tokens were generated; keep the text with the first piece
+            offsets = [{"text": decoded["text"], "timestamp": (0.0, None)}]
+        return offsets
+
+
+class TransformersBackend(InferenceBackend):
+    name = "transformers"
+
+    def __init__(self, model_id, device="cpu", torch_dtype=torch.float32, quantize=False,
+                 reduced_context=False, no_speech_threshold=None, max_new_tokens=256, stats=None,
+                 draft_model_id=None, **load_kwargs):
+        """
+        Initialize the Hugging Face transformers backend.
+
+        Args:
+            model_id: The Whisper model ID to use
+            device: Device of the model
+            torch_dtype: Data type of the model inputs (and weights unless quantized)
+            quantize: Use dynamically int8-quantized Linear layers on the CPU
+            reduced_context: Run the encoder only on as many positions as the
+                longest input of a batch needs, rounded up to a bucket
+            no_speech_threshold: Skip inputs whose no-speech probability from
+                the first decoder step exceeds this, or None
+            max_new_tokens: Longest transcription in tokens per input
+            stats: Dictionary where skip counters are added
+            draft_model_id: Small Whisper model with the same vocabulary (e.g.
+                openai/whisper-tiny for whisper-small) that drafts tokens for
+                assisted generation, or None; batches are decoded one input
+                at a time, except that batches of inputs longer than 30 s
+                are decoded without the draft
+            **load_kwargs: Extra arguments for from_pretrained, e.g. attn_implementation
+        """
+        super().__init__(model_id, no_speech_threshold, max_new_tokens, stats)
+        self.device = device
+        self.torch_dtype = torch_dtype
+        self.model_dtype = QUANTIZED_DTYPE if quantize else torch_dtype
+        self.reduced_context = reduced_context
+        self.load_kwargs = load_kwargs
+        self.draft_model_id = draft_model_id
+        self.model = None
+        self.assistant_model = None
+
+    def load(self):
+        """Get the model, processor and optional draft model from the shared model registry."""
+        self.model, self.processor = registry.get(self.model_id, self.model_dtype, self.device, **self.load_kwargs)
+
+        if self.draft_model_id:
+            assistant_model, _ = registry.get(self.draft_model_id, self.torch_dtype, self.device)
+            if assistant_model.config.vocab_size == self.model.config.vocab_size:
+                self.assistant_model = assistant_model
+                print(f"Avustettu dekoodaus käytössä, luonnosmalli: {self.draft_model_id}")
+            else:
+                # Draft tokens are only useful if both models share the vocabulary
+                print(f"Luonnosmallin {self.draft_model_id} sanasto ei vastaa mallia, avustettu dekoodaus ohitetaan")
+                registry.release(self.draft_model_id, self.torch_dtype, self.device)
+
+    def release(self):
+        """Release the shared models so the registry may evict them when idle."""
+        if self.model is None:
+            return
+        self.model = None
+        self.processor = None
+        registry.release(self.model_id, self.model_dtype, self.device, **self.load_kwargs)
+
+        if self.assistant_model is not None:
+            self.assistant_model = None
+            registry.release(self.draft_model_id, self.torch_dtype, self.device)
+
+    def generation_kwargs(self, language):
+        """Return the keyword arguments for model.generate()."""
+        return {
+            "language": language,
+            "task": "transcribe",
+            "max_new_tokens": self.max_new_tokens,  # Pienempi arvo nopeuttaa
+            "num_beams": 1
+        }
+
+    def transcribe_batch(self, audio_inputs, sample_rate, language, return_offsets=False):
+        """Transcribe a batch with padded generate calls (see InferenceBackend)."""
+        audio_ctx = FULL_AUDIO_CTX
+        longest = max(len(audio) for audio in audio_inputs)
+        if self.reduced_context:
+            audio_ctx = select_audio_ctx(longest, sample_rate)
+
+        # Inputs that fit one window are encoded here so the encoder output
+        # can be truncated and checked for speech before decoding
+        short_form = audio_ctx < FULL_AUDIO_CTX or (
+            (self.no_speech_threshold is not None or self.assistant_model is not None)
+            and longest <= self._context_samples(FULL_AUDIO_CTX)
+        )
+        keep = list(range(len(audio_inputs)))
+
+        if short_form:
+            # Pad only up to the context instead of letting generate() pad to 30 s
+            input_features = self._features(audio_inputs, sample_rate, audio_ctx)
+            if audio_ctx < FULL_AUDIO_CTX:
+                self._count("reduced_context_batches")
+
+            with torch.no_grad():
+                encoder_outputs = encode_truncated(self.model.get_encoder(), input_features, audio_ctx)
+
+            if self.no_speech_threshold is not None:
+                probabilities = self.no_speech_probabilities(encoder_outputs)
+                keep = [k for k in keep if probabilities[k] < self.no_speech_threshold]
+                self._count_skipped(audio_inputs, keep, sample_rate)
+                if not keep:
+                    return [None] * len(audio_inputs)
+                encoder_outputs = BaseModelOutput(last_hidden_state=encoder_outputs.last_hidden_state[keep])
+
+            if self.assistant_model is not None:
+                generated_ids = self._generate_assisted(
+                    [audio_inputs[k] for k in keep], sample_rate, encoder_outputs, language, return_offsets
+                )
+            else:
+                with torch.no_grad():
+                    generated_ids = self.model.generate(
+                        encoder_outputs=encoder_outputs, return_timestamps=return_offsets,
+                        **self.generation_kwargs(language)
+                    )
+        else:
+            # Long-form generate() can only take a draft model for a single input
+            assisted = self.assistant_model is not None and len(audio_inputs) == 1
+            inputs = self.processor(
+                audio_inputs,
+                sampling_rate=sample_rate,
+                return_tensors="pt",
+                truncation=False,
+                padding="longest",
+                return_attention_mask=True
+            )
+            inputs = inputs.to(self.device, dtype=self.torch_dtype)
+
+            generation_kwargs = self.generation_kwargs(language)
+            if assisted:
+                # The draft model proposes tokens and the model verifies them in one pass;
+                # with greedy decoding the output is the same as without the draft
+                generation_kwargs["assistant_model"] = self.assistant_model
+                self._count("assisted_decodes")
+
+            with torch.no_grad():
+                generated_ids = self.model.generate(
+                    **inputs, return_timestamps=return_offsets, **generation_kwargs
+                )
+
+        # Results of inputs skipped by the no-speech check stay None
+        results = [None] * len(audio_inputs)
+        if return_offsets:
+            for k, ids in zip(keep, generated_ids):
+                results[k] = self._decode_offsets(ids)
+        else:
+            for k, text in zip(keep, self.processor.batch_decode(generated_ids, skip_special_tokens=True)):
+                results[k] = text
+        return results
+
+    def _generate_assisted(self, audio_inputs, sample_rate, encoder_outputs, language, return_offsets):
+        """
+        Decode short inputs one at a time with the draft model.
+
+        generate() drafts a single sequence at a time when given an
+        assistant model. The model reuses its already computed (and possibly
+        truncated) encoder output; the draft model encodes full 30 s features
+        itself, so its encoder is not truncated.
+
+        Args:
+            audio_inputs: Inputs that passed the no-speech check
+            sample_rate: Sample rate of the audio
+            encoder_outputs: Encoder output of the same inputs, one row each
+            language: Language code for the transcription
+            return_offsets: Decode with timestamp tokens
+
+        Returns:
+            List of generated token id tensors, one per input
+        """
+        # With greedy decoding the output is the same as without the draft
+        generation_kwargs = self.generation_kwargs(language)
+        generation_kwargs["assistant_model"] = self.assistant_model
+
+        generated_ids = []
+        hidden_states = encoder_outputs.last_hidden_state
+        for k, audio in enumerate(audio_inputs):
+            input_features = self._features([audio], sample_rate, FULL_AUDIO_CTX)
+            with torch.no_grad():
+                ids = self.model.generate(
+                    input_features=input_features,
+                    encoder_outputs=BaseModelOutput(last_hidden_state=hidden_states[k:k + 1]),
+                    return_timestamps=return_offsets, **generation_kwargs
+                )
+            generated_ids.append(ids[0])
+            self._count("assisted_decodes")
+        return generated_ids
+
+    def detect_language(self, audio_input, sample_rate):
+        """Detect the language from the first decoder step (see InferenceBackend)."""
+        input_features = self._features([audio_input[:self._context_samples(FULL_AUDIO_CTX)]], sample_rate, FULL_AUDIO_CTX)
+        with torch.no_grad():
+            encoder_outputs = encode_truncated(self.model.get_encoder(), input_features, FULL_AUDIO_CTX)
+        logits = self._first_step_logits(encoder_outputs)[0]
+
+        lang_to_id = self.model.generation_config.lang_to_id
+        tokens = list(lang_to_id)
+        ids = torch.tensor([lang_to_id[token] for token in tokens], device=logits.device)
+        return tokens[int(torch.argmax(logits[ids]))][2:-2]
+
+    def no_speech_probabilities(self, encoder_outputs):
+        """
+        Compute Whisper's no-speech probability for each encoded input.
+
+        The probability of the no-speech token is read from the first decoder
+        step after the start-of-transcript token, like in the original Whisper.
+
+        Args:
+            encoder_outputs: Encoder output of the batch
+
+        Returns:
+            NumPy array with one probability per input
+        """
+        logits = self._first_step_logits(encoder_outputs)
+
+        # The no-speech token directly precedes <|notimestamps|> in every Whisper vocabulary
+        no_speech_token_id = self.model.generation_config.no_timestamps_token_id - 1
+        return torch.softmax(logits.float(), dim=-1)[:, no_speech_token_id].cpu().numpy()
+
+    def _features(self, audio_inputs, sample_rate, audio_ctx):
+        """Compute log-mel features padded to exactly audio_ctx encoder positions."""
+        inputs = self.processor(
+            audio_inputs,
+            sampling_rate=sample_rate,
+            return_tensors="pt",
+            truncation=True,
+            padding="max_length",
+            max_length=self._context_samples(audio_ctx)
+        )
+        return inputs.input_features.to(self.device, dtype=self.torch_dtype)
+
+    def _first_step_logits(self, encoder_outputs):
+        """Return the decoder logits after the start-of-transcript token, one row per input."""
+        hidden_states = encoder_outputs.last_hidden_state
+        decoder_input_ids = torch.full(
+            (hidden_states.shape[0], 1), self.model.generation_config.decoder_start_token_id,
+            dtype=torch.long, device=hidden_states.device
+        )
+        with torch.no_grad():
+            return self.model(encoder_outputs=encoder_outputs, decoder_input_ids=decoder_input_ids).logits[:, 0]
+
+
+class CTranslate2Backend(InferenceBackend):
+    name = "ctranslate2"
+
+    def __init__(self, model_id, device="cpu", compute_type="int8", num_threads=0,
+                 no_speech_threshold=None, max_new_tokens=256, stats=None):
+        """
+        Initialize the CTranslate2 backend.
+
+        The model is converted from the transformers checkpoint to an int8
+        CTranslate2 model on first use and cached. CTranslate2 runs the
+        encoder and decoder in optimized C++ with its own KV cache, which is
+        considerably faster than transformers on the CPU.
+
+        Args:
+            model_id: The Whisper model ID to use
+            device: "cpu" or a CUDA device such as "cuda:0"
+            compute_type: CTranslate2 compute type, e.g. "int8" or "int8_float16"
+            num_threads: Threads per model on the CPU, 0 for the library default
+            no_speech_threshold: Skip inputs whose no-speech probability
+                exceeds this, or None
+            max_new_tokens: Longest transcription in tokens per input
+            stats: Dictionary where skip counters are added
+        """
+        super().__init__(model_id, no_speech_threshold, max_new_tokens, stats)
+        self.device = device
+        self.compute_type = compute_type
+        self.num_threads = num_threads
+        self.model = None
+
+    def load(self):
+        """Convert the model if needed and load it."""
+        try:
+            import ctranslate2
+        except ImportError:
+            raise ImportError("CTranslate2-taustajärjestelmä vaatii paketin ctranslate2 (pip install ctranslate2)")
+
+        model_path = os.path.join(CTRANSLATE2_CACHE_DIR, self.model_id.replace("/", "__") + "-" + self.compute_type)
+        if not os.path.exists(os.path.join(model_path, "model.bin")):
+            print(f"Muunnetaan malli CTranslate2-muotoon (tehdään vain kerran): {model_path}")
+            converter = ctranslate2.converters.TransformersConverter(self.model_id)
+            converter.convert(model_path, quantization=self.compute_type, force=True)
+
+        device, _, index = self.device.partition(":")
+        self.model = ctranslate2.models.Whisper(
+            model_path,
+            device=device,
+            device_index=int(index or 0),
+            compute_type=self.compute_type,
+            intra_threads=self.num_threads
+        )
+        self.processor = AutoProcessor.from_pretrained(self.model_id)
+
+    def release(self):
+        """Free the model."""
+        self.model = None
+        self.processor = None
+
+    def transcribe_batch(self, audio_inputs, sample_rate, language, return_offsets=False):
+        """Transcribe a batch with one CTranslate2 generate call (see InferenceBackend)."""
+        # CTranslate2 only decodes 30 s windows, so longer inputs are split and joined afterwards
+        window = 30 * sample_rate
+        pieces = []
+        owners = []
+        offsets = []
+        for k, audio in enumerate(audio_inputs):
+            for start in range(0, max(len(audio), 1), window):
+                pieces.append(audio[start:start + window])
+                owners.append(k)
+                offsets.append(start / sample_rate)
+
+        prompt_tokens = ["<|startoftranscript|>", f"<|{language}|>", "<|transcribe|>"]
+        if not return_offsets:
+            prompt_tokens.append("<|notimestamps|>")
+        prompt = self.processor.tokenizer.convert_tokens_to_ids(prompt_tokens)
+
+        outputs = self.model.generate(
+            self._features(pieces, sample_rate),
+            [prompt] * len(pieces),
+            beam_size=1,
+            max_length=len(prompt) + self.max_new_tokens,
+            include_prompt_in_result=False,
+            return_no_speech_prob=self.no_speech_threshold is not None
+        )
+
+        results = [None] * len(audio_inputs)
+        for k, offset, output in zip(owners, offsets, outputs):
+            if self.no_speech_threshold is not None and output.no_speech_prob >= self.no_speech_threshold:
+                self._count("no_speech_segments")
+                self._count("skipped_seconds", min(window, len(audio_inputs[k]) - offset * sample_rate) / sample_rate)
+                continue
+
+            ids = output.sequences_ids[0]
+            if return_offsets:
+                shifted = [
+                    {"text": item["text"], "timestamp": tuple(None if t is None else t + offset for t in item["timestamp"])}
+                    for item in self._decode_offsets(ids)
+                ]
+                results[k] = (results[k] or []) + shifted
+            else:
+                text = self.processor.tokenizer.decode(ids, skip_special_tokens=True)
+                results[k] = text if results[k] is None else f"{results[k]} {text}"
+        return results
+
+    def detect_language(self, audio_input, sample_rate):
+        """Detect the language with CTranslate2's language detection (see InferenceBackend)."""
+        features = self._features([audio_input[:self._context_samples(FULL_AUDIO_CTX)]], sample_rate)
+        language_token, _ = self.model.detect_language(features)[0][0]
+        return language_token[2:-2]
+
+    def _features(self, audio_inputs, sample_rate):
+        """Compute 30 s log-mel features as a CTranslate2 StorageView."""
+        import ctranslate2
+
+        features = self.processor(audio_inputs, sampling_rate=sample_rate, return_tensors="np").input_features
+        return ctranslate2.StorageView.from_array(np.ascontiguousarray(features, dtype=np.float32))
+
+
+def create_backend(name, model_id, device="cpu", torch_dtype=torch.float32, quantize=False,
+                   reduced_context=False, no_speech_threshold=None, max_new_tokens=256, stats=None,
+                   draft_model_id=None, num_threads=0, **load_kwargs):
+    """
+    Create an inference backend by name.
+
+    Args:
+        name: One of BACKENDS
+        model_id: The Whisper model ID to use
+        device: Device of the model
+        torch_dtype: Data type of the transformers model
+        quantize: Use int8 weights; CTranslate2 always uses them, so False
+            only prints a notice there
+        reduced_context: Truncate the encoder context (transformers only)
+        no_speech_threshold: Skip inputs whose no-speech probability exceeds this
+        max_new_tokens: Longest transcription in tokens per input
+        stats: Dictionary where skip counters are added
+        draft_model_id: Draft model for assisted generation (transformers only)
+        num_threads: CPU threads of the CTranslate2 model, 0 for the library
+            default; the transformers model uses torch's thread count
+        **load_kwargs: Extra from_pretrained arguments (transformers only)
+
+    Returns:
+        An unloaded InferenceBackend; call load() before use
+
+    Raises:
+        ValueError: If the backend is unknown or does not support a requested option
+    """
+    if name == "transformers":
+        return TransformersBackend(
+            model_id, device=device, torch_dtype=torch_dtype, quantize=quantize,
+            reduced_context=reduced_context, no_speech_threshold=no_speech_threshold,
+            max_new_tokens=max_new_tokens, stats=stats, draft_model_id=draft_model_id, **load_kwargs
+        )
+    if name == "ctranslate2":
+        # CTranslate2 runs its own encoder and decoder, so these options cannot be honoured
+        unsupported = [option for option, requested in (
+            ("reduced_context", reduced_context),
+            ("draft_model_id", draft_model_id),
+            *((key, True) for key in load_kwargs)
+        ) if requested]
+        if unsupported:
+            raise ValueError(f"CTranslate2-taustajärjestelmä ei tue asetuksia: {', '.join(unsupported)}")
+        if not quantize:
+            print("CTranslate2 käyttää aina int8-painoja, quantize=False ei vaikuta")
+
+        compute_type = "int8" if device == "cpu" else "int8_float16"
+        return CTranslate2Backend(
+            model_id, device=device, compute_type=compute_type, num_threads=num_threads,
+            no_speech_threshold=no_speech_threshold, max_new_tokens=max_new_tokens, stats=stats
+        )
+    raise ValueError(f"Tuntematon taustajärjestelmä: {name} (vaihtoehdot: {', '.join(BACKENDS)})")
@@ -0,0 +1,79 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from backends import BACKENDS
+from benchmark_utils import load_audio, word_error_rate
+
+
+def run_worker(args):
+    """Transcribe the audio in chunks with one backend and print the results as JSON."""
+    import torch
+    from backends import create_backend
+
+    audio, sample_rate = load_audio(args.audio, args.duration)
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    backend = create_backend(args.worker, args.model, device=device)
+
+    start = time.perf_counter()
+    backend.load()
+    load_time = time.perf_counter() - start
+
+    language = backend.detect_language(audio, sample_rate)
+
+    chunk = int(args.chunk_duration * sample_rate)
+    start = time.perf_counter()
+    texts = [backend.transcribe_batch([audio[i:i + chunk]], sample_rate, language)[0] or ""
+             for i in range(0, len(audio), chunk)]
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "load_time": load_time,
+        "language": language,
+        "rtf": elapsed / (len(audio) / sample_rate),
+        "text": " ".join(texts)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vertaa päättelymoottorien reaaliaikakerrointa samalla äänellä')
+    parser.add_argument('--audio', type=str, default=None, help='Äänitiedoston polku')
+    parser.add_argument('--duration', type=float, default=60, help='Transkriptoitavan äänen kesto sekunteina')
+    parser.add_argument('--chunk-duration', type=float, default=5, help='Palan pituus sekunteina')
+    parser.add_argument('--model', type=str, default='openai/whisper-small', help='Whisper-malli')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS), help='Verrattavat moottorit')
+    parser.add_argument('--worker', choices=BACKENDS, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    # Each backend runs in its own process so they do not share threads or caches
+    results = {}
+    for backend in args.backends:
+        command = [sys.executable, __file__, '--worker', backend, '--duration', str(args.duration),
+                   '--chunk-duration', str(args.chunk_duration), '--model', args.model]
+        if args.audio:
+            command += ['--audio', args.audio]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend}: mittaus epäonnistui\n{completed.stderr.strip().splitlines()[-1]}")
+            continue
+
+        results[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{backend}: reaaliaikakerroin {results[backend]['rtf']:.3f}, "
+              f"lataus {results[backend]['load_time']:.1f} s, kieli {results[backend]['language']}")
+
+    if "transformers" in results:
+        reference = results["transformers"]
+        for backend, result in results.items():
+            if backend == "transformers":
+                continue
+            print(f"{backend}: nopeutus {reference['rtf'] / result['rtf']:.2f}x, "
+                  f"tulosten ero transformers-tulokseen {word_error_rate(reference['text'], result['text']):.1%}")
+
+
+if __name__ == "__main__":
+    main()
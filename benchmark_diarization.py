@@ -0,0 +1,102 @@
+import argparse
+import time
+import numpy as np
+from speaker_diarization import SpeakerDiarization
+
+
+def detect_segments_loop(diarization, audio_data, sample_rate):
+    """Reference per-sample implementation of silence segmentation."""
+    audio_data = audio_data / np.max(np.abs(audio_data))
+    is_silence = np.abs(audio_data) < diarization.energy_threshold
+
+    min_silence_samples = int(diarization.min_silence_duration * sample_rate)
+    min_segment_samples = int(diarization.min_segment_duration * sample_rate)
+
+    silence_starts = []
+    silence_ends = []
+    in_silence = False
+    silence_start = 0
+
+    for i, silent in enumerate(is_silence):
+        if silent and not in_silence:
+            silence_start = i
+            in_silence = True
+        elif not silent and in_silence:
+            if i - silence_start >= min_silence_samples:
+                silence_starts.append(silence_start)
+                silence_ends.append(i)
+            in_silence = False
+
+    if in_silence and len(audio_data) - silence_start >= min_silence_samples:
+        silence_starts.append(silence_start)
+        silence_ends.append(len(audio_data))
+
+    segments = []
+    if not silence_starts or silence_starts[0] > 0:
+        end = silence_starts[0] if silence_starts else len(audio_data)
+        if end >= min_segment_samples:
+            segments.append((0.0, end / sample_rate))
+
+    for i in range(len(silence_ends)):
+        start = silence_ends[i]
+        end = silence_starts[i+1] if i+1 < len(silence_starts) else len(audio_data)
+        if end - start >= min_segment_samples:
+            segments.append((start / sample_rate, end / sample_rate))
+
+    return segments
+
+
+def make_test_audio(duration, sample_rate, seed=0):
+    """Create speech-like bursts of noise separated by pauses of varying length."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(duration * sample_rate), dtype=np.float32)
+    position = 0
+    while position < len(audio):
+        burst = int(rng.uniform(0.5, 6.0) * sample_rate)
+        pause = int(rng.uniform(0.1, 1.5) * sample_rate)
+        audio[position:position + burst] = 0.3 * rng.standard_normal(min(burst, len(audio) - position))
+        position += burst + pause
+    return audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vertaa hiljaisuuteen perustuvan paloittelun nopeutta')
+    parser.add_argument('--duration', type=float, default=3600, help='Testiäänen kesto sekunteina')
+    parser.add_argument('--sample-rate', type=int, default=16000, help='Näytteenottotaajuus')
+    parser.add_argument('--frame-hop', type=float, default=0.01, help='Kehysten väli sekunteina')
+    args = parser.parse_args()
+
+    audio = make_test_audio(args.duration, args.sample_rate)
+    diarization = SpeakerDiarization()
+    diarization.frame_hop = args.frame_hop
+
+    start = time.perf_counter()
+    segments = diarization._detect_segments(audio, args.sample_rate)
+    vectorized_time = time.perf_counter() - start
+    print(f"Vektoroitu: {vectorized_time:.3f} s, {len(segments)} segmenttiä")
+
+    start = time.perf_counter()
+    reference = detect_segments_loop(diarization, audio, args.sample_rate)
+    loop_time = time.perf_counter() - start
+    print(f"Silmukka: {loop_time:.3f} s, {len(reference)} segmenttiä")
+
+    print(f"Nopeutus: {loop_time / vectorized_time:.0f}x")
+
+    # With a one-sample hop the frame energy is the squared sample amplitude,
+    # so the result must match the reference exactly
+    diarization.frame_hop = 1 / args.sample_rate
+    exact = diarization._detect_segments(audio, args.sample_rate)
+    print(f"Tulokset identtiset näytteen välillä: {exact == reference}")
+
+    # Full pipeline: segmentation, batched embeddings and online clustering
+    diarization.frame_hop = args.frame_hop
+    start = time.perf_counter()
+    speaker_turns = diarization.process_audio(audio, args.sample_rate)
+    pipeline_time = time.perf_counter() - start
+    speakers = len({speaker for _, _, speaker in speaker_turns})
+    print(f"Koko puhujantunnistus: {pipeline_time:.3f} s, {len(speaker_turns)} segmenttiä, {speakers} puhujaa, "
+          f"reaaliaikakerroin {pipeline_time / args.duration:.4f}")
+
+
+if __name__ == "__main__":
+    main()
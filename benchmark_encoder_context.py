@@ -0,0 +1,49 @@
+import argparse
+import time
+import numpy as np
+from benchmark_utils import load_audio, word_error_rate
+from encoder_context import AUDIO_CTX_BUCKETS, FULL_AUDIO_CTX
+
+
+def time_transcription(transcriber, audio, sample_rate, repeats):
+    """Return the median latency and the text of transcribing one segment."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        text = transcriber._transcribe_batch([audio], sample_rate)[0]
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mittaa lyhennetyn kooderikontekstin nopeutus ja tarkkuus ämpäreittäin')
+    parser.add_argument('--audio', type=str, default=None, help='Äänitiedoston polku')
+    parser.add_argument('--model', type=str, default='openai/whisper-small', help='Whisper-malli')
+    parser.add_argument('--repeats', type=int, default=3, help='Toistojen määrä kullekin mittaukselle')
+    args = parser.parse_args()
+
+    from transcriber import Transcriber
+
+    audio, sample_rate = load_audio(args.audio, FULL_AUDIO_CTX / 50)
+    transcriber = Transcriber(model_id=args.model, use_diarization=False)
+
+    print(f"{'Konteksti':>10} {'Kesto':>7} {'Täysi':>8} {'Lyhennetty':>11} {'Nopeutus':>9} {'Ero':>6}")
+    for bucket in AUDIO_CTX_BUCKETS[:-1]:
+        # Segment that just fits the bucket, like a diarized segment of that length
+        segment = audio[:int((bucket / 50 - 0.2) * sample_rate)]
+
+        transcriber.backend.reduced_context = False
+        full_time, full_text = time_transcription(transcriber, segment, sample_rate, args.repeats)
+        transcriber.backend.reduced_context = True
+        reduced_time, reduced_text = time_transcription(transcriber, segment, sample_rate, args.repeats)
+
+        drift = word_error_rate(full_text, reduced_text)
+        print(f"{bucket:>10} {len(segment) / sample_rate:>6.1f}s {full_time:>7.3f}s {reduced_time:>10.3f}s "
+              f"{full_time / reduced_time:>8.2f}x {drift:>6.1%}")
+        if drift > 0:
+            print(f"  täysi:       {full_text}")
+            print(f"  lyhennetty:  {reduced_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from benchmark_utils import load_audio, word_error_rate
+
+
+def run_worker(args):
+    """Transcribe the audio in 5 second chunks with one engine and print the results as JSON."""
+    from transcriber import Transcriber
+
+    audio, sample_rate = load_audio(args.audio, args.duration)
+    transcriber = Transcriber(model_id=args.model, use_diarization=False, quantize=args.worker == "int8")
+
+    chunk = 5 * sample_rate
+    start = time.perf_counter()
+    texts = [transcriber.transcribe_audio(audio[i:i + chunk], sample_rate) for i in range(0, len(audio), chunk)]
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "rtf": elapsed / (len(audio) / sample_rate),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "text": " ".join(texts)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vertaa float32- ja int8-kvantisoidun mallin nopeutta ja tarkkuutta')
+    parser.add_argument('--audio', type=str, default=None, help='Äänitiedoston polku')
+    parser.add_argument('--duration', type=float, default=60, help='Transkriptoitavan äänen kesto sekunteina')
+    parser.add_argument('--model', type=str, default='openai/whisper-small', help='Whisper-malli')
+    parser.add_argument('--worker', choices=['float32', 'int8'], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    # Each engine runs in its own process so peak RSS is measured separately
+    results = {}
+    for engine in ("float32", "int8"):
+        command = [sys.executable, __file__, '--worker', engine, '--duration', str(args.duration), '--model', args.model]
+        if args.audio:
+            command += ['--audio', args.audio]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results[engine] = json.loads(output.strip().splitlines()[-1])
+        print(f"{engine}: reaaliaikakerroin {results[engine]['rtf']:.3f}, "
+              f"huippumuisti {results[engine]['peak_rss_mb']:.0f} MB")
+
+    drift = word_error_rate(results["float32"]["text"], results["int8"]["text"])
+    print(f"Nopeutus: {results['float32']['rtf'] / results['int8']['rtf']:.2f}x")
+    print(f"Tulosten ero (sanavirheaste float32-tulokseen nähden): {drift:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import time
+import numpy as np
+from benchmark_utils import load_audio
+
+
+def run(backend, chunks, sample_rate, language):
+    """Transcribe chunks one at a time and return latencies, token counts and texts."""
+    latencies = []
+    tokens = []
+    texts = []
+    for chunk in chunks:
+        start = time.perf_counter()
+        text = backend.transcribe_batch([chunk], sample_rate, language)[0] or ""
+        latencies.append(time.perf_counter() - start)
+        tokens.append(len(backend.processor.tokenizer(text, add_special_tokens=False).input_ids))
+        texts.append(text)
+    return latencies, tokens, texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mittaa avustetun (spekulatiivisen) dekoodauksen nopeus')
+    parser.add_argument('--audio', type=str, default=None, help='Äänitiedoston polku')
+    parser.add_argument('--duration', type=float, default=60, help='Transkriptoitavan äänen kesto sekunteina')
+    parser.add_argument('--chunk-duration', type=float, default=5, help='Palan pituus sekunteina')
+    parser.add_argument('--model', type=str, default='openai/whisper-small', help='Whisper-malli')
+    parser.add_argument('--draft-model', type=str, default='openai/whisper-tiny', help='Luonnosmalli')
+    parser.add_argument('--language', type=str, default='fi', help='Kielen koodi')
+    args = parser.parse_args()
+
+    import torch
+    from backends import create_backend
+
+    audio, sample_rate = load_audio(args.audio, args.duration)
+    chunk = int(args.chunk_duration * sample_rate)
+    chunks = [audio[i:i + chunk] for i in range(0, len(audio), chunk)]
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+
+    results = {}
+    for name, draft_model_id in (("ilman luonnosmallia", None), ("luonnosmallilla", args.draft_model)):
+        backend = create_backend("transformers", args.model, device=device, draft_model_id=draft_model_id)
+        backend.load()
+        run(backend, chunks[:1], sample_rate, args.language)  # Warm up
+        latencies, tokens, texts = run(backend, chunks, sample_rate, args.language)
+        backend.release()
+
+        results[name] = texts
+        print(f"{name}: {sum(tokens) / sum(latencies):.1f} tokenia/s, "
+              f"palan viive mediaani {np.median(latencies):.3f} s, maksimi {max(latencies):.3f} s")
+
+    plain, assisted = results.values()
+    identical = sum(a == b for a, b in zip(plain, assisted))
+    print(f"Samat tulokset: {identical}/{len(chunks)} palaa")
+
+
+if __name__ == "__main__":
+    main()
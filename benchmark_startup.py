@@ -0,0 +1,62 @@
+import argparse
+import subprocess
+import sys
+import time
+import numpy as np
+import soundfile as sf
+
+
+def measure_import(module):
+    """Measure the import time of a module in a fresh interpreter."""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Moduulin {module} tuonti epäonnistui:\n{result.stderr}")
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mittaa sovelluksen käynnistysaika ja aika ensimmäiseen transkriptioon')
+    parser.add_argument('--audio', type=str, default=None, help='Äänitiedosto, jonka alusta transkriptoidaan 5 sekuntia')
+    parser.add_argument('--model', type=str, default='openai/whisper-small', help='Whisper-malli')
+    args = parser.parse_args()
+
+    # Import times; the window only needs the app module, the model needs transcriber
+    for module in ("app", "transcriber"):
+        elapsed = measure_import(module)
+        if elapsed is not None:
+            print(f"Moduulin {module} tuonti: {elapsed:.2f} s")
+
+    if args.audio:
+        audio, sample_rate = sf.read(args.audio, frames=5 * sf.info(args.audio).samplerate, dtype='float32')
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+    else:
+        sample_rate = 16000
+        t = np.arange(5 * sample_rate) / sample_rate
+        audio = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+    # Time to first transcript, as the app's background loader sees it
+    start = time.perf_counter()
+    from transcriber import Transcriber
+    imported = time.perf_counter()
+    transcriber = Transcriber(model_id=args.model, use_diarization=False)
+    loaded = time.perf_counter()
+    transcription = transcriber.transcribe_audio(audio, sample_rate)
+    finished = time.perf_counter()
+
+    print(f"Tuonti: {imported - start:.2f} s")
+    print(f"Mallin lataus ja lämmittely: {loaded - imported:.2f} s")
+    print(f"Ensimmäinen transkriptio: {finished - loaded:.2f} s")
+    print(f"Aika ensimmäiseen transkriptioon: {finished - start:.2f} s")
+    print(f"Transkriptio: {transcription}")
+
+
+if __name__ == "__main__":
+    main()
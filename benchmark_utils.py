@@ -0,0 +1,32 @@
+import numpy as np
+import soundfile as sf
+
+
+def load_audio(audio_file, duration):
+    """Load up to duration seconds of mono audio, or synthesize a test tone."""
+    if audio_file:
+        info = sf.info(audio_file)
+        audio, sample_rate = sf.read(audio_file, frames=int(duration * info.samplerate), dtype='float32')
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        return audio, sample_rate
+
+    sample_rate = 16000
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), sample_rate
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance between two transcriptions, relative to the reference length."""
+    reference = reference.lower().split()
+    hypothesis = hypothesis.lower().split()
+    distances = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hypothesis, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1,
+                distances[j - 1] + 1,
+                previous + (ref_word != hyp_word)
+            )
+    return distances[-1] / max(len(reference), 1)
@@ -0,0 +1,215 @@
+import argparse
+import contextlib
+import json
+import os
+import time
+import numpy as np
+
+# File where the best thread configuration of this host is saved
+TUNING_FILE = os.path.join(os.path.expanduser("~"), ".cache", "realtime-transcription", "cpu_tuning.json")
+
+
+def available_cores():
+    """Return the CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def inference_cores(reserved_cores=1):
+    """
+    Return the cores left for inference after reserving some for audio capture.
+
+    The last cores are reserved so the PortAudio callback and the recorder
+    thread never compete with torch's thread pool. At least one core is
+    always left for inference.
+
+    Args:
+        reserved_cores: Number of cores kept free of inference threads
+
+    Returns:
+        List of core indices
+    """
+    cores = available_cores()
+    keep = max(1, len(cores) - reserved_cores)
+    return cores[:keep]
+
+
+def candidate_thread_counts(max_threads):
+    """Return the thread counts worth benchmarking: powers of two and the maximum."""
+    counts = []
+    count = 1
+    while count < max_threads:
+        counts.append(count)
+        count *= 2
+    counts.append(max_threads)
+    return counts
+
+
+def load_tuning():
+    """
+    Load the saved configuration if it was measured on this host.
+
+    Returns:
+        Dictionary with num_threads and interop_threads, or None
+    """
+    try:
+        with open(TUNING_FILE, encoding="utf-8") as f:
+            tuning = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # A configuration measured with another core count does not apply
+    if tuning.get("cpu_count") != len(available_cores()):
+        return None
+    return tuning
+
+
+def save_tuning(tuning):
+    """Save a configuration to TUNING_FILE."""
+    os.makedirs(os.path.dirname(TUNING_FILE), exist_ok=True)
+    with open(TUNING_FILE, "w", encoding="utf-8") as f:
+        json.dump(tuning, f, indent=2)
+
+
+def apply_cpu_tuning(reserved_cores=1):
+    """
+    Apply the saved (or a default) thread configuration to torch.
+
+    Without a saved configuration torch gets one thread per inference core.
+    Interop threads can only be set before torch runs any parallel work, so
+    a failure to set them is ignored.
+
+    Args:
+        reserved_cores: Number of cores kept free for the capture path
+
+    Returns:
+        List of cores inference threads should be pinned to with pin_current_thread()
+    """
+    import torch
+
+    cores = inference_cores(reserved_cores)
+    tuning = load_tuning()
+    num_threads = min(tuning["num_threads"], len(cores)) if tuning else len(cores)
+    interop_threads = tuning.get("interop_threads", 1) if tuning else 1
+
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        pass
+
+    print(f"Käytetään {num_threads} säiettä ytimillä {cores[0]}-{cores[-1]}"
+          f"{' (tallennettu viritys)' if tuning else ''}")
+    return cores
+
+
+def pin_current_thread(cores):
+    """
+    Restrict the calling thread to the given cores.
+
+    On Linux the affinity applies to the calling thread only, and the
+    OpenMP threads torch starts from it inherit it, so pinning the
+    inference thread keeps the whole inference pool off the reserved cores
+    while the capture threads may still run anywhere.
+    """
+    if not hasattr(os, "sched_setaffinity") or not cores:
+        return
+    try:
+        os.sched_setaffinity(0, cores)
+    except OSError as e:
+        print(f"Virhe ytimien kiinnittämisessä: {e}")
+
+
+@contextlib.contextmanager
+def pinned_to(cores):
+    """
+    Run a block with the calling thread restricted to the given cores.
+
+    Threads started inside the block, like the OpenMP pool torch starts on
+    its first parallel operation (e.g. the registry's warmup decode),
+    inherit the affinity and keep it. The calling thread gets its previous
+    affinity back afterwards.
+    """
+    if not hasattr(os, "sched_getaffinity") or not cores:
+        yield
+        return
+
+    previous = os.sched_getaffinity(0)
+    pin_current_thread(cores)
+    try:
+        yield
+    finally:
+        try:
+            os.sched_setaffinity(0, previous)
+        except OSError:
+            pass
+
+
+def benchmark_threads(model_id, audio, sample_rate, language="fi", reserved_cores=1, repeats=3):
+    """
+    Measure transcription latency with different torch thread counts.
+
+    Args:
+        model_id: The Whisper model ID to use
+        audio: Mono audio used for the measurement
+        sample_rate: Sample rate of the audio
+        language: Language code for the transcription
+        reserved_cores: Number of cores kept free for the capture path
+        repeats: Measurements per thread count; the median is used
+
+    Returns:
+        Dictionary with the best configuration and all timings
+    """
+    import torch
+    from backends import create_backend
+
+    cores = inference_cores(reserved_cores)
+    pin_current_thread(cores)
+
+    backend = create_backend("transformers", model_id)
+    backend.load()
+
+    timings = {}
+    for num_threads in candidate_thread_counts(len(cores)):
+        torch.set_num_threads(num_threads)
+        backend.transcribe_batch([audio], sample_rate, language)  # Warm up the thread pool
+
+        elapsed = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            backend.transcribe_batch([audio], sample_rate, language)
+            elapsed.append(time.perf_counter() - start)
+        timings[num_threads] = float(np.median(elapsed))
+        print(f"{num_threads} säiettä: {timings[num_threads]:.3f} s")
+
+    backend.release()
+    best = min(timings, key=timings.get)
+    return {
+        "num_threads": best,
+        "interop_threads": 1,
+        "reserved_cores": reserved_cores,
+        "cpu_count": len(available_cores()),
+        "model_id": model_id,
+        "timings": {str(num_threads): timing for num_threads, timing in timings.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Etsi tälle koneelle nopein säiemäärä ja tallenna se')
+    parser.add_argument('--audio', type=str, default=None, help='Äänitiedosto, jonka alusta mitataan')
+    parser.add_argument('--duration', type=float, default=5, help='Mitattavan äänen kesto sekunteina')
+    parser.add_argument('--model', type=str, default='openai/whisper-small', help='Whisper-malli')
+    parser.add_argument('--reserved-cores', type=int, default=1, help='Äänen kaappaukselle varattujen ytimien määrä')
+    args = parser.parse_args()
+
+    from benchmark_utils import load_audio
+
+    audio, sample_rate = load_audio(args.audio, args.duration)
+    tuning = benchmark_threads(args.model, audio, sample_rate, reserved_cores=args.reserved_cores)
+    save_tuning(tuning)
+    print(f"Nopein: {tuning['num_threads']} säiettä. Viritys tallennettu: {TUNING_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import copy
+import math
+import torch.nn.functional as F
+from torch import nn
+
+# Encoder context sizes in positions; Whisper's encoder has 50 positions per second
+AUDIO_CTX_BUCKETS = (250, 500, 750, 1000, 1500)
+
+# Full encoder context of Whisper (30 s)
+FULL_AUDIO_CTX = 1500
+
+# Mel frames per encoder position (conv2 has stride 2) and the default samples per
+# mel frame of Whisper's 16 kHz feature extractor
+FRAMES_PER_POSITION = 2
+HOP_LENGTH = 160
+
+
+def select_audio_ctx(num_samples, sample_rate, buckets=AUDIO_CTX_BUCKETS):
+    """
+    Pick the smallest encoder context bucket that holds the audio.
+
+    Args:
+        num_samples: Length of the longest audio in samples
+        sample_rate: Sample rate of the audio
+        buckets: Allowed context sizes in positions, ascending
+
+    Returns:
+        Context size in encoder positions
+    """
+    positions = math.ceil(num_samples / sample_rate * 50)
+    for bucket in buckets:
+        if bucket >= positions:
+            return bucket
+    return FULL_AUDIO_CTX
+
+
+def audio_ctx_samples(audio_ctx, hop_length=HOP_LENGTH):
+    """
+    Return the number of audio samples covered by an encoder context.
+
+    Args:
+        audio_ctx: Context size in encoder positions
+        hop_length: Samples per mel frame of the feature extractor
+            (processor.feature_extractor.hop_length)
+    """
+    return audio_ctx * FRAMES_PER_POSITION * hop_length
+
+
+def truncated_encoder(encoder, audio_ctx):
+    """
+    Return a copy of the encoder that accepts audio_ctx positions.
+
+    The copy shares every layer and weight with the encoder; only its
+    config and its position embedding (a view of the first audio_ctx rows)
+    are its own, so the shared model and its generation config are never
+    modified and other threads can keep using them.
+
+    Args:
+        encoder: The model's WhisperEncoder (model.get_encoder())
+        audio_ctx: Number of encoder positions to keep
+
+    Returns:
+        WhisperEncoder that expects audio_ctx * FRAMES_PER_POSITION mel frames
+    """
+    truncated = copy.copy(encoder)
+    truncated._modules = dict(encoder._modules)
+    truncated.config = copy.copy(encoder.config)
+    truncated.config.max_source_positions = audio_ctx
+    truncated.max_source_positions = audio_ctx
+    truncated.embed_positions = nn.Embedding.from_pretrained(
+        encoder.embed_positions.weight[:audio_ctx], freeze=True
+    )
+    return truncated
+
+
+def encode_truncated(encoder, input_features, audio_ctx):
+    """
+    Run the Whisper encoder on the first audio_ctx positions only.
+
+    The Hugging Face encoder insists on 3000 mel frames, so the truncated
+    mel is passed to a copy of the encoder that expects fewer frames (see
+    truncated_encoder()), like whisper.cpp's audio_ctx option. Attention
+    cost drops quadratically and the rest linearly with the context.
+
+    Args:
+        encoder: The model's WhisperEncoder (model.get_encoder())
+        input_features: Log-mel features of shape (batch, n_mels, frames)
+        audio_ctx: Number of encoder positions to keep
+
+    Returns:
+        BaseModelOutput that can be passed to generate() as encoder_outputs;
+        call it under torch.no_grad()
+    """
+    frames = audio_ctx * FRAMES_PER_POSITION
+    features = input_features[..., :frames]
+    if features.shape[-1] < frames:
+        features = F.pad(features, (0, frames - features.shape[-1]))
+
+    if audio_ctx != encoder.config.max_source_positions:
+        encoder = truncated_encoder(encoder, audio_ctx)
+    return encoder(features, return_dict=True)
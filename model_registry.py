@@ -0,0 +1,227 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import torch
+import transformers
+from transformers import AutoConfig, AutoModelForSpeechSeq2Seq, AutoProcessor, GenerationConfig
+
+# Pseudo dtype for dynamically int8-quantized CPU models
+QUANTIZED_DTYPE = "qint8"
+
+# Directory where quantized weights are cached so the conversion is paid once
+QUANTIZED_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "realtime-transcription", "quantized")
+
+
+class ModelRegistry:
+    def __init__(self, memory_limit=None):
+        """
+        Initialize the process-wide model registry.
+
+        Models are keyed by (model_id, dtype, device) plus any extra loading
+        options, loaded once and shared by every user. Models nobody is using
+        are evicted in least recently used order when the loaded models take
+        more memory than memory_limit.
+
+        Args:
+            memory_limit: Memory cap in bytes for loaded models, or None for no cap
+        """
+        self.memory_limit = memory_limit
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(model_id, torch_dtype, device, load_kwargs):
+        """Build the registry key of a model."""
+        return (model_id, str(torch_dtype), str(device), tuple(sorted(load_kwargs.items())))
+
+    def get(self, model_id, torch_dtype=torch.float32, device="cpu", warmup=True, **load_kwargs):
+        """
+        Get a shared model and processor, loading them on first use.
+
+        Every call must be paired with release() when the caller no longer
+        needs the model.
+
+        Args:
+            model_id: The Whisper model ID to load
+            torch_dtype: Data type of the model weights, or QUANTIZED_DTYPE for
+                a CPU model with dynamically int8-quantized Linear layers
+                (quantized models always stay on the CPU)
+            device: Device to move the model to
+            warmup: Run a short decode on silence after loading
+            **load_kwargs: Extra arguments for from_pretrained, e.g. attn_implementation
+
+        Returns:
+            Tuple of (model, processor)
+        """
+        key = self._key(model_id, torch_dtype, device, load_kwargs)
+
+        # Loading happens under the lock so concurrent users never load twice
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(model_id, torch_dtype, device, warmup, load_kwargs)
+                self._entries[key] = entry
+
+            entry["users"] += 1
+            entry["last_used"] = time.monotonic()
+            self._entries.move_to_end(key)
+            self._evict()
+
+            return entry["model"], entry["processor"]
+
+    def release(self, model_id, torch_dtype=torch.float32, device="cpu", **load_kwargs):
+        """Mark one user of a model as finished, allowing it to be evicted."""
+        key = self._key(model_id, torch_dtype, device, load_kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["users"] > 0:
+                entry["users"] -= 1
+                self._evict()
+
+    def loaded_models(self):
+        """Return (key, size in bytes, users) of every loaded model, least recently used first."""
+        with self._lock:
+            return [(key, entry["size"], entry["users"]) for key, entry in self._entries.items()]
+
+    def _load(self, model_id, torch_dtype, device, warmup, load_kwargs):
+        """Load a model and processor and optionally warm them up."""
+        print(f"Ladataan Whisper-mallia rekisteriin: {model_id} ({torch_dtype}, {device})")
+        start = time.perf_counter()
+
+        if torch_dtype == QUANTIZED_DTYPE:
+            model = self._load_quantized(model_id, load_kwargs)
+        else:
+            model = AutoModelForSpeechSeq2Seq.from_pretrained(
+                model_id,
+                torch_dtype=torch_dtype,
+                low_cpu_mem_usage=True,
+                **load_kwargs
+            )
+            model.to(device)
+        model.eval()
+        processor = AutoProcessor.from_pretrained(model_id)
+
+        print(f"Malli ladattu {time.perf_counter() - start:.1f} sekunnissa")
+
+        if warmup:
+            self._warmup(model, processor, torch_dtype, device)
+
+        return {
+            "model": model,
+            "processor": processor,
+            "size": self._model_size(model),
+            "users": 0,
+            "last_used": time.monotonic()
+        }
+
+    @staticmethod
+    def _model_size(model):
+        """Estimate the memory taken by the weights of a model, including quantized ones."""
+        size = 0
+        for value in model.state_dict().values():
+            # Quantized Linear layers store their weights as packed (weight, bias) tuples
+            tensors = value if isinstance(value, tuple) else (value,)
+            for tensor in tensors:
+                if isinstance(tensor, torch.Tensor):
+                    size += tensor.numel() * tensor.element_size()
+        return size
+
+    @staticmethod
+    def _quantize(model):
+        """Apply dynamic int8 quantization to the Linear layers of the encoder and decoder."""
+        # proj_out shares its weights with the token embeddings, so it stays in float32
+        torch.ao.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    @staticmethod
+    def _quantized_cache_file(model_id, load_kwargs):
+        """
+        Return the cache file of a quantized model.
+
+        The packed int8 weights depend on the torch and transformers versions
+        and on the loading options, so all of them are part of the name.
+        """
+        options = hashlib.sha1(repr(sorted(load_kwargs.items())).encode("utf-8")).hexdigest()[:12]
+        name = (f"{model_id.replace('/', '__')}-torch{torch.__version__}"
+                f"-transformers{transformers.__version__}-{options}.pt")
+        return os.path.join(QUANTIZED_CACHE_DIR, name.replace("+", "_"))
+
+    def _load_quantized(self, model_id, load_kwargs):
+        """Load a quantized CPU model, reusing cached quantized weights when available."""
+        cache_file = self._quantized_cache_file(model_id, load_kwargs)
+
+        if os.path.exists(cache_file):
+            try:
+                # Build the quantized structure without loading the float weights
+                print(f"Ladataan kvantisoidut painot välimuistista: {cache_file}")
+                config = AutoConfig.from_pretrained(model_id)
+                config_kwargs = {}
+                if "attn_implementation" in load_kwargs:
+                    config_kwargs["attn_implementation"] = load_kwargs["attn_implementation"]
+                model = AutoModelForSpeechSeq2Seq.from_config(config, torch_dtype=torch.float32, **config_kwargs)
+                model.generation_config = GenerationConfig.from_pretrained(model_id)
+                self._quantize(model)
+                model.load_state_dict(torch.load(cache_file, map_location="cpu", weights_only=True))
+                return model
+            except Exception as e:
+                print(f"Virhe kvantisoitujen painojen lataamisessa, kvantisoidaan uudelleen: {e}")
+
+        print("Kvantisoidaan malli int8-muotoon (tehdään vain kerran)")
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_id,
+            torch_dtype=torch.float32,
+            low_cpu_mem_usage=True,
+            **load_kwargs
+        )
+        self._quantize(model)
+
+        try:
+            os.makedirs(QUANTIZED_CACHE_DIR, exist_ok=True)
+            torch.save(model.state_dict(), cache_file)
+            print(f"Kvantisoidut painot tallennettu: {cache_file}")
+        except Exception as e:
+            print(f"Virhe kvantisoitujen painojen tallentamisessa: {e}")
+
+        return model
+
+    @staticmethod
+    def _warmup(model, processor, torch_dtype, device):
+        """Decode one second of silence so the first real chunk does not pay first-call costs."""
+        try:
+            start = time.perf_counter()
+            if torch_dtype == QUANTIZED_DTYPE:
+                torch_dtype = torch.float32
+            inputs = processor(np.zeros(16000, dtype=np.float32), sampling_rate=16000, return_tensors="pt")
+            input_features = inputs.input_features.to(device, dtype=torch_dtype)
+            with torch.no_grad():
+                model.generate(input_features, max_new_tokens=4)
+            print(f"Mallin lämmittely valmis {time.perf_counter() - start:.1f} sekunnissa")
+        except Exception as e:
+            print(f"Virhe mallin lämmittelyssä: {e}")
+
+    def _evict(self):
+        """Evict idle models in least recently used order until under the memory limit."""
+        if self.memory_limit is None:
+            return
+
+        total = sum(entry["size"] for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.memory_limit:
+                break
+            entry = self._entries[key]
+            if entry["users"] > 0:
+                continue
+
+            print(f"Poistetaan käyttämätön malli muistista: {key[0]}")
+            total -= entry["size"]
+            del self._entries[key]
+
+        if total > self.memory_limit and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# Registry shared by every Transcriber and the command line scripts
+registry = ModelRegistry()
@@ -0,0 +1,191 @@
+import numpy as np
+
+
+def group_pieces(lengths, sample_rate, max_duration=29.0, gap_duration=0.5):
+    """
+    Group consecutive pieces of audio into windows that fit one Whisper pass.
+
+    Args:
+        lengths: Length of each piece in samples, in order
+        sample_rate: Sample rate of the audio
+        max_duration: Longest window in seconds, kept under Whisper's 30 s
+        gap_duration: Silence inserted between pieces in seconds
+
+    Returns:
+        List of groups, each a list of piece indices
+    """
+    max_samples = int(max_duration * sample_rate)
+    gap_samples = int(gap_duration * sample_rate)
+
+    groups = []
+    current = []
+    current_samples = 0
+    for index, length in enumerate(lengths):
+        needed = length + (gap_samples if current else 0)
+        if current and current_samples + needed > max_samples:
+            groups.append(current)
+            current = []
+            current_samples = 0
+            needed = length
+
+        current.append(index)
+        current_samples += needed
+
+    if current:
+        groups.append(current)
+    return groups
+
+
+def build_window(pieces, sample_rate, gap_duration=0.5):
+    """
+    Concatenate pieces of audio with short silences between them.
+
+    Args:
+        pieces: List of mono audio arrays
+        sample_rate: Sample rate of the audio
+        gap_duration: Silence inserted between pieces in seconds
+
+    Returns:
+        Tuple of (window audio, list of (start, end) spans in seconds)
+    """
+    gap_samples = int(gap_duration * sample_rate)
+    total = sum(len(piece) for piece in pieces) + gap_samples * (len(pieces) - 1)
+    window = np.zeros(total, dtype=np.float32)
+
+    spans = []
+    position = 0
+    for piece in pieces:
+        window[position:position + len(piece)] = piece
+        spans.append((position / sample_rate, (position + len(piece)) / sample_rate))
+        position += len(piece) + gap_samples
+
+    return window, spans
+
+
+def split_offsets(offsets, spans):
+    """
+    Split timestamped text back to the pieces of a packed window.
+
+    A timestamped segment that overlaps one span goes to that span. A
+    segment that crosses from one span to the next has its words divided
+    between the spans in proportion to how long it overlaps each, in
+    order, since the decoder gives no timestamps for single words. A
+    segment that falls into a gap goes to the nearest span.
+
+    Args:
+        offsets: List of {"text": str, "timestamp": (start, end)} dictionaries
+            as returned by the Whisper tokenizer with output_offsets=True
+        spans: List of (start, end) spans in seconds
+
+    Returns:
+        List with the text of each span
+    """
+    texts = [[] for _ in spans]
+    if not spans:
+        return []
+
+    starts = np.array([start for start, _ in spans])
+    ends = np.array([end for _, end in spans])
+
+    for offset in offsets:
+        start, end = offset["timestamp"]
+        if end is None:
+            end = start
+
+        overlaps = np.maximum(np.minimum(ends, end) - np.maximum(starts, start), 0)
+        crossed = np.flatnonzero(overlaps > 0)
+        words = offset["text"].split()
+        if len(crossed) > 1 and len(words) > 1:
+            # Divide the words at the cumulative share of each span's overlap
+            bounds = np.rint(np.cumsum(overlaps[crossed]) / overlaps[crossed].sum() * len(words)).astype(int)
+            first = 0
+            for index, last in zip(crossed.tolist(), bounds.tolist()):
+                if last > first:
+                    texts[index].append(" " + " ".join(words[first:last]))
+                first = last
+            continue
+
+        if len(crossed) == 1:
+            texts[int(crossed[0])].append(offset["text"])
+            continue
+
+        # Distance from the midpoint to each span, zero inside the span
+        middle = (start + end) / 2
+        distance = np.maximum(starts - middle, 0) + np.maximum(middle - ends, 0)
+        texts[int(np.argmin(distance))].append(offset["text"])
+
+    return ["".join(parts).strip() for parts in texts]
+
+
+def sorted_batches(lengths, max_batch_size=16, max_batch_samples=None, min_padded_length=None):
+    """
+    Group pieces of similar length into padded batches.
+
+    Pieces are sorted by length, longest first, so each batch pads to a
+    length close to all of its members and the most expensive batch runs
+    first. A batch costs its size times its padded length in samples,
+    which is kept under max_batch_samples. The padded length is the
+    longest piece, or min_padded_length if the model pads every input to
+    at least that (Whisper pads to 30 s unless the encoder context is
+    reduced).
+
+    Args:
+        lengths: Length of each piece in samples
+        max_batch_size: Largest number of pieces in one batch
+        max_batch_samples: Budget of padded samples per batch, or None
+        min_padded_length: Length in samples every input is padded to, or
+            None if batches are only padded to their longest piece
+
+    Returns:
+        List of batches, each a list of piece indices
+    """
+    order = sorted(range(len(lengths)), key=lambda index: lengths[index], reverse=True)
+
+    batches = []
+    current = []
+    for index in order:
+        # The first piece of a batch is its longest, so it sets the padded length
+        padded = lengths[current[0]] if current else lengths[index]
+        if min_padded_length is not None:
+            padded = max(padded, min_padded_length)
+        over_budget = max_batch_samples is not None and (len(current) + 1) * padded > max_batch_samples
+        if current and (len(current) >= max_batch_size or over_budget):
+            batches.append(current)
+            current = []
+
+        current.append(index)
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def merge_turns(turns, max_duration=29.0, max_gap=2.0):
+    """
+    Merge consecutive turns of the same speaker into longer windows.
+
+    Args:
+        turns: List of (start, end, speaker) tuples in timeline order, in seconds
+        max_duration: Longest window in seconds, kept under Whisper's 30 s
+        max_gap: Longest pause in seconds between turns of one window
+
+    Returns:
+        List of windows, each a list of turn indices
+    """
+    windows = []
+    current = []
+    current_end = 0.0
+    for index, (start, end, speaker) in enumerate(turns):
+        if current:
+            # Turns may overlap or nest, so the gap is measured from the latest end so far
+            first_start, _, first_speaker = turns[current[0]]
+            if speaker != first_speaker or start - current_end > max_gap or end - first_start > max_duration:
+                windows.append(current)
+                current = []
+
+        current_end = max(current_end, end) if current else end
+        current.append(index)
+
+    if current:
+        windows.append(current)
+    return windows
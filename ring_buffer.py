@@ -0,0 +1,104 @@
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        """
+        Initialize a fixed-size ring buffer for audio samples.
+
+        The buffer is written by a single producer (the audio callback) and
+        read by consumers using absolute sample indices, so no memory is
+        allocated while recording and memory use stays constant.
+
+        Args:
+            capacity: Number of samples (frames) the buffer can hold
+            channels: Number of audio channels per frame
+            dtype: Data type of the samples
+        """
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.buffer = np.zeros((self.capacity, channels), dtype=dtype)
+        # Total number of frames ever written; only the producer updates it
+        self.write_position = 0
+
+    def reset(self):
+        """Forget all written samples without reallocating the buffer."""
+        self.write_position = 0
+
+    @property
+    def oldest_position(self):
+        """Absolute index of the oldest sample that is still available."""
+        return max(0, self.write_position - self.capacity)
+
+    def write(self, block):
+        """
+        Copy a block of frames into the buffer.
+
+        Args:
+            block: Array of shape (frames, channels)
+        """
+        frames = len(block)
+        position = self.write_position
+
+        # Only the newest samples fit if the block is larger than the buffer
+        if frames > self.capacity:
+            position += frames - self.capacity
+            block = block[-self.capacity:]
+            frames = self.capacity
+
+        start = position % self.capacity
+        first = min(frames, self.capacity - start)
+        self.buffer[start:start + first] = block[:first]
+        if first < frames:
+            self.buffer[:frames - first] = block[first:]
+
+        # Publish the new data only after it has been copied in place
+        self.write_position = position + frames
+
+    def views(self, start, stop):
+        """
+        Get views of the samples in the range [start, stop).
+
+        Args:
+            start: Absolute index of the first sample
+            stop: Absolute index one past the last sample
+
+        Returns:
+            Tuple of two views; the second one is empty unless the range wraps
+            around the end of the buffer
+        """
+        if start > stop or stop > self.write_position:
+            raise ValueError(f"Näytteitä {start}-{stop} ei ole vielä kirjoitettu")
+        if start < self.oldest_position:
+            raise ValueError(f"Näytteet {start}-{stop} on jo ylikirjoitettu")
+
+        offset = start % self.capacity
+        frames = stop - start
+        first = min(frames, self.capacity - offset)
+        return (self.buffer[offset:offset + first],
+                self.buffer[:frames - first])
+
+    def read(self, start, stop, out=None):
+        """
+        Copy the samples in the range [start, stop) into a contiguous array.
+
+        Args:
+            start: Absolute index of the first sample
+            stop: Absolute index one past the last sample
+            out: Optional preallocated array of shape (stop - start, channels)
+
+        Returns:
+            The array holding the samples
+        """
+        first, second = self.views(start, stop)
+        if out is None:
+            out = np.empty((stop - start, self.channels), dtype=self.buffer.dtype)
+
+        out[:len(first)] = first
+        out[len(first):] = second
+
+        # The producer may have lapped the reader while copying
+        if start < self.oldest_position:
+            raise ValueError(f"Näytteet {start}-{stop} ylikirjoitettiin lukemisen aikana")
+
+        return out
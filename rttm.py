@@ -0,0 +1,153 @@
+import numpy as np
+
+# One speaker turn: start and duration in seconds and the index of the speaker name
+TURN_DTYPE = np.dtype([("start", np.float64), ("duration", np.float64), ("speaker", np.int32)])
+
+
+class SpeakerTurns:
+    def __init__(self, file_id, turns, speakers):
+        """
+        Initialize the speaker turns of one recording.
+
+        Turns are kept sorted by start time. The interval index is the sorted
+        start times plus the running maximum of the end times: no turn before
+        the first one whose running maximum passes a can overlap [a, b], and
+        none after the last one starting by b, so two binary searches bound
+        the candidates before the exact overlap check. One long turn only
+        widens the range while it lasts instead of for the whole recording.
+
+        Args:
+            file_id: Recording identifier from the RTTM file
+            turns: Structured array of TURN_DTYPE
+            speakers: Speaker names indexed by the speaker field
+        """
+        self.file_id = file_id
+        self.turns = np.sort(turns, order="start", kind="stable")
+        self.speakers = list(speakers)
+        self.starts = self.turns["start"]
+        self.ends = self.turns["start"] + self.turns["duration"]
+        self.max_ends = np.maximum.accumulate(self.ends)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def itertracks(self):
+        """Yield (start, end, speaker) tuples in timeline order."""
+        for start, end, speaker in zip(self.starts.tolist(), self.ends.tolist(), self.turns["speaker"].tolist()):
+            yield start, end, self.speakers[speaker]
+
+    def to_list(self):
+        """Return the turns as a list of (start, end, speaker) tuples."""
+        return list(self.itertracks())
+
+    def overlapping(self, start, end):
+        """
+        Find the turns that overlap a time range.
+
+        Args:
+            start: Range start in seconds
+            end: Range end in seconds
+
+        Returns:
+            Array of turn indices in timeline order
+        """
+        first = np.searchsorted(self.max_ends, start, side="right")
+        last = np.searchsorted(self.starts, end, side="right")
+        candidates = np.arange(first, last)
+        return candidates[self.ends[first:last] > start]
+
+    def speakers_at(self, time):
+        """Return the names of the speakers talking at a time in seconds."""
+        indices = self.overlapping(time, time)
+        return sorted({self.speakers[speaker] for speaker in self.turns["speaker"][indices]})
+
+    def speakers_in(self, start, end):
+        """Return the names of the speakers talking within [start, end]."""
+        indices = self.overlapping(start, end)
+        return sorted({self.speakers[speaker] for speaker in self.turns["speaker"][indices]})
+
+
+def from_segments(segments, file_id="audio"):
+    """
+    Build SpeakerTurns from (start, end, speaker) tuples.
+
+    Args:
+        segments: List of (start, end, speaker) tuples in seconds
+        file_id: Recording identifier
+
+    Returns:
+        SpeakerTurns
+    """
+    speakers = {}
+    turns = np.empty(len(segments), dtype=TURN_DTYPE)
+    for i, (start, end, speaker) in enumerate(segments):
+        turns[i] = (start, end - start, speakers.setdefault(speaker, len(speakers)))
+    return SpeakerTurns(file_id, turns, speakers)
+
+
+def load_rttm(path):
+    """
+    Read an RTTM file.
+
+    Only SPEAKER lines are used. Speaker indices are assigned per recording
+    in order of first appearance.
+
+    Args:
+        path: Path to the RTTM file
+
+    Returns:
+        Dictionary from file id to SpeakerTurns, in file order
+    """
+    starts = {}
+    durations = {}
+    labels = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 8 or fields[0] != "SPEAKER":
+                continue
+
+            file_id = fields[1]
+            if file_id not in starts:
+                starts[file_id], durations[file_id], labels[file_id] = [], [], []
+            starts[file_id].append(fields[3])
+            durations[file_id].append(fields[4])
+            labels[file_id].append(fields[7])
+
+    recordings = {}
+    for file_id in starts:
+        names, speaker_indices = np.unique(labels[file_id], return_inverse=True)
+
+        # np.unique sorts the names; renumber them by first appearance instead
+        first_seen = np.unique(speaker_indices, return_index=True)[1]
+        order = np.argsort(first_seen)
+        renumber = np.empty_like(order)
+        renumber[order] = np.arange(len(order))
+
+        turns = np.empty(len(starts[file_id]), dtype=TURN_DTYPE)
+        turns["start"] = np.array(starts[file_id], dtype=np.float64)
+        turns["duration"] = np.array(durations[file_id], dtype=np.float64)
+        turns["speaker"] = renumber[speaker_indices]
+        recordings[file_id] = SpeakerTurns(file_id, turns, names[order].tolist())
+
+    return recordings
+
+
+def save_rttm(recordings, path):
+    """
+    Write speaker turns to an RTTM file.
+
+    Args:
+        recordings: SpeakerTurns, or a list or dictionary of them
+        path: Path of the RTTM file
+    """
+    if isinstance(recordings, SpeakerTurns):
+        recordings = [recordings]
+    elif isinstance(recordings, dict):
+        recordings = list(recordings.values())
+
+    with open(path, "w", encoding="utf-8") as f:
+        for recording in recordings:
+            for start, duration, speaker in recording.turns.tolist():
+                f.write(f"SPEAKER {recording.file_id} 1 {start:.3f} {duration:.3f} "
+                        f"<NA> <NA> {recording.speakers[speaker]} <NA> <NA>\n")
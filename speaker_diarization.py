@@ -1,5 +1,7 @@
 import numpy as np
-import soundfile as sf
+import rttm
+from audio_io import open_audio
+from speaker_embedding import LogMelEmbedder, OnlineSpeakerClustering
 
 class SpeakerDiarization:
     def __init__(self):
@@ -7,11 +9,16 @@ class SpeakerDiarization:
         Initialize the simple speaker diarization module.
 
         This is a simplified version that doesn't require external models.
-        It uses basic audio processing to segment audio by silence.
+        It uses basic audio processing to segment audio by silence and
+        groups the segments into speakers by clustering MFCC statistics.
         """
         self.min_silence_duration = 0.5  # Minimum silence duration in seconds
         self.energy_threshold = 0.05     # Energy threshold for silence detection
         self.min_segment_duration = 1.0  # Minimum segment duration in seconds
+        self.frame_hop = 0.01            # Frame hop for silence detection in seconds
+        self.similarity_threshold = 0.9  # Cosine similarity needed to join a speaker
+        self.max_speakers = 8            # Maximum number of speakers
+        self.embedder = LogMelEmbedder()
 
         print("Yksinkertainen puhujan tunnistus alustettu.")
 
@@ -26,65 +33,73 @@ class SpeakerDiarization:
         Returns:
             List of (start, end) tuples
         """
-        # Convert to mono if stereo
-        if len(audio_data.shape) > 1 and audio_data.shape[1] > 1:
-            audio_data = np.mean(audio_data, axis=1)
-
-        # Normalize audio
-        audio_data = audio_data / np.max(np.abs(audio_data))
+        audio_data = self._to_mono(audio_data)
 
-        # Calculate energy
-        energy = np.abs(audio_data)
+        num_samples = len(audio_data)
+        if num_samples == 0:
+            return []
 
-        # Find silence regions
-        is_silence = energy < self.energy_threshold
+        # Frame RMS relative to the loudest frame; with a hop of one sample
+        # this is exactly the per-sample normalized amplitude
+        hop = max(1, int(self.frame_hop * sample_rate))
+        frame_energy = self._frame_energy(audio_data, hop)
+        max_energy = frame_energy.max()
+        if max_energy == 0:
+            return []
+        is_silence = frame_energy < self.energy_threshold ** 2 * max_energy
 
         # Convert to samples
         min_silence_samples = int(self.min_silence_duration * sample_rate)
         min_segment_samples = int(self.min_segment_duration * sample_rate)
 
-        # Find silence regions that are long enough
-        silence_starts = []
-        silence_ends = []
-        in_silence = False
-        silence_start = 0
-
-        for i, silent in enumerate(is_silence):
-            if silent and not in_silence:
-                # Start of silence
-                silence_start = i
-                in_silence = True
-            elif not silent and in_silence:
-                # End of silence
-                if i - silence_start >= min_silence_samples:
-                    silence_starts.append(silence_start)
-                    silence_ends.append(i)
-                in_silence = False
-
-        # Add the last silence if needed
-        if in_silence and len(audio_data) - silence_start >= min_silence_samples:
-            silence_starts.append(silence_start)
-            silence_ends.append(len(audio_data))
-
-        # Create segments from silence boundaries
-        segments = []
+        # Run-length encode the silent frames
+        padded = np.concatenate(([False], is_silence, [False]))
+        changes = np.flatnonzero(padded[1:] != padded[:-1])
+        silence_starts = changes[0::2] * hop
+        silence_ends = np.minimum(changes[1::2] * hop, num_samples)
+
+        # Keep silence regions that are long enough
+        long_enough = silence_ends - silence_starts >= min_silence_samples
+        silence_starts = silence_starts[long_enough]
+        silence_ends = silence_ends[long_enough]
 
-        # Add the first segment if needed
-        if not silence_starts or silence_starts[0] > 0:
-            start = 0
-            end = silence_starts[0] if silence_starts else len(audio_data)
-            if end - start >= min_segment_samples:
-                segments.append((start / sample_rate, end / sample_rate))
+        # Segments lie between the silences, including before the first and after the last
+        segment_starts = np.concatenate(([0], silence_ends))
+        segment_ends = np.concatenate((silence_starts, [num_samples]))
+        keep = segment_ends - segment_starts >= min_segment_samples
 
-        # Add segments between silences
-        for i in range(len(silence_ends)):
-            start = silence_ends[i]
-            end = silence_starts[i+1] if i+1 < len(silence_starts) else len(audio_data)
-            if end - start >= min_segment_samples:
-                segments.append((start / sample_rate, end / sample_rate))
+        segments = [(start / sample_rate, end / sample_rate)
+                    for start, end in zip(segment_starts[keep].tolist(), segment_ends[keep].tolist())]
 
         return segments
 
+    @staticmethod
+    def _to_mono(audio_data):
+        """Convert audio data to a one-dimensional mono array."""
+        if len(audio_data.shape) > 1 and audio_data.shape[1] > 1:
+            audio_data = np.mean(audio_data, axis=1)
+        return np.ravel(audio_data)
+
+    @staticmethod
+    def _frame_energy(audio_data, hop):
+        """
+        Compute the mean energy of consecutive frames.
+
+        Args:
+            audio_data: Mono audio data as numpy array
+            hop: Frame length in samples
+
+        Returns:
+            Array with one mean squared amplitude per frame; the last frame may be shorter
+        """
+        full_frames = len(audio_data) // hop
+        frames = audio_data[:full_frames * hop].reshape(full_frames, hop)
+        energy = np.einsum('ij,ij->i', frames, frames) / hop
+        if full_frames * hop < len(audio_data):
+            tail = audio_data[full_frames * hop:]
+            energy = np.append(energy, np.dot(tail, tail) / len(tail))
+        return energy
+
     def process_audio(self, audio_data, sample_rate):
         """
         Process audio data for speaker diarization.
@@ -97,22 +112,36 @@ class SpeakerDiarization:
             List of (start, end, speaker) tuples
         """
         try:
+            audio_data = self._to_mono(audio_data)
+
             # Detect segments based on silence
             segments = self._detect_segments(audio_data, sample_rate)
 
-            # Assign speaker labels
-            speaker_turns = []
-            for i, (start, end) in enumerate(segments):
-                # Alternate between SPEAKER_00 and SPEAKER_01
-                speaker = f"SPEAKER_{i % 2:02d}"
-                speaker_turns.append((start, end, speaker))
+            # Embed all segments in one batch and cluster them into speakers
+            embeddings = self.embedder.embed_segments(audio_data, sample_rate, segments)
+            clustering = OnlineSpeakerClustering(self.similarity_threshold, self.max_speakers)
+            speakers = clustering.assign_batch(embeddings)
 
-            return speaker_turns
+            return [(start, end, f"SPEAKER_{speaker:02d}")
+                    for (start, end), speaker in zip(segments, speakers)]
 
         except Exception as e:
             print(f"Virhe puhujan tunnistuksessa: {e}")
             return []
 
+    def create_session(self, **kwargs):
+        """
+        Create a streaming diarization session that keeps speaker identities
+        across consecutive chunks of the same recording.
+
+        Args:
+            **kwargs: Options passed to DiarizationSession
+
+        Returns:
+            A new DiarizationSession
+        """
+        return DiarizationSession(self, **kwargs)
+
     def process_audio_file(self, audio_file):
         """
         Process an audio file for speaker diarization.
@@ -124,8 +153,10 @@ class SpeakerDiarization:
             List of (start, end, speaker) tuples
         """
         try:
-            # Load the audio file
-            audio_data, sample_rate = sf.read(audio_file)
+            # Load the audio file as the same 16 kHz mono stream the transcriber uses
+            with open_audio(audio_file, sample_rate=16000) as audio:
+                audio_data = audio.read(0, len(audio))
+                sample_rate = audio.sample_rate
 
             # Process the audio data
             return self.process_audio(audio_data, sample_rate)
@@ -134,6 +165,35 @@ class SpeakerDiarization:
             print(f"Virhe puhujan tunnistuksessa: {e}")
             return []
 
+    @staticmethod
+    def load_rttm(rttm_file, file_id=None):
+        """
+        Load precomputed speaker turns from an RTTM file.
+
+        Args:
+            rttm_file: Path to the RTTM file
+            file_id: Recording to load; the first one in the file if None
+
+        Returns:
+            SpeakerTurns with the turns in timeline order
+        """
+        recordings = rttm.load_rttm(rttm_file)
+        if file_id is None:
+            return next(iter(recordings.values()))
+        return recordings[file_id]
+
+    @staticmethod
+    def save_rttm(speaker_turns, rttm_file, file_id="audio"):
+        """
+        Save speaker turns to an RTTM file.
+
+        Args:
+            speaker_turns: List of (start, end, speaker) tuples, e.g. from process_audio()
+            rttm_file: Path of the RTTM file
+            file_id: Recording identifier written on each line
+        """
+        rttm.save_rttm(rttm.from_segments(speaker_turns, file_id), rttm_file)
+
     def get_speaker_segments(self, audio_data, sample_rate, min_segment_duration=1.0):
         """
         Get audio segments by speaker.
@@ -164,3 +224,130 @@ class SpeakerDiarization:
             segments.append((segment, start, end, speaker))
 
         return segments
+
+
+class DiarizationSession:
+    def __init__(self, diarization, similarity_threshold=None, max_speakers=None, max_carry_duration=3.0):
+        """
+        Initialize a streaming diarization session.
+
+        The session keeps a running centroid per speaker, the last active
+        speaker and the audio of the segment that was still open at the end
+        of the previous chunk, so labels stay consistent for the whole
+        recording while each chunk costs only O(chunk) to process. The
+        carried audio is only joined to a chunk that starts where the
+        previous one ended; after a gap the speakers are kept but the open
+        segment is closed. A chunk that overlaps the end of the previous one
+        (VAD chunks may start a little early) continues the recording with
+        the already seen samples skipped; only a chunk that lies entirely
+        before the previous end begins a new recording.
+
+        Args:
+            diarization: SpeakerDiarization used for segmentation and embeddings
+            similarity_threshold: Cosine similarity needed to join an existing speaker,
+                defaulting to the value of the SpeakerDiarization
+            max_speakers: Maximum number of distinct speakers, defaulting to the
+                value of the SpeakerDiarization
+            max_carry_duration: Longest unfinished segment carried to the next chunk, in seconds
+        """
+        self.diarization = diarization
+        self.clustering = OnlineSpeakerClustering(
+            similarity_threshold if similarity_threshold is not None else diarization.similarity_threshold,
+            max_speakers if max_speakers is not None else diarization.max_speakers
+        )
+        self.max_carry_duration = max_carry_duration
+        self.reset()
+
+    def reset(self):
+        """Start a new recording, forgetting all speakers."""
+        self.offset = 0.0          # End time of the previous chunk in the recording, in seconds
+        self.clustering.reset()
+        self.last_speaker = None
+        self._drop_carry()
+        self.sample_rate = None
+
+    def process_chunk(self, audio_data, sample_rate, start_time=None):
+        """
+        Diarize the next chunk of the recording.
+
+        Args:
+            audio_data: Audio data of the chunk as numpy array
+            sample_rate: Sample rate of the audio
+            start_time: Start of the chunk in the recording in seconds, or None
+                if it follows the previous chunk directly
+
+        Returns:
+            List of (start, end, speaker) tuples relative to the start of the chunk
+        """
+        try:
+            audio_data = self.diarization._to_mono(audio_data).astype(np.float32, copy=False)
+
+            if start_time is None:
+                start_time = self.offset
+            gap = round((start_time - self.offset) * sample_rate)
+            overlap = 0
+            if gap < 0 and sample_rate == self.sample_rate and -gap < len(audio_data):
+                # The chunk repeats the end of the previous one; skip the samples already seen
+                overlap = -gap
+                audio_data = audio_data[overlap:]
+            elif gap < 0:
+                # The whole chunk lies before the previous end: a new recording or file
+                self.reset()
+            elif gap > 0 or sample_rate != self.sample_rate:
+                # Audio between the chunks is missing, so the open segment cannot continue
+                self._drop_carry()
+            self.sample_rate = sample_rate
+
+            # Prepend the carried audio so an unfinished segment is seen whole
+            audio = np.concatenate((self.carry, audio_data))
+            carry_duration = len(self.carry) / sample_rate
+            total_duration = len(audio) / sample_rate
+            # Start of the chunk as passed in, in the time of the concatenated audio
+            chunk_start = carry_duration - overlap / sample_rate
+
+            segments = self.diarization._detect_segments(audio, sample_rate)
+
+            # Segments that ended in the carried audio belong to the previous chunk
+            new_segments = [(start, end) for start, end in segments if end > carry_duration]
+            embeddings = self.diarization.embedder.embed_segments(audio, sample_rate, new_segments)
+
+            speaker_turns = []
+            for (start, end), embedding in zip(new_segments, embeddings):
+                if start < carry_duration and self.carry_open and self.last_speaker is not None:
+                    # The segment continues the one that was open at the previous chunk boundary
+                    speaker = self.last_speaker
+                    self.clustering.update(speaker, embedding)
+                else:
+                    speaker = self.clustering.assign(embedding)
+
+                self.last_speaker = speaker
+                speaker_turns.append((max(start - chunk_start, 0.0), end - chunk_start,
+                                      f"SPEAKER_{speaker:02d}"))
+
+            self._update_carry(audio, segments, total_duration, sample_rate)
+            self.offset = start_time + (overlap + len(audio_data)) / sample_rate
+
+            return speaker_turns
+
+        except Exception as e:
+            print(f"Virhe puhujan tunnistuksessa: {e}")
+            return []
+
+    def _drop_carry(self):
+        """Forget the carried audio but keep the speakers."""
+        self.carry = np.zeros(0, dtype=np.float32)
+        self.carry_open = False    # Whether the carried audio ends inside a segment
+
+    def _update_carry(self, audio, segments, total_duration, sample_rate):
+        """Keep the audio needed to continue the last segment in the next chunk."""
+        max_carry = int(self.max_carry_duration * sample_rate)
+
+        self.carry_open = bool(segments) and total_duration - segments[-1][1] < 1.0 / sample_rate
+        if self.carry_open:
+            carry_start = int(segments[-1][0] * sample_rate)
+        else:
+            # Keep a short tail so speech that starts right at the boundary is not lost
+            carry_start = len(audio) - int(self.diarization.min_segment_duration * sample_rate)
+
+        carry_start = max(carry_start, len(audio) - max_carry, 0)
+        self.carry = audio[carry_start:].copy()
@@ -0,0 +1,194 @@
+import numpy as np
+
+
+def hz_to_mel(frequency):
+    """Convert a frequency in Hz to the mel scale."""
+    return 2595.0 * np.log10(1.0 + np.asarray(frequency) / 700.0)
+
+
+def mel_to_hz(mel):
+    """Convert a mel scale value to a frequency in Hz."""
+    return 700.0 * (10.0 ** (np.asarray(mel) / 2595.0) - 1.0)
+
+
+def mel_filterbank(sample_rate, n_fft, n_mels):
+    """
+    Build a triangular mel filterbank.
+
+    Args:
+        sample_rate: Sample rate of the audio
+        n_fft: FFT size
+        n_mels: Number of mel bands
+
+    Returns:
+        Array of shape (n_fft // 2 + 1, n_mels)
+    """
+    mels = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    edges = mel_to_hz(mels)
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)[:, None]
+
+    lower, center, upper = edges[:-2], edges[1:-1], edges[2:]
+    rising = (bins - lower) / (center - lower)
+    falling = (upper - bins) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+class LogMelEmbedder:
+    def __init__(self, n_mels=40, n_mfcc=20, frame_duration=0.025, hop_duration=0.01, block_frames=4096):
+        """
+        Initialize the MFCC statistics embedder.
+
+        Features are computed once for the whole chunk in batched FFTs and
+        each segment is summarized by the mean and standard deviation of its
+        MFCCs, read from cumulative sums in O(1) per segment.
+
+        Args:
+            n_mels: Number of mel bands
+            n_mfcc: Number of cepstral coefficients, including the dropped c0
+            frame_duration: Analysis frame length in seconds
+            hop_duration: Hop between frames in seconds
+            block_frames: Frames per FFT batch, bounding memory for long audio
+        """
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.frame_duration = frame_duration
+        self.hop_duration = hop_duration
+        self.block_frames = block_frames
+        self._setups = {}
+
+        # Orthonormal DCT-II matrix from log-mel energies to cepstra
+        k = np.arange(n_mfcc)[:, None]
+        n = np.arange(n_mels)[None, :]
+        dct = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+        dct[0] /= np.sqrt(2.0)
+        self.dct = dct.T.astype(np.float32)
+
+    def _setup(self, sample_rate):
+        """Return frame length, hop, FFT size, window and filterbank for a sample rate."""
+        if sample_rate not in self._setups:
+            frame_length = int(self.frame_duration * sample_rate)
+            hop = int(self.hop_duration * sample_rate)
+            n_fft = 1 << (frame_length - 1).bit_length()
+            window = np.hanning(frame_length).astype(np.float32)
+            filterbank = mel_filterbank(sample_rate, n_fft, self.n_mels)
+            self._setups[sample_rate] = (frame_length, hop, n_fft, window, filterbank)
+        return self._setups[sample_rate]
+
+    def mfcc(self, audio_data, sample_rate):
+        """
+        Compute MFCCs (without c0) for consecutive frames.
+
+        Args:
+            audio_data: Mono audio data as numpy array
+            sample_rate: Sample rate of the audio
+
+        Returns:
+            Array of shape (frames, n_mfcc - 1)
+        """
+        frame_length, hop, n_fft, window, filterbank = self._setup(sample_rate)
+        audio_data = np.asarray(audio_data, dtype=np.float32)
+        if len(audio_data) < frame_length:
+            audio_data = np.pad(audio_data, (0, frame_length - len(audio_data)))
+
+        frames = np.lib.stride_tricks.sliding_window_view(audio_data, frame_length)[::hop]
+        features = np.empty((len(frames), self.n_mfcc - 1), dtype=np.float32)
+
+        for start in range(0, len(frames), self.block_frames):
+            block = frames[start:start + self.block_frames] * window
+            power = np.abs(np.fft.rfft(block, n=n_fft, axis=1)) ** 2
+            log_mel = np.log(power @ filterbank + 1e-10)
+            features[start:start + len(block)] = (log_mel @ self.dct)[:, 1:]
+
+        return features
+
+    def embed_segments(self, audio_data, sample_rate, segments):
+        """
+        Embed several segments of the same audio in one batch.
+
+        Args:
+            audio_data: Mono audio data as numpy array
+            sample_rate: Sample rate of the audio
+            segments: List of (start, end) tuples in seconds
+
+        Returns:
+            Array of shape (len(segments), 2 * (n_mfcc - 1)) with unit-length rows
+        """
+        dimension = 2 * (self.n_mfcc - 1)
+        if not segments:
+            return np.zeros((0, dimension), dtype=np.float32)
+
+        _, hop, _, _, _ = self._setup(sample_rate)
+        features = self.mfcc(audio_data, sample_rate).astype(np.float64)
+
+        # Cumulative sums give every segment's mean and variance in O(1)
+        sums = np.vstack((np.zeros((1, features.shape[1])), np.cumsum(features, axis=0)))
+        squares = np.vstack((np.zeros((1, features.shape[1])), np.cumsum(features ** 2, axis=0)))
+
+        bounds = np.array(segments, dtype=np.float64)
+        first = np.clip((bounds[:, 0] * sample_rate / hop).astype(int), 0, len(features) - 1)
+        last = np.clip((bounds[:, 1] * sample_rate / hop).astype(int), first + 1, len(features))
+        counts = (last - first)[:, None]
+
+        mean = (sums[last] - sums[first]) / counts
+        variance = np.maximum((squares[last] - squares[first]) / counts - mean ** 2, 0.0)
+        embeddings = np.hstack((mean, np.sqrt(variance)))
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.maximum(norms, 1e-10)).astype(np.float32)
+
+
+class OnlineSpeakerClustering:
+    def __init__(self, threshold=0.9, max_speakers=8):
+        """
+        Initialize online cosine-threshold clustering of speaker embeddings.
+
+        Args:
+            threshold: Cosine similarity needed to join an existing speaker
+            max_speakers: Maximum number of speakers; further segments join
+                the closest existing speaker
+        """
+        self.threshold = threshold
+        self.max_speakers = max_speakers
+        self.reset()
+
+    def reset(self):
+        """Forget all speakers."""
+        self.centroids = None  # Running mean embedding per speaker, one row each
+        self.counts = []
+
+    @property
+    def num_speakers(self):
+        """Number of speakers found so far."""
+        return len(self.counts)
+
+    def assign(self, embedding):
+        """
+        Assign an embedding to a speaker.
+
+        Args:
+            embedding: Unit-length embedding vector
+
+        Returns:
+            Index of the speaker
+        """
+        if self.centroids is not None:
+            norms = np.linalg.norm(self.centroids, axis=1) + 1e-10
+            similarities = self.centroids @ embedding / norms
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold or self.num_speakers >= self.max_speakers:
+                self.update(best, embedding)
+                return best
+
+        row = embedding[None, :].astype(np.float64)
+        self.centroids = row if self.centroids is None else np.vstack((self.centroids, row))
+        self.counts.append(1)
+        return self.num_speakers - 1
+
+    def assign_batch(self, embeddings):
+        """Assign each row of embeddings to a speaker, in order."""
+        return [self.assign(embedding) for embedding in embeddings]
+
+    def update(self, speaker, embedding):
+        """Fold an embedding into the running mean of a speaker."""
+        self.counts[speaker] += 1
+        self.centroids[speaker] += (embedding - self.centroids[speaker]) / self.counts[speaker]
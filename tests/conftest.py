@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+# The modules live in the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def tiny_whisper():
+    """Factory of tiny randomly initialized Whisper models: tiny_whisper(seed=0, **config)."""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    def make(seed=0, **config):
+        torch.manual_seed(seed)
+        options = dict(
+            vocab_size=64, d_model=16, encoder_layers=1, decoder_layers=1, encoder_attention_heads=2,
+            decoder_attention_heads=2, encoder_ffn_dim=32, decoder_ffn_dim=32, num_mel_bins=80,
+            max_target_positions=32, decoder_start_token_id=1, eos_token_id=2, pad_token_id=0, bos_token_id=1
+        )
+        options.update(config)
+        model = transformers.WhisperForConditionalGeneration(transformers.WhisperConfig(**options)).eval()
+        model.generation_config = transformers.GenerationConfig(decoder_start_token_id=1, eos_token_id=2,
+                                                                pad_token_id=0)
+        return model
+
+    return make
@@ -0,0 +1,53 @@
+import queue
+import numpy as np
+import pytest
+
+try:
+    import app
+except (ImportError, OSError) as e:
+    # sounddevice raises OSError when the PortAudio library is missing
+    pytest.skip(f"app.py ei ole tuotavissa: {e}", allow_module_level=True)
+
+
+class FakeRoot:
+    def after(self, delay, func, *args):
+        pass
+
+
+class FakeTranscriber:
+    def get_queue_size(self):
+        return 0
+
+
+def make_app():
+    application = app.TranscriptionApp.__new__(app.TranscriptionApp)
+    application.ui_update_queue = queue.Queue()
+    application.root = FakeRoot()
+    application.transcriber = FakeTranscriber()
+    return application
+
+
+def updates(application):
+    items = []
+    while not application.ui_update_queue.empty():
+        items.append(application.ui_update_queue.get_nowait())
+    return items
+
+
+def test_array_source_is_shown_as_transcription():
+    application = make_app()
+    application.on_transcription("hei maailma", np.zeros(16000, dtype=np.float32))
+    assert ("transcription", "hei maailma") in updates(application)
+
+
+def test_file_source_named_like_an_event_is_not_streaming():
+    application = make_app()
+    application.on_transcription("hei", "partial")
+    assert ("transcription", "hei") in updates(application)
+
+
+def test_streaming_events_use_kind():
+    application = make_app()
+    application.on_transcription("keskener", None, kind="partial")
+    application.on_transcription("valmis", None, kind="final")
+    assert updates(application) == [("partial", "keskener"), ("stream", "valmis")]
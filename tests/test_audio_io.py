@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from scipy.signal import resample_poly
+import audio_io
+from audio_io import AudioReader, PreparedAudio, StreamingResampler, open_audio
+
+
+@pytest.mark.parametrize("input_rate, output_rate", [(44100, 16000), (48000, 16000), (8000, 16000), (16000, 16000)])
+def test_streaming_resampler_matches_resample_poly(input_rate, output_rate):
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal(input_rate // 2 + 123).astype(np.float32)
+
+    resampler = StreamingResampler(input_rate, output_rate)
+    cuts = np.sort(rng.integers(0, len(signal), 6))
+    blocks = np.split(signal, cuts)
+    output = np.concatenate([resampler.process(block) for block in blocks] + [resampler.flush()])
+
+    divisor = np.gcd(input_rate, output_rate)
+    expected = resample_poly(signal.astype(np.float64), output_rate // divisor, input_rate // divisor)
+    assert len(output) == len(expected) == resampler.output_length_for(len(signal))
+    np.testing.assert_allclose(output, expected, atol=1e-5)
+
+
+def test_streaming_resampler_splits_large_blocks_into_passes(monkeypatch):
+    signal = np.random.default_rng(1).standard_normal(44100).astype(np.float32)
+    expected = StreamingResampler(44100, 16000).process(signal)
+
+    # A block far longer than one pass gives the same output in bounded pieces
+    monkeypatch.setattr(StreamingResampler, "max_outputs_per_pass", 1000)
+    output = StreamingResampler(44100, 16000).process(signal)
+    np.testing.assert_array_equal(output, expected)
+
+
+def test_streaming_resampler_reset_starts_new_stream():
+    signal = np.sin(np.arange(4410, dtype=np.float32) / 10)
+    resampler = StreamingResampler(44100, 16000)
+    first = np.concatenate((resampler.process(signal), resampler.flush()))
+    resampler.reset()
+    second = np.concatenate((resampler.process(signal), resampler.flush()))
+    np.testing.assert_array_equal(first, second)
+
+
+def test_prepared_audio_downmixes_and_resamples(tmp_path):
+    path = str(tmp_path / "stereo.wav")
+    t = np.arange(22050) / 44100
+    left = 0.5 * np.sin(2 * np.pi * 440 * t)
+    sf.write(path, np.stack((left, left), axis=1), 44100, subtype="FLOAT")
+
+    with open_audio(path, sample_rate=16000) as audio:
+        assert isinstance(audio, PreparedAudio)
+        output_file = audio.output_file
+        samples = audio.read(0, len(audio))
+        np.testing.assert_allclose(samples, resample_poly(left, 160, 441), atol=1e-5)
+        np.testing.assert_array_equal(np.concatenate(list(audio.blocks(1000))), samples)
+    assert not os.path.exists(output_file)
+
+
+def test_prepared_audio_removes_temporary_file_on_failure(tmp_path, monkeypatch):
+    created = []
+    mkstemp = audio_io.tempfile.mkstemp
+
+    def recording_mkstemp(*args, **kwargs):
+        fd, path = mkstemp(*args, dir=str(tmp_path), **kwargs)
+        created.append(path)
+        return fd, path
+
+    monkeypatch.setattr(audio_io.tempfile, "mkstemp", recording_mkstemp)
+    with pytest.raises(Exception):
+        PreparedAudio(str(tmp_path / "missing.wav"))
+    assert len(created) == 1 and not os.path.exists(created[0])
+
+
+def test_audio_reader_reads_ranges_and_blocks(tmp_path):
+    path = str(tmp_path / "stereo16k.wav")
+    left = np.linspace(-0.5, 0.5, 16000, dtype=np.float32)
+    sf.write(path, np.stack((left, 0.5 * left), axis=1), 16000, subtype="FLOAT")
+    mono = 0.75 * left
+
+    with open_audio(path, sample_rate=16000) as audio:
+        assert isinstance(audio, AudioReader)
+        assert len(audio) == 16000 and audio.duration == 1.0
+        np.testing.assert_allclose(audio.read(1000, 1500), mono[1000:1500], atol=1e-6)
+        np.testing.assert_allclose(audio.read_seconds(0.5, 0.75), mono[8000:12000], atol=1e-6)
+
+        # Ranges are clipped to the file, and reading blocks after a range starts from the beginning
+        np.testing.assert_allclose(audio.read(15900, 20000), mono[15900:], atol=1e-6)
+        assert len(audio.read(-10, 0)) == 0
+        blocks = list(audio.blocks(6000))
+        assert [len(block) for block in blocks] == [6000, 6000, 4000]
+        np.testing.assert_allclose(np.concatenate(blocks), mono, atol=1e-6)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from transformers import WhisperFeatureExtractor
+from backends import InferenceBackend, TransformersBackend, create_backend
+from encoder_context import encode_truncated
+
+
+class FeatureProcessor:
+    """Processor stand-in with only the feature extractor, enough for _features()."""
+
+    def __init__(self):
+        self.feature_extractor = WhisperFeatureExtractor()
+
+    def __call__(self, *args, **kwargs):
+        return self.feature_extractor(*args, **kwargs)
+
+
+def test_assisted_decoding_reuses_truncated_encoder_output(tiny_whisper):
+    backend = TransformersBackend("tiny", reduced_context=True)
+    backend.model = tiny_whisper(seed=0)
+    backend.assistant_model = tiny_whisper(seed=1)
+    backend.processor = FeatureProcessor()
+    backend.generation_kwargs = lambda language: {"max_new_tokens": 6, "num_beams": 1, "do_sample": False}
+
+    rng = np.random.default_rng(0)
+    audio_inputs = [rng.standard_normal(16000 * 4).astype(np.float32) * 0.1 for _ in range(2)]
+    features = backend._features(audio_inputs, 16000, 250)
+    with torch.no_grad():
+        encoder_outputs = encode_truncated(backend.model.get_encoder(), features, 250)
+        expected = backend.model.generate(encoder_outputs=encoder_outputs, max_new_tokens=6, do_sample=False)
+
+    calls = []
+    hook = backend.model.get_encoder().register_forward_hook(lambda *args: calls.append(1))
+    try:
+        generated = backend._generate_assisted(audio_inputs, 16000, encoder_outputs, "fi", False)
+    finally:
+        hook.remove()
+
+    # Greedy assisted decoding gives the same tokens, without re-running the model's encoder
+    assert calls == []
+    assert backend.stats["assisted_decodes"] == 2
+    for ids, reference in zip(generated, expected):
+        reference = reference[reference != backend.model.generation_config.pad_token_id]
+        assert ids[ids != backend.model.generation_config.pad_token_id].tolist() == reference.tolist()
+
+
+def test_inference_backend_is_abstract():
+    with pytest.raises(TypeError):
+        InferenceBackend("tiny")
+
+
+@pytest.mark.parametrize("options", [
+    {"reduced_context": True},
+    {"draft_model_id": "openai/whisper-tiny"},
+    {"attn_implementation": "sdpa"},
+])
+def test_ctranslate2_rejects_unsupported_options(options):
+    with pytest.raises(ValueError):
+        create_backend("ctranslate2", "tiny", quantize=True, **options)
+    assert create_backend("ctranslate2", "tiny", quantize=True).compute_type == "int8"
+
+
+def test_ctranslate2_gets_the_tuned_thread_count():
+    assert create_backend("ctranslate2", "tiny", quantize=True, num_threads=3).num_threads == 3
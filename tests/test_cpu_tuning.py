@@ -0,0 +1,45 @@
+import os
+import threading
+import pytest
+from cpu_tuning import candidate_thread_counts, inference_cores, pinned_to
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="vaatii sched_getaffinity-tuen")
+
+
+def test_inference_cores_leave_at_least_one_core():
+    cores = sorted(os.sched_getaffinity(0))
+    assert inference_cores(0) == cores
+    assert inference_cores(len(cores) + 5) == cores[:1]
+
+
+def test_candidate_thread_counts():
+    assert candidate_thread_counts(6) == [1, 2, 4, 6]
+    assert candidate_thread_counts(1) == [1]
+
+
+def test_pinned_to_applies_to_threads_started_inside_and_restores():
+    previous = os.sched_getaffinity(0)
+    target = {min(previous)}
+    seen = []
+
+    with pinned_to(sorted(target)):
+        assert os.sched_getaffinity(0) == target
+        thread = threading.Thread(target=lambda: seen.append(os.sched_getaffinity(0)))
+        thread.start()
+        thread.join()
+
+    assert seen == [target]
+    assert os.sched_getaffinity(0) == previous
+
+
+def test_transcriber_leaves_thread_count_alone_without_tuning():
+    torch = pytest.importorskip("torch")
+    from transcriber import Transcriber
+
+    threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    try:
+        Transcriber(num_workers=2, use_diarization=False, reserved_cores=0, tune_threads=False)
+        assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(threads)
@@ -0,0 +1,71 @@
+import copy
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from transformers.models.whisper.modeling_whisper import WhisperEncoder
+from encoder_context import (AUDIO_CTX_BUCKETS, FULL_AUDIO_CTX, audio_ctx_samples, encode_truncated,
+                             select_audio_ctx)
+
+
+@pytest.fixture(scope="module")
+def model(tiny_whisper):
+    return tiny_whisper(encoder_layers=2)
+
+
+def test_select_audio_ctx_picks_smallest_bucket():
+    assert select_audio_ctx(16000 * 3, 16000) == AUDIO_CTX_BUCKETS[0]
+    assert select_audio_ctx(16000 * 5, 16000) == 250
+    assert select_audio_ctx(16000 * 6, 16000) == 500
+    assert select_audio_ctx(16000 * 40, 16000) == FULL_AUDIO_CTX
+
+
+def test_audio_ctx_samples_uses_hop_length():
+    assert audio_ctx_samples(FULL_AUDIO_CTX) == 30 * 16000
+    assert audio_ctx_samples(250, hop_length=441) == 250 * 2 * 441
+
+
+def test_full_context_matches_encoder(model):
+    encoder = model.get_encoder()
+    features = torch.randn(2, 80, 3000)
+    with torch.no_grad():
+        expected = encoder(features).last_hidden_state
+        actual = encode_truncated(encoder, features, FULL_AUDIO_CTX).last_hidden_state
+    torch.testing.assert_close(actual, expected)
+
+
+def test_truncated_context_matches_short_encoder(model):
+    encoder = model.get_encoder()
+    features = torch.randn(2, 80, 3000)
+
+    # An encoder built for 250 positions with the same weights is the reference
+    config = copy.deepcopy(model.config)
+    config.max_source_positions = 250
+    reference = WhisperEncoder(config).eval()
+    state = encoder.state_dict()
+    state["embed_positions.weight"] = state["embed_positions.weight"][:250]
+    reference.load_state_dict(state)
+
+    with torch.no_grad():
+        expected = reference(features[..., :500]).last_hidden_state
+        actual = encode_truncated(encoder, features, 250).last_hidden_state
+    assert actual.shape == (2, 250, 16)
+    torch.testing.assert_close(actual, expected)
+
+
+def test_truncation_leaves_shared_model_unchanged(model):
+    encoder = model.get_encoder()
+    with torch.no_grad():
+        encode_truncated(encoder, torch.randn(1, 80, 1000), 500)
+    assert model.config.max_source_positions == FULL_AUDIO_CTX
+    assert encoder.embed_positions.num_embeddings == FULL_AUDIO_CTX
+    with torch.no_grad():
+        encoder(torch.randn(1, 80, 3000))
+
+
+def test_truncated_output_can_be_decoded(model):
+    with torch.no_grad():
+        encoder_outputs = encode_truncated(model.get_encoder(), torch.randn(1, 80, 400), 250)
+        logits = model(encoder_outputs=encoder_outputs, decoder_input_ids=torch.tensor([[1]])).logits
+    assert logits.shape == (1, 1, model.config.vocab_size)
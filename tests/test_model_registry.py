@@ -0,0 +1,59 @@
+import io
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from model_registry import ModelRegistry
+
+
+def test_quantized_cache_file_depends_on_versions_and_options():
+    plain = ModelRegistry._quantized_cache_file("openai/whisper-small", {})
+    sdpa = ModelRegistry._quantized_cache_file("openai/whisper-small", {"attn_implementation": "sdpa"})
+
+    assert plain != sdpa
+    assert torch.__version__.replace("+", "_") in plain
+    assert transformers.__version__ in plain
+    assert ModelRegistry._quantized_cache_file("openai/whisper-small", {"attn_implementation": "sdpa"}) == sdpa
+
+
+def test_quantized_state_dict_loads_with_weights_only(tiny_whisper):
+    model = ModelRegistry._quantize(tiny_whisper(seed=0))
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    buffer.seek(0)
+
+    loaded = ModelRegistry._quantize(tiny_whisper(seed=1))
+    loaded.load_state_dict(torch.load(buffer, map_location="cpu", weights_only=True))
+
+    features = torch.randn(1, 80, 3000)
+    with torch.no_grad():
+        expected = model.model.encoder(features).last_hidden_state
+        actual = loaded.model.encoder(features).last_hidden_state
+    torch.testing.assert_close(actual, expected)
+
+
+def test_idle_models_are_evicted_above_memory_limit(monkeypatch):
+    registry = ModelRegistry(memory_limit=250)
+    monkeypatch.setattr(registry, "_load", lambda model_id, *args: {
+        "model": model_id, "processor": None, "size": 100, "users": 0, "last_used": 0.0})
+
+    for model_id in ("a", "b", "c"):
+        registry.get(model_id)
+    # Models in use are kept even above the limit
+    assert len(registry.loaded_models()) == 3
+
+    registry.release("b")
+    assert [key[0] for key, _, _ in registry.loaded_models()] == ["a", "c"]
+
+
+def test_transcriber_sets_shared_registry_limit():
+    import model_registry
+    from transcriber import Transcriber
+
+    previous = model_registry.registry.memory_limit
+    try:
+        Transcriber(num_workers=2, use_diarization=False, tune_threads=False, model_memory_limit=2 ** 30)
+        assert model_registry.registry.memory_limit == 2 ** 30
+    finally:
+        model_registry.registry.memory_limit = previous
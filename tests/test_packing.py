@@ -0,0 +1,60 @@
+import numpy as np
+from packing import build_window, group_pieces, merge_turns, sorted_batches, split_offsets
+
+
+def test_group_pieces_respects_window_length():
+    groups = group_pieces([10, 10, 10, 10], sample_rate=1, max_duration=25, gap_duration=1)
+    assert groups == [[0, 1], [2, 3]]
+
+
+def test_build_window_places_pieces_between_gaps():
+    window, spans = build_window([np.ones(2, dtype=np.float32), np.full(3, 2, dtype=np.float32)], 1, 1)
+    np.testing.assert_array_equal(window, [1, 1, 0, 2, 2, 2])
+    assert spans == [(0.0, 2.0), (3.0, 6.0)]
+
+
+def test_split_offsets_assigns_whole_segments():
+    spans = [(0.0, 2.0), (3.0, 6.0)]
+    offsets = [
+        {"text": " Hei.", "timestamp": (0.0, 1.8)},
+        {"text": " Mitä kuuluu?", "timestamp": (3.1, 5.0)},
+        {"text": " Hyvää.", "timestamp": (5.0, None)},
+    ]
+    assert split_offsets(offsets, spans) == ["Hei.", "Mitä kuuluu? Hyvää."]
+
+
+def test_split_offsets_divides_crossing_segment_by_overlap():
+    spans = [(0.0, 2.0), (2.5, 8.5)]
+    # One second in the first span and three in the second: a quarter of the words go first
+    offsets = [{"text": " yksi kaksi kolme neljä viisi kuusi seitsemän kahdeksan", "timestamp": (1.0, 5.5)}]
+    assert split_offsets(offsets, spans) == ["yksi kaksi", "kolme neljä viisi kuusi seitsemän kahdeksan"]
+
+
+def test_split_offsets_gap_segment_goes_to_nearest_span():
+    spans = [(0.0, 2.0), (3.0, 6.0)]
+    offsets = [{"text": " ääh", "timestamp": (2.1, 2.3)}, {"text": " hmm", "timestamp": (2.7, 2.9)}]
+    assert split_offsets(offsets, spans) == ["ääh", "hmm"]
+
+
+def test_sorted_batches_longest_first_within_budget():
+    lengths = [5, 20, 10, 15]
+    assert sorted_batches(lengths, max_batch_size=2) == [[1, 3], [2, 0]]
+    assert sorted_batches(lengths, max_batch_size=4, max_batch_samples=40) == [[1, 3], [2, 0]]
+
+
+def test_merge_turns_joins_same_speaker_within_gap():
+    turns = [(0.0, 5.0, "A"), (5.5, 10.0, "A"), (10.5, 12.0, "B"), (20.0, 22.0, "B")]
+    assert merge_turns(turns, max_gap=2.0) == [[0, 1], [2], [3]]
+
+
+def test_sorted_batches_counts_padding_to_full_window():
+    lengths = [5, 20, 10, 15]
+    # Every input costs 30 samples when the model pads to a full window
+    assert sorted_batches(lengths, max_batch_size=4, max_batch_samples=60, min_padded_length=30) == [[1, 3], [2, 0]]
+    assert sorted_batches(lengths, max_batch_size=4, max_batch_samples=60) == [[1, 3, 2], [0]]
+
+
+def test_merge_turns_measures_gap_from_latest_end():
+    # The second turn is nested in the first, so the third follows the first within the gap
+    turns = [(0.0, 10.0, "A"), (2.0, 3.0, "A"), (11.0, 12.0, "A")]
+    assert merge_turns(turns, max_gap=2.0) == [[0, 1, 2]]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from ring_buffer import RingBuffer
+
+
+def frames(start, stop, channels=1):
+    return np.repeat(np.arange(start, stop, dtype=np.float32)[:, None], channels, axis=1)
+
+
+def test_read_across_the_wrap_point():
+    buffer = RingBuffer(8, channels=2)
+    buffer.write(frames(0, 6, 2))
+    buffer.write(frames(6, 11, 2))
+
+    assert buffer.write_position == 11
+    assert buffer.oldest_position == 3
+    np.testing.assert_array_equal(buffer.read(5, 11), frames(5, 11, 2))
+
+    first, second = buffer.views(5, 11)
+    assert len(first) == 3 and len(second) == 3
+
+
+def test_read_into_preallocated_array():
+    buffer = RingBuffer(4)
+    buffer.write(frames(0, 6))
+    out = np.empty((3, 1), dtype=np.float32)
+
+    assert buffer.read(3, 6, out=out) is out
+    np.testing.assert_array_equal(out, frames(3, 6))
+
+
+def test_block_larger_than_capacity_keeps_newest_samples():
+    buffer = RingBuffer(4)
+    buffer.write(frames(0, 10))
+
+    assert buffer.write_position == 10
+    np.testing.assert_array_equal(buffer.read(6, 10), frames(6, 10))
+
+
+def test_overwritten_and_unwritten_ranges_are_rejected():
+    buffer = RingBuffer(4)
+    buffer.write(frames(0, 6))
+
+    with pytest.raises(ValueError):
+        buffer.read(1, 4)
+    with pytest.raises(ValueError):
+        buffer.read(4, 7)
+
+    buffer.reset()
+    assert buffer.write_position == 0 and buffer.oldest_position == 0
@@ -0,0 +1,49 @@
+import numpy as np
+from rttm import from_segments, load_rttm, save_rttm
+
+
+def brute_force(turns, start, end):
+    return [i for i in range(len(turns)) if turns.ends[i] > start and turns.starts[i] <= end]
+
+
+def test_overlapping_matches_brute_force_with_long_turn():
+    rng = np.random.default_rng(0)
+    segments = [(start, start + duration, f"SPEAKER_{speaker:02d}") for start, duration, speaker in
+                zip(rng.uniform(0, 100, 200), rng.exponential(2.0, 200), rng.integers(0, 3, 200))]
+    segments.append((5.0, 95.0, "SPEAKER_09"))
+    turns = from_segments(segments)
+
+    for _ in range(500):
+        start = rng.uniform(-5, 105)
+        end = start + rng.uniform(0, 5)
+        assert turns.overlapping(start, end).tolist() == brute_force(turns, start, end)
+        assert turns.overlapping(start, start).tolist() == brute_force(turns, start, start)
+
+
+def test_long_turn_only_widens_search_while_it_lasts():
+    segments = [(0.0, 50.0, "A")] + [(60.0 + k, 60.5 + k, "B") for k in range(10)]
+    turns = from_segments(segments)
+
+    # After the long turn has ended the first candidate is found by the binary search
+    assert np.searchsorted(turns.max_ends, 65.2, side="right") == 6
+    assert turns.overlapping(65.2, 65.3).tolist() == [6]
+
+
+def test_speaker_queries():
+    turns = from_segments([(0.0, 2.0, "A"), (1.0, 3.0, "B"), (4.0, 5.0, "A")])
+    assert turns.speakers_at(1.5) == ["A", "B"]
+    assert turns.speakers_at(2.0) == ["B"]
+    assert turns.speakers_at(3.5) == []
+    assert turns.speakers_in(2.5, 4.5) == ["A", "B"]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "audio.rttm")
+    turns = from_segments([(1.0, 2.5, "B"), (0.0, 1.0, "A"), (2.5, 4.0, "A")], file_id="audio")
+    save_rttm(turns, path)
+
+    recordings = load_rttm(path)
+    assert list(recordings) == ["audio"]
+    loaded = recordings["audio"]
+    assert loaded.speakers == ["A", "B"]
+    assert loaded.to_list() == [(0.0, 1.0, "A"), (1.0, 2.5, "B"), (2.5, 4.0, "A")]
@@ -0,0 +1,81 @@
+import numpy as np
+from speaker_diarization import SpeakerDiarization
+
+SAMPLE_RATE = 16000
+
+
+def tone(duration, frequency=220.0):
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def make_session():
+    """Return a session and the lengths of the audio its segmentation sees."""
+    diarization = SpeakerDiarization()
+    session = diarization.create_session()
+    seen = []
+    detect = diarization._detect_segments
+
+    def spy(audio, sample_rate):
+        seen.append(len(audio))
+        return detect(audio, sample_rate)
+
+    diarization._detect_segments = spy
+    return session, seen
+
+
+def test_contiguous_chunk_continues_open_segment():
+    session, seen = make_session()
+    session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=0.0)
+    assert session.carry_open and len(session.carry) > 0
+    carried = len(session.carry)
+
+    turns = session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=2.0)
+    assert seen[-1] == carried + 2 * SAMPLE_RATE
+    assert turns[0][0] == 0.0 and turns[0][2] == "SPEAKER_00"
+    assert session.offset == 4.0
+
+
+def test_gap_drops_carry_but_keeps_speakers():
+    session, seen = make_session()
+    session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=0.0)
+    assert session.carry_open
+
+    turns = session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=5.0)
+    assert seen[-1] == 2 * SAMPLE_RATE
+    assert turns[0][2] == "SPEAKER_00"
+    assert session.clustering.counts
+    assert session.offset == 7.0
+
+
+def test_chunk_before_previous_end_starts_new_recording():
+    session, seen = make_session()
+    session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=0.0)
+    session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=2.0)
+
+    resets = []
+    reset = session.reset
+    session.reset = lambda: (resets.append(session.offset), reset())
+
+    session.process_chunk(tone(2.0), SAMPLE_RATE, start_time=0.0)
+    assert resets == [4.0]
+    assert seen[-1] == 2 * SAMPLE_RATE
+    assert session.offset == 2.0
+
+
+def test_overlapping_vad_chunk_continues_recording():
+    session, seen = make_session()
+    resets = []
+    reset = session.reset
+    session.reset = lambda: (resets.append(session.offset), reset())
+
+    # VAD chunks may start up to the padding before the previous chunk ended
+    session.process_chunk(tone(27200 / SAMPLE_RATE), SAMPLE_RATE, start_time=0.0)
+    carried = len(session.carry)
+    turns = session.process_chunk(tone(30400 / SAMPLE_RATE), SAMPLE_RATE, start_time=26080 / SAMPLE_RATE)
+
+    assert resets == []
+    assert seen[-1] == carried + 30400 - (27200 - 26080)
+    assert turns[0][2] == "SPEAKER_00"
+    assert turns[0][0] == 0.0 and abs(turns[-1][1] - 30400 / SAMPLE_RATE) < 1e-9
+    assert abs(session.offset - 56480 / SAMPLE_RATE) < 1e-9
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from transcriber import Transcriber
+from vad import SpeechGate
+
+SAMPLE_RATE = 16000
+
+
+class ScriptedBackend:
+    """Backend stand-in that returns prepared hypotheses and records the window lengths."""
+
+    def __init__(self, hypotheses):
+        self.hypotheses = list(hypotheses)
+        self.lengths = []
+
+    def transcribe_batch(self, audio_inputs, sample_rate, language, return_offsets=False):
+        assert return_offsets
+        self.lengths.append(len(audio_inputs[0]) / sample_rate)
+        return [[{"text": text, "timestamp": (start, end)} for text, start, end in self.hypotheses.pop(0)]]
+
+
+def speech(duration):
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+@pytest.fixture
+def transcriber():
+    # With several workers the constructor loads no model
+    transcriber = Transcriber(num_workers=2, use_diarization=False, stream_interval=0.5)
+    events = []
+    transcriber.callback = lambda text, source, kind=None: events.append((kind, text))
+    transcriber.model_loaded = True
+    transcriber.events = events
+    return transcriber
+
+
+def test_stream_commits_agreed_words_and_trims_committed_audio(transcriber):
+    backend = ScriptedBackend([
+        [("Hello world.", 0.0, 1.0), ("How are", 1.0, None)],
+        [("Hello world.", 0.0, 1.0), ("How are you", 1.0, 2.0)],
+        [("How are you doing", 0.0, 2.0)],
+        [("How are you doing", 0.0, 2.0)],
+    ])
+    transcriber.backend = backend
+
+    for block in (speech(1.0), speech(1.0), speech(1.0), np.zeros(int(0.6 * SAMPLE_RATE), dtype=np.float32)):
+        transcriber._stream_step([block], SAMPLE_RATE)
+
+    finals = [text for kind, text in transcriber.events if kind == "final"]
+    assert finals == ["Hello world. How are", "you", "doing"]
+    assert transcriber.events[-1] == ("partial", "")
+
+    # The first committed segment is trimmed, so the third decode covers 2 s instead of 3 s
+    assert backend.lengths == [1.0, 2.0, 2.0, 2.6]
+    assert transcriber.stream_window_length == 0
+
+
+def test_pause_is_judged_against_noise_floor(transcriber):
+    transcriber.backend = ScriptedBackend([[("Hei", 0.0, None)], [("Hei", 0.0, None)]])
+    noise = np.random.default_rng(0).standard_normal(SAMPLE_RATE).astype(np.float32) * 0.004
+
+    # Background noise louder than the old fixed 0.01 peak still counts as a pause
+    transcriber._stream_step([speech(1.0)], SAMPLE_RATE)
+    transcriber._stream_step([noise], SAMPLE_RATE)
+    assert [text for kind, text in transcriber.events if kind == "final"] == ["Hei"]
+    assert transcriber.stream_window_length == 0
+
+
+def test_committed_prefix_end_follows_reworded_text():
+    assert Transcriber._committed_prefix_end(["Hello", "world."], ["hello", "world", "again"]) == 2
+    assert Transcriber._committed_prefix_end(["Well", "hello", "world."], ["Hello", "world,", "again"]) == 2
+    assert Transcriber._committed_prefix_end(["a", "b"], ["x", "y", "z"]) == 2
+
+
+def test_noise_without_speech_is_never_decoded(transcriber):
+    backend = ScriptedBackend([])
+    transcriber.backend = backend
+    noise = np.random.default_rng(0).standard_normal(SAMPLE_RATE).astype(np.float32) * 0.004
+
+    for _ in range(3):
+        transcriber._stream_step([noise], SAMPLE_RATE)
+
+    assert backend.lengths == []
+    assert transcriber.events == []
+    # Only the VAD padding is kept for the onset of the next word
+    assert transcriber.stream_window_length == transcriber.stream_vad.padding_samples
+
+
+def test_pause_finalizes_only_agreed_words(transcriber):
+    transcriber.backend = ScriptedBackend([[("Hei kaikki", 0.0, None)], [("Hei vaan", 0.0, None)]])
+
+    transcriber._stream_step([speech(1.0)], SAMPLE_RATE)
+    transcriber._stream_step([np.zeros(int(0.6 * SAMPLE_RATE), dtype=np.float32)], SAMPLE_RATE)
+
+    assert [text for kind, text in transcriber.events if kind == "final"] == ["Hei"]
+    assert transcriber.events[-1] == ("partial", "")
+    assert transcriber.stream_window_length == 0
+
+
+def test_speech_gate_applies_to_stream_window(transcriber):
+    backend = ScriptedBackend([])
+    transcriber.backend = backend
+    transcriber.speech_gate = SpeechGate()
+    noise = np.random.default_rng(1).standard_normal(SAMPLE_RATE).astype(np.float32) * 0.1
+
+    # Loud white noise passes the VAD but not the spectral gate
+    transcriber._stream_step([noise], SAMPLE_RATE)
+    assert backend.lengths == []
+    assert transcriber.stats["gated_segments"] == 1
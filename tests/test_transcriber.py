@@ -0,0 +1,90 @@
+import queue
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from transcriber import Transcriber
+
+
+def make_transcriber(**options):
+    # With several workers the constructor loads no model
+    return Transcriber(num_workers=2, use_diarization=False, tune_threads=False, **options)
+
+
+def chunk(index):
+    return (np.full(10, index, dtype=np.float32), 16000, None)
+
+
+def test_next_batch_is_limited_to_max_batch_size():
+    transcriber = make_transcriber(max_batch_size=4, max_batch_wait=0.0)
+    for index in range(6):
+        transcriber.transcription_queue.put(chunk(index))
+
+    first = transcriber._next_batch()
+    second = transcriber._next_batch()
+
+    assert [item[0][0] for item in first] == [0, 1, 2, 3]
+    assert [item[0][0] for item in second] == [4, 5]
+    stats = transcriber.get_stats()
+    assert stats["batches"] == 2
+    assert stats["chunks"] == 6
+    assert stats["largest_batch"] == 4
+    assert stats["max_queue_depth"] == 6
+    assert stats["last_queue_depth"] == 2
+    assert stats["average_batch_size"] == 3.0
+    assert stats["queue_size"] == 0
+
+
+def test_next_batch_waits_for_late_chunks_only_until_deadline():
+    transcriber = make_transcriber(max_batch_size=4, max_batch_wait=0.5)
+    transcriber.transcription_queue.put(chunk(0))
+    threading.Timer(0.05, transcriber.transcription_queue.put, args=(chunk(1),)).start()
+    assert len(transcriber._next_batch()) == 2
+
+    transcriber.max_batch_wait = 0.01
+    transcriber.transcription_queue.put(chunk(2))
+    late = threading.Timer(0.3, transcriber.transcription_queue.put, args=(chunk(3),))
+    late.start()
+    assert len(transcriber._next_batch()) == 1
+    late.join()
+    assert transcriber.get_stats()["queue_size"] == 1
+
+
+def test_next_batch_raises_on_empty_queue():
+    transcriber = make_transcriber()
+    with pytest.raises(queue.Empty):
+        transcriber._next_batch()
+    assert transcriber.get_stats()["average_batch_size"] == 0.0
+
+
+class RecordingBackend:
+    """Backend stand-in that records the batch sizes; inputs whose second sample is negative count as non-speech."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def transcribe_batch(self, audio_inputs, sample_rate, language, return_offsets=False):
+        self.batch_sizes.append(len(audio_inputs))
+        return [None if audio[1] < 0 else f"segmentti {audio[0]:.0f}" for audio in audio_inputs]
+
+
+def test_transcribe_batch_maps_batched_results_back_in_order():
+    transcriber = make_transcriber()
+    transcriber.backend = RecordingBackend()
+    transcriber.model_loaded = True
+    transcriber.segment_batch_size = 2
+
+    speech = [np.array([1.0, 0.5], dtype=np.float32), np.array([1.0, 0.2], dtype=np.float32),
+              np.array([1.0, -0.5], dtype=np.float32)]
+    inputs = [speech[0], np.zeros(0, dtype=np.float32), np.zeros(4, dtype=np.float32), speech[1], speech[2]]
+    transcriptions = transcriber._transcribe_batch(inputs, 16000)
+
+    # Three segments reach the model in batches of at most two
+    assert transcriber.backend.batch_sizes == [2, 1]
+    assert transcriptions[0] == transcriptions[3] == "segmentti 1"
+    assert transcriptions[1] == "Tyhjä äänisyöte"
+    assert transcriptions[2].startswith("Äänitaso on liian matala")
+    # A segment the backend skips as non-speech gives no text
+    assert transcriptions[4] == ""
@@ -0,0 +1,71 @@
+import numpy as np
+from vad import SpeechGate, VadChunker
+
+SAMPLE_RATE = 16000
+
+
+def tone(duration, amplitude=0.3, frequency=200.0):
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def run(chunker, audio):
+    chunks = []
+    frame = chunker.frame_samples
+    for position in range(0, len(audio) - frame + 1, frame):
+        chunks.extend(chunker.process_frame(audio[position:position + frame], position))
+    chunks.extend(chunker.flush(len(audio)))
+    return chunks
+
+
+def test_speech_from_first_frame_is_detected():
+    chunker = VadChunker(SAMPLE_RATE)
+    assert chunker.is_speech(0.2)
+
+
+def test_noise_floor_rises_slowly_during_steady_noise():
+    chunker = VadChunker(SAMPLE_RATE)
+    frames = [chunker.is_speech(0.05) for _ in range(3000)]
+
+    # A sudden louder background first looks like speech, but is learned eventually
+    assert frames[0]
+    assert not frames[-1]
+    assert chunker.noise_floor > chunker.energy_threshold / chunker.noise_ratio
+
+
+def test_speech_between_pauses_gives_one_padded_chunk():
+    chunker = VadChunker(SAMPLE_RATE)
+    audio = np.concatenate((np.zeros(SAMPLE_RATE, dtype=np.float32), tone(1.5),
+                            np.zeros(SAMPLE_RATE, dtype=np.float32)))
+    chunks = run(chunker, audio)
+
+    assert len(chunks) == 1
+    start, end = chunks[0]
+    assert abs(start - (SAMPLE_RATE - chunker.padding_samples)) <= chunker.frame_samples
+    assert abs(end - (int(2.5 * SAMPLE_RATE) + chunker.padding_samples)) <= chunker.frame_samples
+
+
+def test_long_speech_is_cut_at_max_duration():
+    chunker = VadChunker(SAMPLE_RATE, max_chunk_duration=2.0)
+    chunks = run(chunker, tone(5.0))
+    assert len(chunks) == 3
+    assert all(end - start <= 2 * SAMPLE_RATE + chunker.frame_samples for start, end in chunks)
+
+
+def test_speech_gate_rejects_white_noise():
+    gate = SpeechGate()
+    noise = np.random.default_rng(0).standard_normal(SAMPLE_RATE).astype(np.float32) * 0.1
+    assert gate.is_speech(tone(1.0), SAMPLE_RATE)
+    assert not gate.is_speech(noise, SAMPLE_RATE)
+
+
+def test_emitted_chunks_never_overlap():
+    chunker = VadChunker(SAMPLE_RATE)
+    pause = np.zeros(int(0.33 * SAMPLE_RATE), dtype=np.float32)
+    # Speech resumes right after the minimum pause, inside the padding of the previous chunk
+    audio = np.concatenate([np.concatenate((tone(1.2), pause)) for _ in range(5)])
+    chunks = run(chunker, audio)
+
+    assert len(chunks) >= 2
+    for (_, previous_end), (start, _) in zip(chunks, chunks[1:]):
+        assert start >= previous_end
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import numpy as np
+from worker_pool import TranscriptionPool, _read_shared_audio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_submit_shares_segments_and_delivers_in_order():
+    delivered = []
+    pool = TranscriptionPool(1, {}, lambda payload, text: delivered.append((payload, text)), reserved_cores=0)
+
+    segments = [np.ones(3, dtype=np.float32), np.arange(2, dtype=np.float32)]
+    pool.submit("eka", segments, 16000, "fi", speakers=["SPEAKER_00", "SPEAKER_01"])
+    pool.submit("toka", np.full(4, 0.5, dtype=np.float32), 16000, "fi")
+
+    first = pool.tasks.get(timeout=5)
+    second = pool.tasks.get(timeout=5)
+    assert first[0] == 0 and first[5] == ["SPEAKER_00", "SPEAKER_01"]
+    for piece, expected in zip(_read_shared_audio(first[1], first[2]), segments):
+        np.testing.assert_array_equal(piece, expected)
+    assert second[5] is None
+    np.testing.assert_array_equal(_read_shared_audio(second[1], second[2])[0], np.full(4, 0.5))
+
+    # Results arriving out of order are delivered in submission order
+    pool.running = True
+    thread = threading.Thread(target=pool._collect_results)
+    thread.start()
+    pool.results.put((1, "toinen"))
+    pool.results.put((0, "ensimmäinen"))
+    deadline = time.monotonic() + 5
+    while len(delivered) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.running = False
+    thread.join()
+
+    assert delivered == [("eka", "ensimmäinen"), ("toka", "toinen")]
+    assert pool.pending_count() == 0
+
+
+def test_worker_attach_leaves_no_resource_tracker_warnings(tmp_path):
+    script = tmp_path / "attach.py"
+    script.write_text(textwrap.dedent("""
+        import multiprocessing
+        from multiprocessing import shared_memory
+        import worker_pool
+
+        if __name__ == "__main__":
+            context = multiprocessing.get_context("spawn")
+            block = shared_memory.SharedMemory(create=True, size=16)
+            process = context.Process(target=worker_pool._read_shared_audio, args=(block.name, [4]))
+            process.start()
+            process.join()
+            block.close()
+            block.unlink()
+            print("exitcode", process.exitcode)
+    """))
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    completed = subprocess.run([sys.executable, str(script)], cwd=ROOT, env=env,
+                               capture_output=True, text=True, timeout=120)
+
+    assert "exitcode 0" in completed.stdout
+    assert "KeyError" not in completed.stderr
+    assert "leaked" not in completed.stderr
@@ -1,28 +1,34 @@
+import argparse
 import torch
-from transformers import WhisperProcessor, WhisperForConditionalGeneration
-import soundfile as sf
 import numpy as np
+from audio_io import open_audio
+from backends import BACKENDS, create_backend
+from cpu_tuning import apply_cpu_tuning, pin_current_thread
 
-# Lataa äänitiedosto
-audio_input, sample_rate = sf.read('audio.wav')
+# Määritä komentoriviparametrit
+parser = argparse.ArgumentParser(description='Transkriptoi äänitiedosto 30 sekunnin paloissa')
+parser.add_argument('--backend', choices=BACKENDS, default='transformers', help='Päättelymoottori')
+args = parser.parse_args()
 
-# Lataa prosessori ja malli
-processor = WhisperProcessor.from_pretrained("openai/whisper-large-v3")
-model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-large-v3")
+# Käytä tallennettua säieviritystä; komentoriviltä ei kaapata ääntä, joten ytimiä ei varata
+pin_current_thread(apply_cpu_tuning(reserved_cores=0))
 
-# Siirrä malli GPU:lle, jos se on käytettävissä
+# Avaa äänitiedosto 16 kHz monona; muut näytteenottotaajuudet ja kanavamäärät muunnetaan kerran
+# ennen transkriptiota, ja palat luetaan vasta, kun niitä tarvitaan
+audio_input = open_audio('audio.wav', sample_rate=16000)
+sample_rate = audio_input.sample_rate
+
+# Lataa malli valitulla päättelymoottorilla ja siirrä se GPU:lle, jos se on käytettävissä
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model.to(device)
+backend = create_backend(args.backend, "openai/whisper-large-v3", device=device, torch_dtype=torch.float32,
+                         num_threads=torch.get_num_threads())
+backend.load()
 
-# Aseta kieli ja tehtävä
+# Aseta kieli
 language = "fi"  # Vaihda tämä haluamaksesi kieleksi
-task = "transcribe"
-
-forced_decoder_ids = processor.get_decoder_prompt_ids(language=language, task=task)
 
 # Pilko äänitiedosto 30 sekunnin paloihin
 chunk_duration = 30  # sekuntia
-sample_rate = 16000  # Varmista, että tämä vastaa äänitiedoston näytteenottotaajuutta
 chunk_size = chunk_duration * sample_rate
 
 total_length = len(audio_input)
@@ -30,28 +36,17 @@ num_chunks = int(np.ceil(total_length / chunk_size))
 
 transcription = ""
 
-for i in range(num_chunks):
-    start = i * chunk_size
-    end = min((i + 1) * chunk_size, total_length)
-    audio_chunk = audio_input[start:end]
-
-    # Esikäsittele äänidata
-    input_features = processor(audio_chunk, sampling_rate=sample_rate, return_tensors="pt").input_features
-
-    # Generoi transkriptio
-    generated_ids = model.generate(
-        input_features.to(device),
-        forced_decoder_ids=forced_decoder_ids
-    )
-
-    # Dekoodaa transkriptio
-    chunk_transcription = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+for i, audio_chunk in enumerate(audio_input.blocks(chunk_size)):
+    # Generoi ja dekoodaa transkriptio
+    chunk_transcription = backend.transcribe_batch([audio_chunk], sample_rate, language)[0] or ""
 
     # Lisää transkriptio kokonaistranskriptioon
     transcription += chunk_transcription + " "
 
     print(f"Osio {i+1}/{num_chunks} transkriboitu.")
 
+audio_input.close()
+
 # Tallenna transkriptio tekstitiedostoon
 with open('transcription.txt', 'w', encoding='utf-8') as f:
     f.write(transcription)
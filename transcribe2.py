@@ -1,11 +1,13 @@
 import torch
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
-import soundfile as sf
-from pyannote.core import Segment, Annotation
-from pyannote.database.util import load_rttm
 import numpy as np
 import argparse
 import os
+import time
+from audio_io import open_audio
+from backends import BACKENDS, create_backend
+from cpu_tuning import apply_cpu_tuning, pin_current_thread
+from packing import sorted_batches, merge_turns, split_offsets
+from rttm import load_rttm
 
 # Määritä komentoriviparametrit
 parser = argparse.ArgumentParser(description='Transkriptoi äänitiedosto puhujien erottelulla')
@@ -13,8 +15,22 @@ parser.add_argument('--audio', type=str, default='audio.wav', help='Äänitiedos
 parser.add_argument('--rttm', type=str, default='audio1.rttm', help='RTTM-tiedoston polku')
 parser.add_argument('--output', type=str, default='transcription.txt', help='Tulostiedoston polku')
 parser.add_argument('--language', type=str, default='fi', help='Kielen koodi (esim. fi, en, sv)')
+parser.add_argument('--backend', choices=BACKENDS, default='transformers', help='Päättelymoottori')
+parser.add_argument('--batch-size', type=int, default=16, help='Segmenttien enimmäismäärä yhdessä erässä')
+parser.add_argument('--batch-seconds', type=float, default=120.0,
+                    help='Erän muistibudjetti sekunteina: erän koko kertaa täytetty pituus, joka on '
+                         'pisin segmentti --reduced-context-valitsimella ja muuten vähintään 30 s')
+parser.add_argument('--no-merge', action='store_true',
+                    help='Älä yhdistä saman puhujan peräkkäisiä segmenttejä pidemmiksi ikkunoiksi')
+parser.add_argument('--max-gap', type=float, default=2.0,
+                    help='Pisin tauko sekunteina, jonka yli saman puhujan segmentit vielä yhdistetään')
+parser.add_argument('--reduced-context', action='store_true',
+                    help='Aja kooderi vain erän pisimmän segmentin vaatimalla kontekstilla')
 args = parser.parse_args()
 
+# Käytä tallennettua säieviritystä; komentoriviltä ei kaapata ääntä, joten ytimiä ei varata
+pin_current_thread(apply_cpu_tuning(reserved_cores=0))
+
 # Aseta laitteen ja tarkkuuden asetukset
 device = "cuda:0" if torch.cuda.is_available() else "cpu"
 torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
@@ -29,12 +45,18 @@ if not os.path.exists(args.audio):
 if not os.path.exists(args.rttm):
     raise FileNotFoundError(f"RTTM-tiedostoa ei löydy: {args.rttm}")
 
-# Lataa äänitiedosto
-audio_input, sample_rate = sf.read(args.audio)
+# Avaa äänitiedosto 16 kHz monona; muunnos tehdään kerran, ja segmenttien näytteet
+# luetaan vasta, kun niiden erä transkriptoidaan
+audio_input = open_audio(args.audio, sample_rate=16000)
+sample_rate = audio_input.sample_rate
 
-# Lataa puhujien erottelun tulokset
+# Lataa puhujien erottelun tulokset suoraan NumPy-taulukoiksi;
+# RTTM-tiedoston tallenne tunnistetaan äänitiedoston nimestä
+file_id = os.path.splitext(os.path.basename(args.audio))[0]
 rttm = load_rttm(args.rttm)
-diarization = next(iter(rttm.values()))
+if not rttm:
+    raise ValueError(f"RTTM-tiedostossa ei ole puhujasegmenttejä: {args.rttm}")
+diarization = rttm.get(file_id, next(iter(rttm.values())))
 
 # Lataa prosessori ja malli (uudempi turbo-malli)
 model_id = "openai/whisper-large-v3-turbo"
@@ -57,40 +79,31 @@ try:
 except:
     print("PyTorch-versio ei tue torch.compile-optimointia.")
 
-# Lataa malli optimoiduilla asetuksilla
-if has_flash_attn:
-    model = AutoModelForSpeechSeq2Seq.from_pretrained(
-        model_id,
-        torch_dtype=torch_dtype,
-        low_cpu_mem_usage=True,
-        use_safetensors=True,
-        attn_implementation="flash_attention_2"
-    )
-else:
-    # Tarkista onko SDPA saatavilla (PyTorch 2.1.1+)
-    from transformers.utils import is_torch_sdpa_available
-    if is_torch_sdpa_available():
-        print("PyTorch SDPA on saatavilla, käytetään sitä.")
-        model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            model_id,
-            torch_dtype=torch_dtype,
-            low_cpu_mem_usage=True,
-            use_safetensors=True,
-            attn_implementation="sdpa"
-        )
+# Lataa malli optimoiduilla asetuksilla; transformers-malli tulee jaetusta mallirekisteristä
+load_kwargs = {}
+if args.backend == "transformers":
+    load_kwargs["use_safetensors"] = True
+    if has_flash_attn:
+        load_kwargs["attn_implementation"] = "flash_attention_2"
     else:
-        model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            model_id,
-            torch_dtype=torch_dtype,
-            low_cpu_mem_usage=True,
-            use_safetensors=True
-        )
+        # Tarkista onko SDPA saatavilla (PyTorch 2.1.1+)
+        from transformers.utils import is_torch_sdpa_available
+        if is_torch_sdpa_available():
+            print("PyTorch SDPA on saatavilla, käytetään sitä.")
+            load_kwargs["attn_implementation"] = "sdpa"
+
+print(f"Käytetään päättelymoottoria: {args.backend}")
+backend = create_backend(args.backend, model_id, device=device, torch_dtype=torch_dtype, max_new_tokens=448,
+                         reduced_context=args.reduced_context, num_threads=torch.get_num_threads(), **load_kwargs)
+backend.load()
 
 # Käytä torch.compile-optimointia, jos saatavilla
-if use_torch_compile and not has_flash_attn:  # torch.compile ei ole yhteensopiva Flash Attention 2:n kanssa
+# torch.compile ei ole yhteensopiva Flash Attention 2:n kanssa
+if args.backend == "transformers" and use_torch_compile and not has_flash_attn:
     try:
         print("Optimoidaan mallia torch.compile-toiminnolla...")
         # Aseta staattinen välimuisti ja käännä forward-funktio
+        model = backend.model
         model.generation_config.cache_implementation = "static"
         model.generation_config.max_new_tokens = 448
         model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=True)
@@ -98,56 +111,63 @@ if use_torch_compile and not has_flash_attn:  # torch.compile ei ole yhteensopiv
     except Exception as e:
         print(f"torch.compile-optimointi epäonnistui: {e}")
 
-# Siirrä malli GPU:lle, jos se on käytettävissä
-model.to(device)
-
-# Lataa prosessori
-processor = AutoProcessor.from_pretrained(model_id)
-
-# Aseta kieli ja tehtävä
+# Aseta kieli
 language = args.language
-task = "transcribe"
 print(f"Käytetään kieltä: {language}")
 
-transcription = ""
-
-# Iteroi segmenttien yli
-for segment, _, speaker in diarization.itertracks(yield_label=True):
-    start = int(segment.start * sample_rate)
-    end = int(segment.end * sample_rate)
-    audio_chunk = audio_input[start:end]
-
-    # Esikäsittele äänidata
-    inputs = processor(
-        audio_chunk,
-        sampling_rate=sample_rate,
-        return_tensors="pt",
-        truncation=False,
-        padding="longest",
-        return_attention_mask=True
-    )
-
-    # Siirrä syötteet laitteelle
-    inputs = inputs.to(device, dtype=torch_dtype)
-
-    # Generoi transkriptio
-    gen_kwargs = {
-        "language": language,
-        "task": task,
-        "max_new_tokens": 448,
-        "num_beams": 1
-    }
-
-    with torch.no_grad():
-        generated_ids = model.generate(**inputs, **gen_kwargs)
-
-    # Dekoodaa transkriptio
-    chunk_transcription = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-
-    # Lisää transkriptio kokonaistranskriptioon puhujan kanssa
-    transcription += f"{speaker}: {chunk_transcription}\n"
-
-    print(f"Puhuja {speaker} segmentti {segment.start:.2f}-{segment.end:.2f} transkriboitu.")
+# Kerää segmentit aikajärjestyksessä
+segments = diarization.to_list()
+
+# Yhdistä saman puhujan peräkkäiset segmentit enintään 30 sekunnin ikkunoiksi; jokainen ikkuna
+# dekoodataan kerran aikaleimoilla ja teksti jaetaan takaisin alkuperäisille segmenteille
+if args.no_merge:
+    windows = [[index] for index in range(len(segments))]
+else:
+    windows = merge_turns(segments, max_gap=args.max_gap)
+
+ranges = []
+spans = []
+for window in windows:
+    window_start = segments[window[0]][0]
+    # Saman puhujan segmentit voivat mennä päällekkäin, joten ikkuna päättyy myöhäisimpään loppuun
+    window_end = max(segments[index][1] for index in window)
+    start_sample = min(int(window_start * sample_rate), len(audio_input))
+    end_sample = min(int(window_end * sample_rate), len(audio_input))
+    ranges.append((start_sample, end_sample))
+    spans.append([(segments[index][0] - window_start, segments[index][1] - window_start) for index in window])
+
+# Ryhmittele samanpituiset ikkunat eriin, jotta täytettä on mahdollisimman vähän
+batches = sorted_batches(
+    [end - start for start, end in ranges],
+    max_batch_size=args.batch_size,
+    max_batch_samples=int(args.batch_seconds * sample_rate),
+    # Ilman lyhennettyä kontekstia jokainen ikkuna täytetään 30 sekuntiin
+    min_padded_length=None if args.reduced_context else 30 * sample_rate
+)
+print(f"{len(segments)} segmenttiä, {len(windows)} ikkunaa, {len(batches)} erää")
+
+texts = [""] * len(segments)
+start_time = time.perf_counter()
+done = 0
+for batch in batches:
+    # Generoi ja dekoodaa koko erä yhdellä kertaa aikaleimojen kanssa
+    chunks = [audio_input.read(*ranges[k]) for k in batch]
+    offsets = backend.transcribe_batch(chunks, sample_rate, language, return_offsets=True)
+    for k, window_offsets in zip(batch, offsets):
+        for index, text in zip(windows[k], split_offsets(window_offsets or [], spans[k])):
+            texts[index] = text
+        done += len(windows[k])
+
+    elapsed = time.perf_counter() - start_time
+    print(f"{done}/{len(segments)} segmenttiä transkriboitu ({done / elapsed:.1f} segmenttiä/s).")
+
+audio_input.close()
+
+elapsed = time.perf_counter() - start_time
+print(f"Läpäisy: {len(segments) / max(elapsed, 1e-9):.1f} segmenttiä/s ({elapsed:.1f} s)")
+
+# Kokoa transkriptio alkuperäisessä aikajärjestyksessä puhujien kanssa
+transcription = "".join(f"{speaker}: {text}\n" for (_, _, speaker), text in zip(segments, texts))
 
 # Tallenna transkriptio tekstitiedostoon
 with open(args.output, 'w', encoding='utf-8') as f:
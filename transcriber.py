@@ -1,23 +1,70 @@
 import torch
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
 import threading
 import queue
 import os
 import time
 import numpy as np
-import soundfile as sf
+from audio_io import open_audio
 from speaker_diarization import SpeakerDiarization
+from backends import create_backend
+from packing import group_pieces, build_window, split_offsets
+from vad import SpeechGate, VadChunker
+from worker_pool import TranscriptionPool
+from cpu_tuning import apply_cpu_tuning, inference_cores, pin_current_thread, pinned_to
+from model_registry import registry
 
 class Transcriber:
-    def __init__(self, model_id="openai/whisper-small", language="fi", callback=None, use_diarization=True):
+    def __init__(self, model_id="openai/whisper-small", language="fi", callback=None, use_diarization=True,
+                 streaming=False, stream_interval=0.5, max_stream_window=15.0,
+                 max_batch_size=4, max_batch_wait=0.05, quantize=False, pack_windows=False,
+                 reduced_context=False, speech_gating=False, no_speech_threshold=None,
+                 num_workers=1, backend="transformers", reserved_cores=1, draft_model_id=None,
+                 tune_threads=True, model_memory_limit=None):
         """
         Initialize the transcriber.
 
         Args:
             model_id: The Whisper model ID to use
             language: The language code for transcription
-            callback: Function to call when transcription is complete
+            callback: Function called as callback(text, source) when a queued
+                chunk is transcribed, where source is the queued file path or
+                array; in streaming mode it is called as
+                callback(text, None, kind="partial") or kind="final"
             use_diarization: Whether to use speaker diarization
+            streaming: Re-decode a growing window of audio added with
+                add_audio_block() and report "partial" and "final" text
+            stream_interval: Seconds between decodes in streaming mode
+            max_stream_window: Longest window in seconds before it is finalized
+            max_batch_size: Largest number of queued chunks transcribed together
+            max_batch_wait: Seconds to wait for more chunks before running a
+                batch that is not full
+            quantize: Use a dynamically int8-quantized model on the CPU
+            pack_windows: Concatenate several short chunks or segments into one
+                30 s window and split the text back by timestamps
+            reduced_context: Run the encoder only on as many positions as the
+                longest audio of a batch needs, rounded up to a bucket
+            speech_gating: Skip segments without speech (energy and spectral
+                flatness) before they reach the processor
+            no_speech_threshold: Skip segments whose Whisper no-speech
+                probability from the first decoder step exceeds this, or None
+            num_workers: Number of worker processes for queued chunks; with
+                more than one, each process loads its own model and this
+                object only loads a model for streaming mode. Diarization
+                still runs here, in capture order, so speaker labels stay
+                consistent across chunks whichever worker transcribes them
+            backend: Inference engine, "transformers" or "ctranslate2" (see backends.py)
+            reserved_cores: CPU cores kept free of inference threads for the
+                audio capture path
+            draft_model_id: Small Whisper model (e.g. openai/whisper-tiny) that
+                drafts tokens for the model (speculative decoding); segments
+                of a batch are then decoded one at a time, and batches of
+                segments longer than 30 s are decoded without the draft
+            tune_threads: Apply the saved thread configuration of cpu_tuning.py
+                with apply_cpu_tuning(), which changes torch's process-wide
+                thread count; pass False if the caller sets the threads itself
+            model_memory_limit: Memory cap in bytes for the models of the shared
+                model registry; idle models are evicted above it. None keeps
+                the registry's current cap
         """
         print(f"Alustetaan Transcriber, malli: {model_id}, kieli: {language}")
         self.model_id = model_id
@@ -25,15 +72,86 @@ class Transcriber:
         self.callback = callback
         self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
         self.torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
-        self.model = None
-        self.processor = None
+
+        # Dynamic int8 quantization only runs on the CPU; inputs stay in float32
+        if quantize:
+            self.device = "cpu"
+            self.torch_dtype = torch.float32
+        self.quantize = quantize
+        self.backend_name = backend
+        self.backend = None
+        self.draft_model_id = draft_model_id
         self.transcription_queue = queue.Queue()
         self.processing = False
         self.thread = None
         self.use_diarization = use_diarization
         self.diarization = None
+        self.diarization_session = None
         self.model_loaded = False
 
+        # Streaming mode state; blocks are appended by add_audio_block()
+        self.streaming = streaming
+        self.stream_interval = stream_interval
+        self.max_stream_window = max_stream_window
+        self.stream_sample_rate = 16000
+        self.stream_blocks = []
+        self.stream_lock = threading.Lock()
+        self.stream_window = None
+        self.stream_vad = None
+        self._reset_stream_window()
+
+        # Largest number of segments sent to the model in one batch
+        self.segment_batch_size = 8
+
+        # Packing of short pieces into shared 30 s windows
+        self.pack_windows = pack_windows
+        self.pack_gap_duration = 0.5
+
+        # Truncated encoder context for short audio, like whisper.cpp's audio_ctx
+        self.reduced_context = reduced_context
+
+        # Skipping of non-speech segments before and at the first decoder step
+        self.speech_gate = SpeechGate() if speech_gating else None
+        self.no_speech_threshold = no_speech_threshold
+
+        # Micro-batching of queued chunks and its statistics
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.stats = {
+            "batches": 0,
+            "chunks": 0,
+            "largest_batch": 0,
+            "last_queue_depth": 0,
+            "max_queue_depth": 0,
+            "packed_windows": 0,
+            "packed_pieces": 0,
+            "reduced_context_batches": 0,
+            "gated_segments": 0,
+            "no_speech_segments": 0,
+            "skipped_seconds": 0.0,
+            "assisted_decodes": 0
+        }
+
+        # Worker processes for queued chunks; they build their own Transcriber from these options
+        self.num_workers = num_workers
+        self.pool = None
+        self.worker_options = {
+            "model_id": model_id,
+            "language": language,
+            "use_diarization": use_diarization,
+            "max_batch_size": max_batch_size,
+            "max_batch_wait": max_batch_wait,
+            "quantize": quantize,
+            "pack_windows": pack_windows,
+            "reduced_context": reduced_context,
+            "speech_gating": speech_gating,
+            "no_speech_threshold": no_speech_threshold,
+            "backend": backend,
+            "reserved_cores": reserved_cores,
+            "draft_model_id": draft_model_id,
+            "model_memory_limit": model_memory_limit
+        }
+
         # Tarkista PyTorch-versio
         print(f"PyTorch-versio: {torch.__version__}")
         print(f"CUDA saatavilla: {torch.cuda.is_available()}")
@@ -43,8 +161,19 @@ class Transcriber:
             for i in range(torch.cuda.device_count()):
                 print(f"  Laite {i}: {torch.cuda.get_device_name(i)}")
 
-        # Load the model and processor
-        self._load_model()
+        # Inference threads are pinned to the cores left after the reserved ones;
+        # the thread count from cpu_tuning.py applies to the whole process
+        self.reserved_cores = reserved_cores
+        self.inference_cores = inference_cores(reserved_cores)
+        if tune_threads:
+            apply_cpu_tuning(reserved_cores)
+
+        if model_memory_limit is not None:
+            registry.memory_limit = model_memory_limit
+
+        # Load the model and processor; in pool mode only the workers need one
+        if self.num_workers <= 1 or self.streaming:
+            self._load_model()
 
         # Initialize speaker diarization if enabled
         if self.use_diarization:
@@ -54,34 +183,43 @@ class Transcriber:
         """Initialize speaker diarization."""
         try:
             self.diarization = SpeakerDiarization()
+            self.diarization_session = self.diarization.create_session()
         except Exception as e:
             print(f"Virhe puhujan tunnistuksen alustamisessa: {e}")
             self.use_diarization = False
 
     def _load_model(self):
-        """Load the Whisper model and processor."""
-        print(f"Ladataan Whisper-mallia: {self.model_id}")
+        """
+        Load the Whisper model with the selected inference backend.
+
+        The calling thread is pinned to the inference cores while loading,
+        so the thread pool torch starts for the warmup decode stays off the
+        cores reserved for audio capture.
+        """
+        with pinned_to(self.inference_cores):
+            self._load_backend()
+
+    def _load_backend(self):
+        """Create and load the inference backend."""
+        print(f"Ladataan Whisper-mallia: {self.model_id} ({self.backend_name})")
         print(f"Käytetään laitetta: {self.device}")
 
         try:
-            # Käytä pienempää mallia, joka latautuu nopeammin
-            print("Käytetään pientä Whisper-mallia (whisper-small)")
-            self.model_id = "openai/whisper-small"
-
-            # Lataa malli yksinkertaisella tavalla
-            self.model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            # Transformers-malli ladataan vain kerran ja jaetaan kaikkien Transcriber-olioiden kesken
+            self.backend = create_backend(
+                self.backend_name,
                 self.model_id,
+                device=self.device,
                 torch_dtype=self.torch_dtype,
-                low_cpu_mem_usage=True
+                quantize=self.quantize,
+                reduced_context=self.reduced_context,
+                no_speech_threshold=self.no_speech_threshold,
+                stats=self.stats,
+                draft_model_id=self.draft_model_id,
+                # The thread count tuned for torch (or set by the pool worker) applies to CTranslate2 too
+                num_threads=torch.get_num_threads()
             )
-
-            print(f"Malli ladattu: {self.model}")  # Lisätty tulostus
-            # Siirrä malli oikealle laitteelle
-            self.model.to(self.device)
-
-            # Lataa prosessori
-            self.processor = AutoProcessor.from_pretrained(self.model_id)
-            print(f"Prosessori ladattu: {self.processor}")  # Lisätty tulostus
+            self.backend.load()
 
             # Merkitse malli ladatuksi
             self.model_loaded = True
@@ -92,38 +230,173 @@ class Transcriber:
             print(f"Virhe mallin lataamisessa: {e}")
             print("Transkriptio ei ole käytettävissä")
 
+    def release_model(self):
+        """Release the model so a shared one may be evicted when idle."""
+        if not self.model_loaded:
+            return
+
+        self.model_loaded = False
+        self.backend.release()
+
+    def reset_diarization(self):
+        """Start a new diarization session so speaker labels restart from SPEAKER_00."""
+        if self.diarization_session is not None:
+            self.diarization_session.reset()
+
     def _process_audio_files(self):
-        """Process audio files from the queue."""
+        """
+        Process audio files from the queue in micro-batches.
+
+        The worker waits for one chunk, then drains up to max_batch_size
+        chunks that are ready or arrive within max_batch_wait seconds and
+        transcribes them together. Callbacks are delivered in queue order.
+        """
         print("Transkriptioprosessi käynnistetty")
+        pin_current_thread(self.inference_cores)
         while self.processing:
             try:
-                # Get an audio file from the queue with a timeout
-                audio_file = self.transcription_queue.get(timeout=0.1)
-                print(f"Transkriptoidaan tiedostoa: {audio_file}")
-
-                # Transcribe the audio file
-                transcription = self.transcribe_file(audio_file)
-                print(f"Transkriptio tulos: {transcription}")  # Lisätty tulostus
-
-                # Call the callback function if provided
-                if self.callback:
-                    print(f"Kutsutaan takaisinkutsufunktiota transkriptiolle: {transcription[:50]}...")
-                    self.callback(transcription, audio_file)
-                else:
-                    print("Takaisinkutsufunktiota ei ole määritetty")
-
-                # Mark the task as done
-                self.transcription_queue.task_done()
-
+                batch = self._next_batch()
             except queue.Empty:
                 continue
+
+            print(f"Transkriptoidaan {len(batch)} äänipalaa: "
+                  f"{', '.join(self._describe_source(audio_file) for audio_file, _, _ in batch)}")
+
+            try:
+                transcriptions = self._transcribe_sources(batch)
             except Exception as e:
                 print(f"Virhe äänitiedoston käsittelyssä: {e}")
-                if self.transcription_queue.unfinished_tasks > 0:
+                transcriptions = [f"Virhe: {e}"] * len(batch)
+
+            for (audio_file, _, _), transcription in zip(batch, transcriptions):
+                try:
+                    print(f"Transkriptio tulos: {transcription}")  # Lisätty tulostus
+
+                    # Call the callback function if provided
+                    if self.callback:
+                        print(f"Kutsutaan takaisinkutsufunktiota transkriptiolle: {transcription[:50]}...")
+                        self.callback(transcription, audio_file)
+                    else:
+                        print("Takaisinkutsufunktiota ei ole määritetty")
+                except Exception as e:
+                    print(f"Virhe takaisinkutsussa: {e}")
+                finally:
+                    # Mark the task as done
                     self.transcription_queue.task_done()
 
         print("Transkriptioprosessi pysäytetty")
 
+    def _dispatch_to_pool(self):
+        """Hand queued chunks over to the worker processes in queue order."""
+        print("Transkriptioprosessien jakelija käynnistetty")
+        while self.processing:
+            try:
+                audio_file, sample_rate, start_time = self.transcription_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            # Every chunk is one task, i.e. a batch of one, for the workers
+            self.stats["batches"] += 1
+            self.stats["chunks"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], 1)
+            queue_depth = self.pool.pending_count() + 1
+            self.stats["last_queue_depth"] = queue_depth
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], queue_depth)
+
+            try:
+                audio, sample_rate, speakers = self._diarize_for_pool(audio_file, sample_rate, start_time)
+                self.pool.submit(audio_file, audio, sample_rate, self.language, speakers)
+            except Exception as e:
+                print(f"Virhe äänipalan lähettämisessä työprosessille: {e}")
+                self._deliver_pool_result(audio_file, f"Virhe: {e}")
+
+        print("Transkriptioprosessien jakelija pysäytetty")
+
+    def _diarize_for_pool(self, audio_file, sample_rate, start_time=None):
+        """
+        Split a chunk into speaker segments before it is handed to a worker.
+
+        The diarization session keeps speaker identities by seeing the chunks
+        in capture order, so it runs here instead of in the workers, which
+        receive the chunks in no particular order.
+
+        Args:
+            audio_file: Path to an audio file, or a mono NumPy array
+            sample_rate: Sample rate of the array (ignored for files)
+            start_time: Start of the chunk in the recording in seconds, or None
+
+        Returns:
+            Tuple (audio, sample_rate, speakers): the chunk itself and None
+            without diarization, or the list of speaker segments and their
+            labels
+        """
+        if not self.use_diarization or self.diarization is None:
+            return audio_file, sample_rate, None
+
+        if not isinstance(audio_file, np.ndarray):
+            with open_audio(audio_file, sample_rate=16000) as audio:
+                audio_file = audio.read(0, len(audio))
+                sample_rate = audio.sample_rate
+
+        speaker_segments = self._speaker_segments(audio_file, sample_rate, start_time)
+        if speaker_segments is None:
+            return audio_file, sample_rate, None
+        return [segment for _, segment in speaker_segments], sample_rate, [speaker for speaker, _ in speaker_segments]
+
+    def _deliver_pool_result(self, audio_file, transcription):
+        """Pass a worker result to the callback; called in capture order by the pool."""
+        try:
+            print(f"Transkriptio tulos: {transcription}")
+            if self.callback:
+                self.callback(transcription, audio_file)
+        except Exception as e:
+            print(f"Virhe takaisinkutsussa: {e}")
+        finally:
+            self.transcription_queue.task_done()
+
+    def _next_batch(self):
+        """
+        Take the next micro-batch of chunks from the queue.
+
+        Returns:
+            List of (audio_file, sample_rate, start_time) items in queue order
+
+        Raises:
+            queue.Empty: If no chunk arrives within 0.1 seconds
+        """
+        batch = [self.transcription_queue.get(timeout=0.1)]
+        queue_depth = 1 + self.transcription_queue.qsize()
+
+        deadline = time.monotonic() + self.max_batch_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.transcription_queue.get(timeout=remaining))
+                else:
+                    batch.append(self.transcription_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        self.stats["batches"] += 1
+        self.stats["chunks"] += len(batch)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+        self.stats["last_queue_depth"] = queue_depth
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], queue_depth)
+        return batch
+
+    def get_stats(self):
+        """
+        Get scheduling statistics of the transcription worker.
+
+        Returns:
+            Dictionary with batch counts, batch sizes and queue depths
+        """
+        stats = dict(self.stats)
+        stats["queue_size"] = self.transcription_queue.qsize()
+        stats["average_batch_size"] = stats["chunks"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
     def start_processing(self):
         """Start the transcription processing thread."""
         if self.processing:
@@ -132,7 +405,21 @@ class Transcriber:
         self.processing = True
 
         # Start the processing thread
-        self.thread = threading.Thread(target=self._process_audio_files)
+        if self.streaming:
+            if not self.model_loaded:
+                self._load_model()
+            target = self._process_stream
+        elif self.num_workers > 1:
+            # The workers get chunks that are already split into speaker segments
+            self.worker_options["use_diarization"] = False
+            self.pool = TranscriptionPool(
+                self.num_workers, self.worker_options, self._deliver_pool_result, self.reserved_cores
+            )
+            self.pool.start()
+            target = self._dispatch_to_pool
+        else:
+            target = self._process_audio_files
+        self.thread = threading.Thread(target=target)
         self.thread.daemon = True
         self.thread.start()
 
@@ -150,78 +437,481 @@ class Transcriber:
             self.thread.join(timeout=1.0)
             self.thread = None
 
+        if self.pool:
+            self.pool.stop()
+            self.pool = None
+
         print("Transcription processing stopped")
 
-    def add_audio_file(self, audio_file):
-        """Add an audio file to the transcription queue."""
+    def set_streaming(self, streaming):
+        """Switch between chunk-by-chunk and streaming transcription."""
+        was_processing = self.processing
+        self.stop_processing()
+        self.streaming = streaming
+        with self.stream_lock:
+            self.stream_blocks = []
+        if was_processing:
+            self.start_processing()
+        print(f"Suoratoisto {'käytössä' if streaming else 'pois käytöstä'}")
+
+    def add_audio_block(self, audio_block, sample_rate=16000):
+        """
+        Add a short block of audio to the streaming window.
+
+        Args:
+            audio_block: Mono float32 NumPy array
+            sample_rate: Sample rate of the block
+        """
+        with self.stream_lock:
+            self.stream_sample_rate = sample_rate
+            self.stream_blocks.append(audio_block)
+
+    def _process_stream(self):
+        """
+        Re-decode a growing window of audio and commit stable text.
+
+        Text is committed with a local agreement policy: of the words that
+        follow the committed text, those two consecutive hypotheses agree on
+        are reported as "final" and the rest of the newest hypothesis as
+        "partial". Audio of leading segments whose words are all committed
+        is trimmed from the window, so each decode only covers text that may
+        still change. The window is finalized and cleared when it is full or
+        when the speaker pauses.
+        """
+        print("Suoratoistotranskriptio käynnistetty")
+        pin_current_thread(self.inference_cores)
+        self.stream_window = None
+        self.stream_vad = None
+        self._reset_stream_window()
+
+        while self.processing:
+            try:
+                time.sleep(self.stream_interval)
+
+                with self.stream_lock:
+                    blocks = self.stream_blocks
+                    self.stream_blocks = []
+                    sample_rate = self.stream_sample_rate
+                if not blocks:
+                    continue
+
+                self._stream_step(blocks, sample_rate)
+
+            except Exception as e:
+                print(f"Virhe suoratoistotranskriptiossa: {e}")
+
+        print("Suoratoistotranskriptio pysäytetty")
+
+    def _reset_stream_window(self):
+        """Clear the streaming window and the text committed from it."""
+        self.stream_window_length = 0
+        self.stream_analysed = 0       # Window samples already classified by the VAD
+        self.stream_speech_end = 0     # End of the last speech frame in the window
+        self.stream_committed = []     # Committed words of the audio still in the window
+        self.stream_pending = []       # Uncommitted words of the previous hypothesis
+
+    def _stream_step(self, blocks, sample_rate):
+        """
+        Append new blocks to the streaming window, decode it and emit text.
+
+        Args:
+            blocks: Mono float32 blocks in capture order
+            sample_rate: Sample rate of the blocks
+        """
+        # Preallocate the window once and append new blocks in place
+        max_samples = int(self.max_stream_window * sample_rate)
+        if self.stream_window is None or len(self.stream_window) != max_samples:
+            self.stream_window = np.zeros(max_samples, dtype=np.float32)
+            self._reset_stream_window()
+        if self.stream_vad is None or self.stream_vad.sample_rate != sample_rate:
+            # Pauses are judged against the noise floor tracked by the VAD
+            self.stream_vad = VadChunker(sample_rate)
+
+        window = self.stream_window
+        leftover = []
+        for block in blocks:
+            if leftover:
+                leftover.append(block)
+                continue
+            space = max_samples - self.stream_window_length
+            window[self.stream_window_length:self.stream_window_length + min(space, len(block))] = block[:space]
+            self.stream_window_length += min(space, len(block))
+            if len(block) > space:
+                leftover.append(block[space:])
+
+        # Audio that did not fit goes into the next window
+        if leftover:
+            with self.stream_lock:
+                self.stream_blocks = leftover + self.stream_blocks
+        finalize = self.stream_window_length >= max_samples
+        tail_silent = self._classify_stream_audio(sample_rate)
+
+        # Without a speech frame since the last commit there is nothing to
+        # decode, and a hypothesis of the noise must not be finalized
+        audio = window[:self.stream_window_length]
+        if self.stream_speech_end == 0 or not self._passes_speech_gate(audio, sample_rate):
+            if finalize or tail_silent:
+                self._drop_stream_noise()
+            return
+
+        segments = self._decode_stream_window(audio, sample_rate)
+        words = [word for segment in segments for word in segment["text"].split()]
+
+        # Commit the words after the committed text on which the last two hypotheses agree
+        start = self._committed_prefix_end(self.stream_committed, words)
+        new_words = words[start:]
+        agreed = self._agreed_prefix_length(self.stream_pending, new_words)
+        if agreed:
+            self._emit_stream_event(" ".join(new_words[:agreed]), "final")
+            self.stream_committed += new_words[:agreed]
+        self.stream_pending = new_words[agreed:]
+
+        if finalize or tail_silent:
+            # A full window commits everything that is left; after a pause only
+            # the words two passes agreed on count, the rest may be hallucinated
+            if finalize and self.stream_pending:
+                self._emit_stream_event(" ".join(self.stream_pending), "final")
+            if words:
+                self._emit_stream_event("", "partial")
+            self._reset_stream_window()
+            return
+
+        self._emit_stream_event(" ".join(self.stream_pending), "partial")
+
+        # Drop the audio of the leading segments whose words are all committed
+        trim, trimmed_words = self._committed_audio(segments, start + agreed, sample_rate)
+        trim = min(trim, self.stream_window_length)
+        if trim > 0:
+            remaining = self.stream_window_length - trim
+            window[:remaining] = window[trim:self.stream_window_length]
+            self.stream_window_length = remaining
+            self.stream_analysed = max(self.stream_analysed - trim, 0)
+            self.stream_speech_end = max(self.stream_speech_end - trim, 0)
+            self.stream_committed = words[trimmed_words:start + agreed]
+
+    def _drop_stream_noise(self):
+        """
+        Discard a window without speech, keeping the VAD's padding at its end
+        so the onset of the next word stays in the window.
+        """
+        if self.stream_pending:
+            self._emit_stream_event("", "partial")
+        keep = min(self.stream_vad.padding_samples, self.stream_window_length)
+        tail = self.stream_window[self.stream_window_length - keep:self.stream_window_length].copy()
+        self._reset_stream_window()
+        self.stream_window[:keep] = tail
+        self.stream_window_length = self.stream_analysed = keep
+
+    def _classify_stream_audio(self, sample_rate):
+        """
+        Run the VAD over the part of the window it has not seen yet.
+
+        Returns:
+            True if no frame in the last stream_interval seconds of the window
+            rises above the noise floor tracked by the VAD
+        """
+        vad = self.stream_vad
+        frame = vad.frame_samples
+        while self.stream_analysed + frame <= self.stream_window_length:
+            samples = self.stream_window[self.stream_analysed:self.stream_analysed + frame]
+            if vad.is_speech(float(np.sqrt(np.dot(samples, samples) / frame))):
+                self.stream_speech_end = self.stream_analysed + frame
+            self.stream_analysed += frame
+
+        return self.stream_window_length - self.stream_speech_end >= int(self.stream_interval * sample_rate)
+
+    @staticmethod
+    def _normalize_word(word):
+        """Return a word without surrounding punctuation, in lower case, for comparisons."""
+        return word.strip(".,!?;:").lower()
+
+    @classmethod
+    def _agreed_prefix_length(cls, previous_words, words):
+        """Return the number of leading words two hypotheses agree on."""
+        agreed = 0
+        for old, new in zip(previous_words, words):
+            if cls._normalize_word(old) != cls._normalize_word(new):
+                break
+            agreed += 1
+        return agreed
+
+    @classmethod
+    def _committed_prefix_end(cls, committed_words, words):
+        """
+        Return the index of the first word of a hypothesis after the committed text.
+
+        The hypothesis normally starts with the committed words. If the model
+        has reworded them, it continues after the first place where the last
+        two or three committed words appear, and failing that after as many
+        words as were committed.
+        """
+        committed = [cls._normalize_word(word) for word in committed_words]
+        hypothesis = [cls._normalize_word(word) for word in words]
+        if hypothesis[:len(committed)] == committed:
+            return len(committed)
+
+        for k in range(min(3, len(committed)), 1, -1):
+            for i in range(len(hypothesis) - k + 1):
+                if hypothesis[i:i + k] == committed[-k:]:
+                    return i + k
+        return min(len(committed), len(words))
+
+    @staticmethod
+    def _committed_audio(segments, committed_count, sample_rate):
+        """
+        Find the audio of the leading segments whose words are all committed.
+
+        Args:
+            segments: Timestamped segments of the hypothesis, in order
+            committed_count: Number of leading words of the hypothesis that are committed
+            sample_rate: Sample rate of the window
+
+        Returns:
+            Tuple (samples, words): the end of the last such segment in the
+            window and the number of words up to it, or (0, 0)
+        """
+        trim = trimmed_words = count = 0
+        for segment in segments:
+            count += len(segment["text"].split())
+            end = segment["timestamp"][1]
+            if count > committed_count or end is None:
+                break
+            trim, trimmed_words = int(end * sample_rate), count
+        return trim, trimmed_words
+
+    def _emit_stream_event(self, text, event):
+        """Pass streaming text to the callback as a "partial" or "final" event."""
+        if self.callback:
+            self.callback(text, None, kind=event)
+
+    def _decode_stream_window(self, audio_input, sample_rate):
+        """Decode the streaming window into {"text", "timestamp"} segments."""
+        if not self.model_loaded or len(audio_input) == 0:
+            return []
+        if np.max(np.abs(audio_input)) < 0.001:
+            return []
+
+        segments = self.backend.transcribe_batch([audio_input], sample_rate, self.language, return_offsets=True)[0]
+        return segments or []
+
+    def add_audio_file(self, audio_file, sample_rate=16000, start_time=None):
+        """
+        Add an audio file or an in-memory audio buffer to the transcription queue.
+
+        Args:
+            audio_file: Path to an audio file, or a mono float32 NumPy array
+            sample_rate: Sample rate of the array (ignored for files)
+            start_time: Start of the chunk in the recording in seconds, or None
+                if it follows the previous chunk directly; the diarization
+                session uses it to tell gaps and new recordings apart
+        """
+        if isinstance(audio_file, np.ndarray):
+            self.transcription_queue.put((audio_file, sample_rate, start_time))
+            return
+
         if not os.path.exists(audio_file):
             print(f"Audio file does not exist: {audio_file}")
             return
 
-        self.transcription_queue.put(audio_file)
+        self.transcription_queue.put((audio_file, None, start_time))
+
+    def _describe_source(self, audio_file):
+        """Return a short printable description of a queued audio source."""
+        if isinstance(audio_file, np.ndarray):
+            return f"äänipuskuri ({len(audio_file)} näytettä)"
+        return f"tiedosto {audio_file}"
+
+    def _transcribe_sources(self, batch):
+        """
+        Transcribe a batch of queued audio files or in-memory buffers.
+
+        Args:
+            batch: List of (audio_file, sample_rate, start_time) items
+
+        Returns:
+            List of transcriptions in the same order as batch
+        """
+        transcriptions = [None] * len(batch)
+        chunks = []
+        indices = []
+        for i, (audio_file, sample_rate, start_time) in enumerate(batch):
+            if isinstance(audio_file, np.ndarray):
+                chunks.append((audio_file, sample_rate, start_time))
+                indices.append(i)
+                continue
+
+            try:
+                with open_audio(audio_file, sample_rate=16000) as audio:
+                    audio_input = audio.read(0, len(audio))
+                    sample_rate = audio.sample_rate
+                chunks.append((audio_input, sample_rate, start_time))
+                indices.append(i)
+            except Exception as e:
+                print(f"Virhe tiedoston transkriptiossa: {e}")
+                transcriptions[i] = f"Virhe: {e}"
+
+        for i, transcription in zip(indices, self._transcribe_chunks(chunks)):
+            transcriptions[i] = transcription
+
+        return transcriptions
 
     def transcribe_file(self, audio_file):
-        """Transcribe an audio file."""
+        """Transcribe an audio file as a recording of its own."""
         try:
-            # Load the audio file
-            audio_input, sample_rate = sf.read(audio_file)
+            # Speakers of an earlier file or recording have nothing to do with this one
+            self.reset_diarization()
+
+            # Load the audio file as 16 kHz mono; other formats are converted once here
+            with open_audio(audio_file, sample_rate=16000) as audio:
+                audio_input = audio.read(0, len(audio))
+                sample_rate = audio.sample_rate
+
+            return self.transcribe_audio(audio_input, sample_rate)
+
+        except Exception as e:
+            print(f"Virhe tiedoston transkriptiossa: {e}")
+            return f"Virhe: {e}"
+
+    def transcribe_audio(self, audio_input, sample_rate, start_time=None):
+        """
+        Transcribe audio that is already in memory.
+
+        Args:
+            audio_input: Audio data as a float32 NumPy array
+            sample_rate: Sample rate of the audio
+            start_time: Start of the audio in the recording in seconds, or None
+                if it follows the previous chunk directly
 
+        Returns:
+            The transcription text
+        """
+        try:
             # Check if we should use speaker diarization
             if self.use_diarization and self.diarization is not None:
-                return self._transcribe_with_diarization(audio_input, sample_rate, audio_file)
+                return self._transcribe_with_diarization(audio_input, sample_rate, start_time)
             else:
                 return self._transcribe_audio(audio_input, sample_rate)
 
         except Exception as e:
-            print(f"Virhe tiedoston transkriptiossa: {e}")
+            print(f"Virhe äänen transkriptiossa: {e}")
             return f"Virhe: {e}"
 
-    def _transcribe_with_diarization(self, audio_input, sample_rate, audio_file=None):
+    def _transcribe_with_diarization(self, audio_input, sample_rate, start_time=None):
         """Transcribe audio with speaker diarization."""
         try:
-            # Process speaker diarization
-            if audio_file is not None and os.path.exists(audio_file):
-                # Use the file directly if it exists
-                speaker_turns = self.diarization.process_audio_file(audio_file)
-            else:
-                # Process the audio data
-                speaker_turns = self.diarization.process_audio(audio_input, sample_rate)
+            return self._transcribe_chunks([(audio_input, sample_rate, start_time)])[0]
 
-            if not speaker_turns:
-                print("Puhujan tunnistus ei onnistunut, käytetään tavallista transkriptiota.")
-                return self._transcribe_audio(audio_input, sample_rate)
+        except Exception as e:
+            print(f"Virhe puhujan tunnistuksessa: {e}")
+            # Fall back to regular transcription
+            return self._transcribe_audio(audio_input, sample_rate)
 
-            # Transcribe each speaker segment
-            full_transcription = ""
+    def _speaker_segments(self, audio_input, sample_rate, start_time=None):
+        """
+        Split a chunk into speaker segments.
 
-            for start, end, speaker in speaker_turns:
-                # Extract the audio segment
-                start_sample = int(start * sample_rate)
-                end_sample = int(end * sample_rate)
-                segment = audio_input[start_sample:end_sample]
+        Args:
+            audio_input: Audio data of the chunk
+            sample_rate: Sample rate of the audio
+            start_time: Start of the chunk in the recording in seconds, or None
 
-                # Skip segments that are too short
-                if len(segment) < 0.5 * sample_rate:  # Skip segments shorter than 0.5 seconds
-                    continue
+        Returns:
+            List of (speaker, segment) tuples, or None if diarization found no
+            speakers and the whole chunk should be transcribed instead
+        """
+        try:
+            # Continue the diarization session so labels stay consistent across chunks
+            speaker_turns = self.diarization_session.process_chunk(audio_input, sample_rate, start_time)
+        except Exception as e:
+            print(f"Virhe puhujan tunnistuksessa: {e}")
+            return None
 
-                # Transcribe the segment
-                segment_transcription = self._transcribe_audio(segment, sample_rate)
+        if not speaker_turns:
+            print("Puhujan tunnistus ei onnistunut, käytetään tavallista transkriptiota.")
+            return None
 
-                # Add to the full transcription with speaker information
-                if segment_transcription.strip():
-                    full_transcription += f"{speaker}: {segment_transcription}\n\n"
+        segments = []
+        for start, end, speaker in speaker_turns:
+            # Extract the audio segment
+            start_sample = int(start * sample_rate)
+            end_sample = int(end * sample_rate)
+            segment = audio_input[start_sample:end_sample]
 
-            return full_transcription
+            # Skip segments that are too short
+            if len(segment) < 0.5 * sample_rate:  # Skip segments shorter than 0.5 seconds
+                continue
 
-        except Exception as e:
-            print(f"Virhe puhujan tunnistuksessa: {e}")
-            # Fall back to regular transcription
-            return self._transcribe_audio(audio_input, sample_rate)
+            segments.append((speaker, segment))
+
+        return segments
+
+    def transcribe_speaker_segments(self, speaker_segments, sample_rate):
+        """
+        Transcribe the speaker segments of one chunk that was diarized elsewhere.
+
+        The worker processes of the pool use this; the parent process runs
+        the diarization session so speaker labels stay consistent.
+
+        Args:
+            speaker_segments: List of (speaker, segment) tuples
+            sample_rate: Sample rate of the segments
+
+        Returns:
+            The transcription with one "SPEAKER: text" paragraph per segment
+        """
+        if not speaker_segments:
+            return ""
+
+        texts = self._transcribe_batch([segment for _, segment in speaker_segments], sample_rate)
+        return "".join(f"{speaker}: {text}\n\n" for (speaker, _), text in zip(speaker_segments, texts) if text.strip())
+
+    def _transcribe_chunks(self, chunks):
+        """
+        Transcribe several chunks with as few model calls as possible.
+
+        With diarization enabled every chunk is split into speaker segments
+        first; the segments (or whole chunks) of all chunks are then sent to
+        the model together and the results are reassembled per chunk.
+
+        Args:
+            chunks: List of (audio_input, sample_rate, start_time) tuples in capture order
+
+        Returns:
+            List of transcriptions in the same order as chunks
+        """
+        # Each piece is (chunk index, speaker or None for the whole chunk, audio, sample rate)
+        pieces = []
+        for index, (audio_input, sample_rate, start_time) in enumerate(chunks):
+            speaker_segments = None
+            if self.use_diarization and self.diarization is not None:
+                speaker_segments = self._speaker_segments(audio_input, sample_rate, start_time)
+
+            if speaker_segments is None:
+                pieces.append((index, None, audio_input, sample_rate))
+            else:
+                pieces.extend((index, speaker, segment, sample_rate) for speaker, segment in speaker_segments)
+
+        # Batch the pieces that share a sample rate
+        texts = [None] * len(pieces)
+        for sample_rate in {piece[3] for piece in pieces}:
+            group = [k for k, piece in enumerate(pieces) if piece[3] == sample_rate]
+            for k, text in zip(group, self._transcribe_batch([pieces[k][2] for k in group], sample_rate)):
+                texts[k] = text
+
+        transcriptions = [""] * len(chunks)
+        for (index, speaker, _, _), text in zip(pieces, texts):
+            if speaker is None:
+                transcriptions[index] = text
+            elif text.strip():
+                # Add to the full transcription with speaker information
+                transcriptions[index] += f"{speaker}: {text}\n\n"
+
+        return transcriptions
 
     def _transcribe_audio(self, audio_input, sample_rate):
         """Transcribe audio data."""
         # Tarkista, että malli on ladattu
-        if not self.model_loaded or self.model is None or self.processor is None:
+        if not self.model_loaded or self.backend is None:
             print("Mallia ei ole ladattu, transkriptio ei ole mahdollista")
             return "Transkriptio ei ole käytettävissä. Mallia ei ole ladattu."
 
@@ -239,59 +929,28 @@ class Transcriber:
                 print("Äänitaso on liian matala transkriptiota varten")
                 return "Äänitaso on liian matala. Puhu kovempaa tai tarkista mikrofoni."
 
+            if not self._passes_speech_gate(audio_input, sample_rate):
+                print("Ei puhetta, transkriptio ohitetaan")
+                return ""
+
             # Normalisoi ääni
             audio_input = audio_input / np.max(np.abs(audio_input)) if np.max(np.abs(audio_input)) > 0 else audio_input
 
             # Tulosta äänen tiedot
             print(f"Äänen muoto: {audio_input.shape}, näytteenottotaajuus: {sample_rate}")
 
-            # Käsittele ääni
-            try:
-                inputs = self.processor(
-                    audio_input,
-                    sampling_rate=sample_rate,
-                    return_tensors="pt",
-                    truncation=False,
-                    padding="longest",
-                    return_attention_mask=True
-                )
-                print("Ääni käsitelty prosessorilla onnistuneesti")
-            except Exception as proc_error:
-                print(f"Virhe äänen käsittelyssä prosessorilla: {proc_error}")
-                return f"Virhe äänen käsittelyssä: {proc_error}"
-
-            # Siirrä syötteet oikealle laitteelle
-            try:
-                inputs = inputs.to(self.device, dtype=self.torch_dtype)
-                print(f"Syötteet siirretty laitteelle: {self.device}")
-            except Exception as device_error:
-                print(f"Virhe syötteiden siirrossa laitteelle: {device_error}")
-                return f"Virhe syötteiden siirrossa: {device_error}"
-
-            # Generoi transkriptio
-            gen_kwargs = {
-                "language": self.language,
-                "task": "transcribe",
-                "max_new_tokens": 256,  # Pienempi arvo nopeuttaa
-                "num_beams": 1
-            }
-
+            # Generoi ja dekoodaa transkriptio
             try:
-                with torch.no_grad():
-                    print("Aloitetaan transkription generointi...")
-                    generated_ids = self.model.generate(**inputs, **gen_kwargs)
-                    print("Transkription generointi onnistui")
+                print(f"Aloitetaan transkription generointi ({self.backend.name})...")
+                transcription = self.backend.transcribe_batch([audio_input], sample_rate, self.language)[0]
+                print(f"Transkriptio dekoodattu: {transcription}")
             except Exception as gen_error:
                 print(f"Virhe transkription generoinnissa: {gen_error}")
                 return f"Virhe transkription generoinnissa: {gen_error}"
 
-            # Dekoodaa transkriptio
-            try:
-                transcription = self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-                print(f"Transkriptio dekoodattu: {transcription}")
-            except Exception as decode_error:
-                print(f"Virhe transkription dekoodauksessa: {decode_error}")
-                return f"Virhe transkription dekoodauksessa: {decode_error}"
+            if transcription is None:
+                print("Ei puhetta, transkriptio ohitetaan")
+                return ""
 
             # Tarkista, onko transkriptio tyhjä
             if not transcription.strip():
@@ -305,6 +964,144 @@ class Transcriber:
             print(f"Virhe transkriptiossa: {e}")
             return f"Virhe: {e}"
 
+    def _transcribe_batch(self, audio_inputs, sample_rate):
+        """
+        Transcribe several audio segments with padded batch generate calls.
+
+        Segments are normalized and checked like in _transcribe_audio, then
+        sent to the model in batches of at most segment_batch_size with an
+        attention mask, so a chunk costs one encoder/decoder pass per batch
+        instead of one per segment.
+
+        Args:
+            audio_inputs: List of mono audio arrays
+            sample_rate: Sample rate of the audio
+
+        Returns:
+            List of transcriptions in the same order as audio_inputs
+        """
+        if not self.model_loaded or self.backend is None:
+            print("Mallia ei ole ladattu, transkriptio ei ole mahdollista")
+            return ["Transkriptio ei ole käytettävissä. Mallia ei ole ladattu."] * len(audio_inputs)
+
+        transcriptions = [None] * len(audio_inputs)
+        batch = []
+        indices = []
+        for i, audio_input in enumerate(audio_inputs):
+            if len(audio_input) == 0:
+                transcriptions[i] = "Tyhjä äänisyöte"
+                continue
+
+            audio_level = np.max(np.abs(audio_input))
+            if audio_level < 0.001:  # Jos äänitaso on liian matala
+                transcriptions[i] = "Äänitaso on liian matala. Puhu kovempaa tai tarkista mikrofoni."
+                continue
+
+            if not self._passes_speech_gate(audio_input, sample_rate):
+                transcriptions[i] = ""
+                continue
+
+            # Normalisoi ääni
+            batch.append(audio_input / audio_level)
+            indices.append(i)
+
+        if self.pack_windows and len(batch) > 1:
+            texts = self._transcribe_packed(batch, sample_rate)
+        else:
+            texts = []
+            for first in range(0, len(batch), self.segment_batch_size):
+                texts.extend(self._generate_texts(batch[first:first + self.segment_batch_size], sample_rate))
+
+        for i, transcription in zip(indices, texts):
+            if transcription is None:
+                # Skipped as non-speech by the no-speech check
+                transcriptions[i] = ""
+                continue
+            if not transcription.strip():
+                transcription = "Ei tunnistettavaa puhetta. Puhu kovempaa tai tarkista mikrofoni."
+            transcriptions[i] = transcription
+
+        return transcriptions
+
+    def _generate_texts(self, batch_inputs, sample_rate, return_offsets=False):
+        """
+        Run one batched model call through the inference backend.
+
+        Args:
+            batch_inputs: List of normalized mono audio arrays
+            sample_rate: Sample rate of the audio
+            return_offsets: Decode with timestamp tokens and return the
+                timestamped segments of each input instead of plain text
+
+        Returns:
+            List of transcriptions, or lists of offset dictionaries with
+            return_offsets; inputs skipped as non-speech give None and
+            errors are returned as "Virhe: ..." text
+        """
+        print(f"Transkriptoidaan {len(batch_inputs)} segmenttiä yhdellä kertaa")
+
+        try:
+            return self.backend.transcribe_batch(batch_inputs, sample_rate, self.language, return_offsets)
+        except Exception as e:
+            print(f"Virhe erätranskriptiossa: {e}")
+            if return_offsets:
+                return [[{"text": f"Virhe: {e}", "timestamp": (0.0, None)}]] * len(batch_inputs)
+            return [f"Virhe: {e}"] * len(batch_inputs)
+
+    def _passes_speech_gate(self, audio_input, sample_rate):
+        """Check a segment with the speech gate, counting the skipped ones."""
+        if self.speech_gate is None or self.speech_gate.is_speech(audio_input, sample_rate):
+            return True
+
+        self.stats["gated_segments"] += 1
+        self.stats["skipped_seconds"] += len(audio_input) / sample_rate
+        return False
+
+    def _transcribe_packed(self, batch, sample_rate):
+        """
+        Transcribe short segments packed together into shared 30 s windows.
+
+        Whisper pads every input to 30 s, so a 5 s chunk wastes most of the
+        encoder pass. Consecutive segments are concatenated with short
+        silences, decoded with timestamp tokens and the text is split back to
+        the segments by timestamp. Segments that fill a window on their own
+        are transcribed normally.
+
+        Args:
+            batch: List of normalized mono audio arrays in order
+            sample_rate: Sample rate of the audio
+
+        Returns:
+            List of transcriptions in the same order as batch, with None for
+            segments skipped as non-speech
+        """
+        texts = [""] * len(batch)
+        groups = group_pieces([len(audio) for audio in batch], sample_rate, gap_duration=self.pack_gap_duration)
+
+        singles = [group[0] for group in groups if len(group) == 1]
+        for first in range(0, len(singles), self.segment_batch_size):
+            group = singles[first:first + self.segment_batch_size]
+            for k, text in zip(group, self._generate_texts([batch[k] for k in group], sample_rate)):
+                texts[k] = text
+
+        packed = [group for group in groups if len(group) > 1]
+        windows = [build_window([batch[k] for k in group], sample_rate, self.pack_gap_duration) for group in packed]
+        self.stats["packed_windows"] += len(packed)
+        self.stats["packed_pieces"] += sum(len(group) for group in packed)
+
+        for first in range(0, len(windows), self.segment_batch_size):
+            window_batch = windows[first:first + self.segment_batch_size]
+            offsets = self._generate_texts([audio for audio, _ in window_batch], sample_rate, return_offsets=True)
+            for group, (_, spans), window_offsets in zip(packed[first:], window_batch, offsets):
+                if window_offsets is None:
+                    for k in group:
+                        texts[k] = None
+                    continue
+                for k, text in zip(group, split_offsets(window_offsets, spans)):
+                    texts[k] = text
+
+        return texts
+
     def set_language(self, language):
         """Set the language for transcription."""
         self.language = language
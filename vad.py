@@ -0,0 +1,216 @@
+import numpy as np
+
+
+class VadChunker:
+    def __init__(self, sample_rate=16000, frame_duration=0.03, min_chunk_duration=1.0,
+                 max_chunk_duration=5.0, min_pause_duration=0.3, min_speech_duration=0.25,
+                 padding_duration=0.2, energy_threshold=0.01, noise_ratio=3.0, speech_floor_rate=0.001):
+        """
+        Initialize the streaming voice activity chunker.
+
+        The chunker receives consecutive frames of audio and decides where
+        chunks start and end. A chunk opens at the first speech frame, closes
+        at the first pause after min_chunk_duration and is cut by force at
+        max_chunk_duration. Chunks without enough speech are never emitted.
+
+        Args:
+            sample_rate: Sample rate of the audio
+            frame_duration: Length of one analysis frame in seconds
+            min_chunk_duration: Shortest chunk that may be closed at a pause
+            max_chunk_duration: Longest chunk before a forced cut
+            min_pause_duration: Silence needed to close a chunk
+            min_speech_duration: Chunks with less speech than this are dropped
+            padding_duration: Audio kept before speech onset and after its end
+            energy_threshold: Minimum RMS level considered speech
+            noise_ratio: Speech must exceed the tracked noise floor by this factor
+            speech_floor_rate: How fast the noise floor follows frames classified
+                as speech, so a lasting rise in background noise is learned
+                even when every frame exceeds the threshold
+        """
+        self.sample_rate = sample_rate
+        self.frame_samples = int(frame_duration * sample_rate)
+        self.min_chunk_samples = int(min_chunk_duration * sample_rate)
+        self.max_chunk_samples = int(max_chunk_duration * sample_rate)
+        self.min_pause_samples = int(min_pause_duration * sample_rate)
+        self.min_speech_samples = int(min_speech_duration * sample_rate)
+        self.padding_samples = int(padding_duration * sample_rate)
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.speech_floor_rate = speech_floor_rate
+        self.reset()
+
+    def reset(self):
+        """Forget the current chunk and the noise floor estimate."""
+        # Start where the threshold equals energy_threshold instead of at the
+        # first frame, which may already be speech
+        self.noise_floor = self.energy_threshold / self.noise_ratio
+        self.chunk_start = None
+        self.last_end = 0          # End of the last emitted chunk; the next one never starts before it
+        self.speech_end = 0
+        self.speech_samples = 0
+        self.pause_samples = 0
+
+    def threshold(self):
+        """Return the current RMS level above which a frame counts as speech."""
+        return max(self.energy_threshold, self.noise_floor * self.noise_ratio)
+
+    def is_speech(self, rms):
+        """Decide whether a frame with the given RMS level contains speech."""
+        speech = rms > self.threshold()
+
+        # Track the noise floor from non-speech frames, and let it rise very
+        # slowly during speech so it cannot get stuck below a new noise level
+        rate = self.speech_floor_rate if speech else 0.05
+        self.noise_floor += rate * (rms - self.noise_floor)
+
+        return speech
+
+    def process_frame(self, frame, position):
+        """
+        Process one frame of audio.
+
+        Args:
+            frame: Audio samples of the frame
+            position: Absolute sample index of the first sample of the frame
+
+        Returns:
+            List of finished (start, end) chunks as absolute sample indices
+        """
+        frame = frame.ravel()
+        rms = float(np.sqrt(np.dot(frame, frame) / len(frame))) if len(frame) else 0.0
+        frame_end = position + len(frame)
+        speech = self.is_speech(rms)
+        chunks = []
+
+        if self.chunk_start is None:
+            # Silence outside a chunk is simply discarded
+            if speech:
+                # Pad before the onset, but never into audio that was already emitted
+                self.chunk_start = max(self.last_end, position - self.padding_samples)
+                self.speech_end = frame_end
+                self.speech_samples = len(frame)
+                self.pause_samples = 0
+            return chunks
+
+        if speech:
+            self.speech_end = frame_end
+            self.speech_samples += len(frame)
+            self.pause_samples = 0
+        else:
+            self.pause_samples += len(frame)
+
+        chunk_length = frame_end - self.chunk_start
+
+        if chunk_length >= self.min_chunk_samples and self.pause_samples >= self.min_pause_samples:
+            # Close the chunk at the pause, keeping a little trailing context
+            end = min(self.speech_end + self.padding_samples, frame_end)
+            self._finish_chunk(end, chunks)
+            self.chunk_start = None
+        elif chunk_length >= self.max_chunk_samples:
+            # Force a cut and continue straight on if the speaker is still talking
+            self._finish_chunk(frame_end, chunks)
+            if speech:
+                self.chunk_start = frame_end
+                self.speech_end = frame_end
+                self.speech_samples = 0
+                self.pause_samples = 0
+            else:
+                self.chunk_start = None
+
+        return chunks
+
+    def flush(self, position):
+        """
+        Close the open chunk at the end of the stream.
+
+        Args:
+            position: Absolute sample index of the end of the stream
+
+        Returns:
+            List containing the last (start, end) chunk, if it has speech
+        """
+        chunks = []
+        if self.chunk_start is not None:
+            self._finish_chunk(min(self.speech_end + self.padding_samples, position), chunks)
+            self.chunk_start = None
+        return chunks
+
+    def _finish_chunk(self, end, chunks):
+        """Append the current chunk unless it is (almost) pure silence."""
+        if self.speech_samples >= self.min_speech_samples and end > self.chunk_start:
+            chunks.append((self.chunk_start, end))
+            self.last_end = end
+
+
+class SpeechGate:
+    def __init__(self, frame_duration=0.03, energy_threshold=0.005, flatness_threshold=0.3,
+                 min_speech_duration=0.2, low_frequency=100.0, high_frequency=4000.0):
+        """
+        Initialize the pre-inference speech gate.
+
+        The gate decides cheaply whether a whole chunk is worth sending to
+        the model. A frame counts as speech when it is loud enough and its
+        spectrum is peaky rather than flat: voiced speech has a low spectral
+        flatness in the speech band, while hiss and broadband room noise
+        are close to white.
+
+        Args:
+            frame_duration: Length of one analysis frame in seconds
+            energy_threshold: Minimum RMS level of a speech frame
+            flatness_threshold: Maximum spectral flatness of a speech frame
+            min_speech_duration: Speech needed for a chunk to pass the gate
+            low_frequency: Lower edge of the analysed band in Hz
+            high_frequency: Upper edge of the analysed band in Hz
+        """
+        self.frame_duration = frame_duration
+        self.energy_threshold = energy_threshold
+        self.flatness_threshold = flatness_threshold
+        self.min_speech_duration = min_speech_duration
+        self.low_frequency = low_frequency
+        self.high_frequency = high_frequency
+        self._setups = {}
+
+    def _setup(self, sample_rate):
+        """Return frame length, window and band mask for a sample rate."""
+        if sample_rate not in self._setups:
+            frame_length = int(self.frame_duration * sample_rate)
+            window = np.hanning(frame_length).astype(np.float32)
+            frequencies = np.fft.rfftfreq(frame_length, 1.0 / sample_rate)
+            band = (frequencies >= self.low_frequency) & (frequencies <= self.high_frequency)
+            self._setups[sample_rate] = (frame_length, window, band)
+        return self._setups[sample_rate]
+
+    def speech_frames(self, audio_data, sample_rate):
+        """
+        Classify non-overlapping frames as speech or non-speech.
+
+        Args:
+            audio_data: Mono audio data as numpy array
+            sample_rate: Sample rate of the audio
+
+        Returns:
+            Boolean array with one entry per frame
+        """
+        frame_length, window, band = self._setup(sample_rate)
+        count = len(audio_data) // frame_length
+        if count == 0:
+            return np.zeros(0, dtype=bool)
+
+        frames = np.asarray(audio_data[:count * frame_length], dtype=np.float32).reshape(count, frame_length)
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
+        loud = rms > self.energy_threshold
+        if not loud.any():
+            return loud
+
+        # Spectral flatness (geometric over arithmetic mean of power) of the loud frames only
+        power = np.abs(np.fft.rfft(frames[loud] * window, axis=1))[:, band] ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        speech = np.zeros(count, dtype=bool)
+        speech[loud] = flatness < self.flatness_threshold
+        return speech
+
+    def is_speech(self, audio_data, sample_rate):
+        """Decide whether a chunk contains enough speech to be transcribed."""
+        speech = self.speech_frames(audio_data, sample_rate)
+        return np.count_nonzero(speech) * self.frame_duration >= self.min_speech_duration
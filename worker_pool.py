@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from cpu_tuning import inference_cores
+
+
+def _attach_shared_memory(name):
+    """
+    Attach to a shared memory block created by the parent process.
+
+    The parent creates, registers and unlinks every block. Python 3.13+
+    can attach without registering (track=False). Older versions always
+    register on attach, but spawned workers share the parent's resource
+    tracker, where the name is already registered, so that is a no-op;
+    unregistering here would remove the parent's entry and make its
+    unlink() fail in the tracker.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _read_shared_audio(name, lengths):
+    """
+    Copy the audio pieces out of a shared memory block.
+
+    Args:
+        name: Name of the block
+        lengths: Number of float32 samples of each piece, stored back to back
+
+    Returns:
+        List of float32 arrays, one per piece
+    """
+    block = _attach_shared_memory(name)
+    try:
+        # Copy out so nothing keeps a view into the block after it is closed
+        audio = np.ndarray((sum(lengths),), dtype=np.float32, buffer=block.buf).copy()
+    finally:
+        block.close()
+    return np.split(audio, np.cumsum(lengths)[:-1]) if lengths else []
+
+
+def _worker_main(options, cores, tasks, results):
+    """
+    Run one transcription worker process.
+
+    Each task is (sequence, source, lengths, sample_rate, language, speakers)
+    where source is the name of a shared memory block holding the float32
+    pieces of one chunk back to back, or a file path when lengths is None.
+    Without speakers the block holds the whole chunk; otherwise it holds
+    the chunk's speaker segments, diarized by the parent process, and
+    speakers has one label per segment. Results are sent back as
+    (sequence, transcription). The worker runs its inference threads on
+    its own share of the cores.
+    """
+    import torch
+    from cpu_tuning import pin_current_thread
+    from transcriber import Transcriber
+
+    # Split the cores between the workers instead of letting every worker use all of them.
+    # This is done before the model's warmup starts torch's thread pool, and the
+    # Transcriber neither reserves cores of the share nor overrides the thread count
+    torch.set_num_threads(len(cores))
+    pin_current_thread(cores)
+    transcriber = Transcriber(**dict(options, reserved_cores=0), tune_threads=False)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        sequence, source, lengths, sample_rate, language, speakers = task
+        transcriber.language = language
+        try:
+            if lengths is None:
+                transcription = transcriber.transcribe_file(source)
+            elif speakers is None:
+                transcription = transcriber.transcribe_audio(_read_shared_audio(source, lengths)[0], sample_rate)
+            else:
+                pieces = _read_shared_audio(source, lengths)
+                transcription = transcriber.transcribe_speaker_segments(list(zip(speakers, pieces)), sample_rate)
+        except Exception as e:
+            print(f"Virhe työprosessissa {os.getpid()}: {e}")
+            transcription = f"Virhe: {e}"
+
+        results.put((sequence, transcription))
+
+    transcriber.release_model()
+
+
+class TranscriptionPool:
+    def __init__(self, num_workers, options, callback, reserved_cores=1):
+        """
+        Initialize a pool of transcription worker processes.
+
+        Every worker loads its own model (processes are spawned, because
+        torch does not survive fork safely), so memory grows with the number
+        of workers; a quantized model keeps each copy small. Audio is handed
+        to the workers in shared memory instead of being pickled, and results
+        are delivered to the callback in submission order. Chunks go to
+        whichever worker is free, so work that depends on the previous chunk,
+        like the speaker diarization session, has to be done before submit().
+
+        Args:
+            num_workers: Number of worker processes
+            options: Keyword arguments for the Transcriber of each worker
+            callback: Function called as callback(payload, transcription) in
+                submission order, from the pool's result thread
+            reserved_cores: CPU cores kept free for the audio capture path;
+                the rest are split evenly between the workers
+        """
+        self.num_workers = num_workers
+        self.callback = callback
+
+        cores = inference_cores(reserved_cores)
+        share = max(1, len(cores) // num_workers)
+        worker_cores = [cores[(i * share) % len(cores):][:share] for i in range(num_workers)]
+
+        context = multiprocessing.get_context("spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.workers = [
+            context.Process(target=_worker_main, args=(options, worker_cores[i], self.tasks, self.results), daemon=True)
+            for i in range(num_workers)
+        ]
+
+        # Submission state; pending maps sequence -> (payload, shared memory block or None)
+        self.lock = threading.Lock()
+        self.next_sequence = 0
+        self.next_delivery = 0
+        self.pending = {}
+        self.finished = {}
+        self.running = False
+        self.result_thread = None
+
+    def start(self):
+        """Start the worker processes and the result thread."""
+        self.running = True
+        for worker in self.workers:
+            worker.start()
+
+        self.result_thread = threading.Thread(target=self._collect_results, daemon=True)
+        self.result_thread.start()
+        print(f"Käynnistetty {self.num_workers} transkriptioprosessia")
+
+    def submit(self, payload, audio_file, sample_rate, language, speakers=None):
+        """
+        Send one chunk to the workers.
+
+        Args:
+            payload: Value passed back to the callback with the result
+            audio_file: Path to an audio file, a mono NumPy array, or with
+                speakers a list of mono arrays, one per speaker segment
+            sample_rate: Sample rate of the audio (ignored for files)
+            language: Language code for the transcription
+            speakers: Speaker label of each segment when the chunk has been
+                diarized already, or None
+        """
+        with self.lock:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+
+            block = None
+            if speakers is None and not isinstance(audio_file, np.ndarray):
+                task = (sequence, audio_file, None, None, language, None)
+            else:
+                pieces = [audio_file] if speakers is None else list(audio_file)
+                pieces = [np.ascontiguousarray(piece, dtype=np.float32).ravel() for piece in pieces]
+                lengths = [len(piece) for piece in pieces]
+                block = shared_memory.SharedMemory(create=True, size=max(4 * sum(lengths), 1))
+                if pieces:
+                    np.concatenate(pieces, out=np.ndarray((sum(lengths),), dtype=np.float32, buffer=block.buf))
+                task = (sequence, block.name, lengths, sample_rate, language, speakers)
+
+            self.pending[sequence] = (payload, block)
+
+        self.tasks.put(task)
+
+    def pending_count(self):
+        """Return the number of submitted chunks whose result has not been delivered."""
+        with self.lock:
+            return len(self.pending)
+
+    def _collect_results(self):
+        """Receive results from the workers and deliver them in submission order."""
+        while self.running:
+            try:
+                sequence, transcription = self.results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            # The worker has copied the audio, so its block can go
+            with self.lock:
+                payload, block = self.pending[sequence]
+                self.pending[sequence] = (payload, None)
+                self.finished[sequence] = transcription
+            if block is not None:
+                block.close()
+                block.unlink()
+
+            # Results may arrive out of order; deliver everything that is now in sequence
+            while True:
+                with self.lock:
+                    if self.next_delivery not in self.finished:
+                        break
+                    sequence = self.next_delivery
+                    transcription = self.finished.pop(sequence)
+                    payload, _ = self.pending.pop(sequence)
+                    self.next_delivery += 1
+
+                try:
+                    self.callback(payload, transcription)
+                except Exception as e:
+                    print(f"Virhe takaisinkutsussa: {e}")
+
+    def stop(self, timeout=5.0):
+        """Stop the workers and free the shared memory of undelivered chunks."""
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                worker.terminate()
+
+        self.running = False
+        if self.result_thread:
+            self.result_thread.join(timeout=1.0)
+            self.result_thread = None
+
+        with self.lock:
+            for _, block in self.pending.values():
+                if block is not None:
+                    block.close()
+                    block.unlink()
+            self.pending.clear()
+            self.finished.clear()
+
+        print("Transkriptioprosessit pysäytetty")